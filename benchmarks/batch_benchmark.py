@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+
+# MIT License
+#
+# Copyright (c) 2020 Christopher Friedt
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+'''Batch Benchmark
+
+Measure moves/sec of playing 100, 1000 and 10000 games of 8 discs,
+comparing one Hanoi.move() call per game and move (scalar) with one
+HanoiBatch.move() call per move of all games at once (batch). Requires NumPy.
+
+PYTHONPATH=$PWD/src python3 benchmarks/batch_benchmark.py
+'''
+
+import time
+
+import numpy as np
+
+from hanoi import Hanoi
+from hanoi import HanoiSolver
+from hanoi.HanoiBatch import HanoiBatch
+
+DISCS = 8
+
+
+def scalar(numberOfSessions, moves):
+    games = [Hanoi(DISCS, 0, 2) for _ in range(numberOfSessions)]
+    start = time.perf_counter()
+    for s, t in moves:
+        for h in games:
+            h.move(s, t)
+    elapsed = time.perf_counter() - start
+    assert all(h.isComplete() for h in games)
+    return numberOfSessions * len(moves) / elapsed
+
+
+def batch(numberOfSessions, moves):
+    b = HanoiBatch(numberOfSessions, DISCS, 0, 2)
+    steps = [(np.full(numberOfSessions, s), np.full(numberOfSessions, t)) for s, t in moves]
+    start = time.perf_counter()
+    for s, t in steps:
+        b.move(s, t)
+    elapsed = time.perf_counter() - start
+    assert b.isComplete().all()
+    return numberOfSessions * len(moves) / elapsed
+
+
+def main():
+    moves = list(HanoiSolver.solution(DISCS, 0, 2))
+    print('{:>8} {:>14} {:>14} {:>8}'.format(
+        'games', 'scalar (m/s)', 'batch (m/s)', 'speedup'))
+    for n in [100, 1000, 10000]:
+        before = scalar(n, moves)
+        after = batch(n, moves)
+        print('{:>8} {:>14.0f} {:>14.0f} {:>7.2f}x'.format(
+            n, before, after, after / before))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+
+# MIT License
+#
+# Copyright (c) 2020 Christopher Friedt
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+
+'''Big Benchmark
+
+Measure moves/sec of Hanoi.move() for games that fit in one word per tower
+(4 and 64 discs) and for games of arbitrary-width towers (128, 1024 and 4096
+discs). The first moves of the optimal solution only move the smallest 16 discs,
+so the same moves are replayed back and forth on every game.
+
+PYTHONPATH=$PWD/src python3 benchmarks/big_benchmark.py
+'''
+
+import time
+
+from hanoi import Hanoi
+from hanoi import HanoiSolver
+
+
+def measure(numberOfDiscs, count):
+    '''Play count moves of the smallest discs of a game'''
+    h = Hanoi(numberOfDiscs, 0, 2)
+    # the smallest discs move the same way whenever the parity is the same
+    small = 4 if numberOfDiscs == 4 else 16
+    moves = list(HanoiSolver.solution(small, 0, 2))
+    undo = [(t, s) for s, t in reversed(moves)]
+    rounds = max(1, count // (2 * len(moves)))
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for s, t in moves:
+            h.move(s, t)
+        for s, t in undo:
+            h.move(s, t)
+    elapsed = time.perf_counter() - start
+    return rounds * 2 * len(moves) / elapsed
+
+
+def main():
+    count = 200000
+    print('{:>6} {:>12}'.format('discs', 'moves/s'))
+    for n in [4, 64, 128, 1024, 4096]:
+        print('{:>6} {:>12.0f}'.format(n, measure(n, count)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+
+# MIT License
+#
+# Copyright (c) 2020 Christopher Friedt
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+'''Contention Benchmark
+
+Measure getState() and isComplete() calls/sec of N reader threads polling one
+game while a single writer thread plays it, as well as the moves/sec of the
+writer, comparing reads that take the game lock (before) with lock-free
+snapshot reads (after).
+
+PYTHONPATH=$PWD/src python3 benchmarks/contention_benchmark.py
+'''
+
+import threading
+import time
+
+from hanoi import Hanoi
+from hanoi import HanoiSolver
+
+
+class LockedHanoi(Hanoi):
+    '''The read path as it was before snapshots'''
+
+    def getState(self, timeout=-1):
+        locked = self._lock.acquire(timeout=timeout)
+        if locked:
+            s = self._state
+            self._lock.release()
+        else:
+            raise TimeoutError()
+        return s
+
+    def isComplete(self, timeout=-1):
+        locked = self._lock.acquire(timeout=timeout)
+        complete = False
+        if locked:
+            n = self._state.numberOfDiscs
+            t = self._state.target
+            complete = self._state.tower[t] == ((1 << n) - 1)
+            self._lock.release()
+        else:
+            raise TimeoutError()
+        return complete
+
+
+def measure(cls, readers, duration):
+    '''Return (reads/sec, moves/sec)'''
+    numberOfDiscs = 16
+    h = cls(numberOfDiscs, 0, 2)
+    moves = list(HanoiSolver.solution(numberOfDiscs, 0, 2))
+    undo = [(t, s) for s, t in reversed(moves)]
+    stop = threading.Event()
+    reads = [0] * readers
+    writes = [0]
+
+    def read(i):
+        n = 0
+        while not stop.is_set():
+            s = h.getState()
+            s.numberOfMoves
+            s.tower[0]
+            h.isComplete()
+            n += 2
+        reads[i] = n
+
+    def write():
+        n = 0
+        while not stop.is_set():
+            for s, t in moves if n % 2 == 0 else undo:
+                h.move(s, t)
+                if stop.is_set():
+                    break
+            n += 1
+        writes[0] = h.getState().numberOfMoves
+
+    threads = [threading.Thread(target=read, args=(i,)) for i in range(readers)]
+    threads.append(threading.Thread(target=write))
+    for t in threads:
+        t.start()
+    time.sleep(duration)
+    stop.set()
+    for t in threads:
+        t.join()
+    return sum(reads) / duration, writes[0] / duration
+
+
+def main():
+    duration = 2
+    print('{:>8} {:>16} {:>16} {:>16} {:>16}'.format(
+        'readers', 'before (r/s)', 'after (r/s)', 'before (m/s)', 'after (m/s)'))
+    for readers in [1, 4, 16]:
+        rb, wb = measure(LockedHanoi, readers, duration)
+        ra, wa = measure(Hanoi, readers, duration)
+        print('{:>8} {:>16.0f} {:>16.0f} {:>16.0f} {:>16.0f}'.format(
+            readers, rb, ra, wb, wa))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+
+# MIT License
+#
+# Copyright (c) 2020 Christopher Friedt
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+
+'''Create Benchmark
+
+Measure sessions/sec of creating 1000, 10000 and 50000 sessions, one at a time
+with SessionStore.create() (before), and at once with SessionStore.createMany()
+(after), which reserves the ids with one counter bump and allocates, indexes
+and inserts the sessions in bulk.
+
+PYTHONPATH=$PWD/src python3 benchmarks/create_benchmark.py
+'''
+
+import gc
+import time
+
+from hanoi import SessionStore
+
+
+def measure(count, bulk):
+    store = SessionStore()
+    gc.collect()
+    start = time.perf_counter()
+    if bulk:
+        hs = store.createMany([(4, 0, 2, 3)] * count)
+    else:
+        hs = [store.create(4, 0, 2, 3) for _ in range(count)]
+    elapsed = time.perf_counter() - start
+    assert len(store) == len(hs) == count
+    return count / elapsed
+
+
+def main():
+    print('{:>8} {:>14} {:>14} {:>8}'.format(
+        'sessions', 'before (s/s)', 'after (s/s)', 'speedup'))
+    for count in [1000, 10000, 50000]:
+        # best of 3, alternating
+        before = after = 0
+        for _ in range(3):
+            before = max(before, measure(count, False))
+            after = max(after, measure(count, True))
+        print('{:>8} {:>14.0f} {:>14.0f} {:>7.2f}x'.format(
+            count, before, after, after / before))
+
+
+if __name__ == '__main__':
+    main()
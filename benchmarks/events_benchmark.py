@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+
+# MIT License
+#
+# Copyright (c) 2020 Christopher Friedt
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+
+'''Events Benchmark
+
+Measure the server-side cost of keeping N clients up to date with one game,
+either by each client polling GET /sessions/{sessionId} after every move
+(before), or by pushing each move to N subscribers of the session's event
+stream (after). Both are measured in-process, without sockets, as requests
+and events per second of server time, and as bytes sent per move.
+
+PYTHONPATH=$PWD/src python3 benchmarks/events_benchmark.py
+'''
+
+import importlib
+import queue
+import time
+
+from hanoi import HanoiSolver
+from hanoi import SessionStore
+
+# hanoi.app is also the name of the WSGI app object in the hanoi package
+app = importlib.import_module('hanoi.app')
+
+numberOfDiscs = 8
+
+
+def poll(clients):
+    '''Return (seconds, bytes) per move when every client polls after every move'''
+    app.sessions = SessionStore()
+    client = app.application.test_client()
+    id = client.post('/v1/sessions', query_string={'numberOfDiscs': numberOfDiscs}).json
+    h = app.sessions[id]
+    path = '/v1/sessions/{}'.format(id)
+    moves = list(HanoiSolver.solution(numberOfDiscs, 0, 2))
+    sent = 0
+    start = time.perf_counter()
+    for s, t in moves:
+        h.move(s, t)
+        for _ in range(clients):
+            sent += len(client.get(path).data)
+    elapsed = time.perf_counter() - start
+    return elapsed / len(moves), sent / len(moves)
+
+
+def push(clients):
+    '''Return (seconds, bytes) per move when every client is subscribed'''
+    app.sessions = SessionStore()
+    h = app.sessions.create(numberOfDiscs, 0, 2)
+    subscribers = [app.subscribe(h) for _ in range(clients)]
+    moves = list(HanoiSolver.solution(numberOfDiscs, 0, 2))
+    sent = 0
+    start = time.perf_counter()
+    for s, t in moves:
+        h.move(s, t)
+        for _, q, _ in subscribers:
+            # what each stream would write
+            while True:
+                try:
+                    sent += len(q.get_nowait())
+                except queue.Empty:
+                    break
+    elapsed = time.perf_counter() - start
+    for _, _, p in subscribers:
+        app.events.unsubscribe(h, p)
+    return elapsed / len(moves), sent / len(moves)
+
+
+def main():
+    print('{:>8} {:>16} {:>16} {:>16} {:>16}'.format(
+        'clients', 'before (us/m)', 'after (us/m)', 'before (B/m)', 'after (B/m)'))
+    for clients in [1, 10, 100]:
+        tb, bb = poll(clients)
+        ta, ba = push(clients)
+        print('{:>8} {:>16.1f} {:>16.1f} {:>16.0f} {:>16.0f}'.format(
+            clients, tb * 1e6, ta * 1e6, bb, ba))
+
+
+if __name__ == '__main__':
+    main()
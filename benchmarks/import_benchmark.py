@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+
+# MIT License
+#
+# Copyright (c) 2020 Christopher Friedt
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+
+'''Import Benchmark
+
+Measure the time it takes a fresh interpreter to import the hanoi package
+(the engine only), and the web app with and without a cached hanoi.yaml,
+as reported by python -X importtime.
+
+Previously, import hanoi loaded the web app as well, i.e. connexion, Flask
+and swagger-ui, and parsed hanoi.yaml, so every process paid for the last
+row.
+
+PYTHONPATH=$PWD/src python3 benchmarks/import_benchmark.py
+'''
+
+import os
+import subprocess
+import sys
+
+import hanoi
+
+runs = 5
+cache = os.path.join(os.path.dirname(hanoi.__file__), '__pycache__', 'hanoi.yaml.json')
+
+cases = [
+    ('import hanoi', 'import hanoi', False),
+    ('from hanoi import app (cached hanoi.yaml)', 'from hanoi import app', False),
+    ('from hanoi import app (parse hanoi.yaml)', 'from hanoi import app', True),
+]
+
+
+def measure(statement, cold):
+    '''Get the total import time (s) of statement in a fresh interpreter'''
+    if cold and os.path.exists(cache):
+        os.remove(cache)
+    r = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement],
+                       capture_output=True, text=True, check=True)
+    total = 0
+    for line in r.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        fields = line.split('|')
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue
+        # only count top-level imports of hanoi, which include nested ones
+        if fields[2].startswith(' hanoi'):
+            total += int(fields[1])
+    return total / 1e6
+
+
+def main():
+    # populate bytecode and spec caches
+    measure('from hanoi import app', False)
+    print('{:<44} {:>10}'.format('', 'time (ms)'))
+    for name, statement, cold in cases:
+        best = min(measure(statement, cold) for _ in range(runs))
+        print('{:<44} {:>10.1f}'.format(name, best * 1e3))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+
+# MIT License
+#
+# Copyright (c) 2020 Christopher Friedt
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+'''Latency Benchmark
+
+Measure requests/sec and p50 / p99 latency of the WSGI entry point (hanoi.app
+on the threaded development server, as started by run.py) and of the asyncio
+entry point (hanoi.aio), with 1000 concurrent client connections. Each client
+creates a session and then alternately moves a disc and gets the session.
+
+Requires aiohttp.
+
+PYTHONPATH=$PWD/src python3 benchmarks/latency_benchmark.py
+'''
+
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import aiohttp
+
+host = '127.0.0.1'
+port = 8090
+connections = 1000
+duration = 10
+
+servers = {
+    'wsgi': [sys.executable, '-c',
+             'from hanoi import app; app.run(host="{}", port={}, threaded=True)'.format(host, port)],
+    'asyncio': [sys.executable, '-m', 'hanoi.aio'],
+}
+
+
+def start(name):
+    env = dict(os.environ, HANOI_PORT='{}'.format(port))
+    server = subprocess.Popen(servers[name], env=env, stdout=subprocess.DEVNULL,
+                              stderr=subprocess.DEVNULL)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            socket.create_connection((host, port), timeout=1).close()
+            return server
+        except OSError:
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError('{} server did not start'.format(name))
+
+
+async def client(session, url, end, latencies, errors):
+    id = None
+    while id is None and time.perf_counter() < end:
+        try:
+            async with session.post(url + '/sessions') as r:
+                id = await r.json()
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            errors.append(1)
+    source, target = 0, 1
+    i = 0
+    while time.perf_counter() < end:
+        start = time.perf_counter()
+        try:
+            if i % 2 == 0:
+                async with session.put('{}/sessions/{}/move'.format(url, id), params={
+                        'fromTower': source, 'toTower': target}) as r:
+                    await r.read()
+                source, target = target, source
+            else:
+                async with session.get('{}/sessions/{}'.format(url, id)) as r:
+                    await r.read()
+            latencies.append(time.perf_counter() - start)
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            errors.append(1)
+        i += 1
+
+
+async def load():
+    url = 'http://{}:{}/v1'.format(host, port)
+    latencies = []
+    errors = []
+    connector = aiohttp.TCPConnector(limit=connections)
+    timeout = aiohttp.ClientTimeout(total=10)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        end = time.perf_counter() + duration
+        await asyncio.gather(*[client(session, url, end, latencies, errors)
+                               for _ in range(connections)])
+    return latencies, len(errors)
+
+
+def measure(name):
+    server = start(name)
+    try:
+        latencies, errors = asyncio.run(load())
+    finally:
+        server.terminate()
+        server.wait()
+    latencies.sort()
+    n = len(latencies)
+    return n / duration, latencies[n // 2], latencies[min(n - 1, n * 99 // 100)], errors
+
+
+def main():
+    print('{} connections, {} s'.format(connections, duration))
+    print('{:>8} {:>10} {:>10} {:>10} {:>8}'.format(
+        'server', 'req/s', 'p50 (ms)', 'p99 (ms)', 'errors'))
+    for name in ['wsgi', 'asyncio']:
+        rps, p50, p99, errors = measure(name)
+        print('{:>8} {:>10.0f} {:>10.1f} {:>10.1f} {:>8}'.format(
+            name, rps, 1000 * p50, 1000 * p99, errors))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+
+# MIT License
+#
+# Copyright (c) 2020 Christopher Friedt
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+'''Move Benchmark
+
+Measure moves/sec of Hanoi.move() for 4, 32 and 64 discs, comparing the
+original bit-by-bit popcount() / fls() loops (before) with the constant-time
+move kernel (after).
+
+PYTHONPATH=$PWD/src python3 benchmarks/move_benchmark.py
+'''
+
+import time
+
+from hanoi import Hanoi
+from hanoi import HanoiSolver
+
+
+def popcount(x):
+    r = 0
+    while x:
+        if x & 1:
+            r += 1
+        x >>= 1
+    return r
+
+
+def fls(x):
+    if not x:
+        raise ValueError('fls should not be called with x == 0')
+    r = 0
+    while not (x & 1):
+        x >>= 1
+        r += 1
+    return r
+
+
+class LegacyHanoi(Hanoi):
+    '''The move path as it was before the move kernel'''
+
+    def _move(self, source, target):
+        if popcount(self._state.tower[source]) == 0:
+            raise ValueError('source {} is empty'.format(source))
+        froN = fls(self._state.tower[source])
+        if popcount(self._state.tower[target]) != 0:
+            toN = fls(self._state.tower[target])
+            if froN > toN:
+                raise ValueError(
+                    'cannot put disc {} on top of disc {}'.format(froN + 1, toN + 1))
+        mask = 1 << froN
+        self._state.tower[source] &= ~mask
+        self._state.tower[target] |= mask
+        self._state.numberOfMoves += 1
+
+
+def measure(cls, numberOfDiscs, count):
+    '''Play the first count moves of the optimal solution'''
+    h = cls(numberOfDiscs, 0, 2)
+    total = (1 << numberOfDiscs) - 1
+    # replay a small game as many times as necessary
+    moves = list(HanoiSolver.solution(numberOfDiscs, 0, 2, 0, count))
+    undo = [(t, s) for s, t in reversed(moves)]
+    rounds = 1 if count <= total else count // total
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for s, t in moves:
+            h.move(s, t)
+        if rounds > 1:
+            for s, t in undo:
+                h.move(s, t)
+    elapsed = time.perf_counter() - start
+    n = rounds * len(moves) * (2 if rounds > 1 else 1)
+    return n / elapsed
+
+
+def main():
+    count = 200000
+    print('{:>6} {:>14} {:>14} {:>8}'.format(
+        'discs', 'before (m/s)', 'after (m/s)', 'speedup'))
+    for n in [4, 32, 64]:
+        before = measure(LegacyHanoi, n, count)
+        after = measure(Hanoi, n, count)
+        print('{:>6} {:>14.0f} {:>14.0f} {:>7.2f}x'.format(
+            n, before, after, after / before))
+
+
+if __name__ == '__main__':
+    main()
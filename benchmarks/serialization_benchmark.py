@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+
+# MIT License
+#
+# Copyright (c) 2020 Christopher Friedt
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+'''Serialization Benchmark
+
+Measure the time to serialize the getSession and getSessions responses,
+comparing hand-built JSON strings that were then encoded a second time as JSON
+strings (before) with the Serializer, as JSON and as MessagePack (after), and
+the getSession response body of an unchanged session from the ResponseCache.
+
+PYTHONPATH=$PWD/src python3 benchmarks/serialization_benchmark.py
+'''
+
+import importlib
+import json
+import timeit
+
+from hanoi import Hanoi
+from hanoi import Serializer
+
+
+def legacy_to_json(self):
+    '''HanoiState.to_json() as it was before the Serializer'''
+    s = ''
+    s += '{'
+    s += '"sessionId": {}'.format(self.id) + ', '
+    s += '"numberOfDiscs": {}'.format(self.numberOfDiscs) + ', '
+    s += '"fromTower": {}'.format(self.source) + ', '
+    s += '"toTower": {}'.format(self.target) + ', '
+    s += '"numberOfMoves": {}'.format(self.numberOfMoves) + ', '
+    s += '"towers": {}'.format(self.tower)
+    s += '}'
+    return s
+
+
+def main():
+    sessions = [Hanoi(64, 0, 2) for _ in range(1000)]
+    for h in sessions:
+        h.move(0, 1)
+    one = sessions[:1]
+
+    cases = [
+        ('before', lambda ss: json.dumps([legacy_to_json(h.getState()) for h in ss]).encode()),
+        ('json', lambda ss: Serializer.encode(
+            [Serializer.session(h.getState()) for h in ss])),
+        ('msgpack', lambda ss: Serializer.encode(
+            [Serializer.session(h.getState()) for h in ss], Serializer.MSGPACK)),
+    ]
+    print('{:>12} {:>8} {:>14} {:>10}'.format('path', 'encoding', 'us/response', 'bytes'))
+    for path, ss, number in [('getSession', one, 20000), ('getSessions', sessions, 20)]:
+        for name, f in cases:
+            t = min(timeit.repeat(lambda: f(ss), number=number, repeat=3)) / number
+            print('{:>12} {:>8} {:>14.1f} {:>10}'.format(path, name, t * 1e6, len(f(ss))))
+    # as getSession() does, without the request
+    # hanoi.app is also the name of the WSGI app object in the hanoi package
+    app = importlib.import_module('hanoi.app')
+    for name, mimetype in [('json', Serializer.JSON), ('msgpack', Serializer.MSGPACK)]:
+        def f():
+            return app.cached(one[0], 'session', Serializer.session, None, mimetype)[0]
+        t = min(timeit.repeat(f, number=20000, repeat=3)) / 20000
+        print('{:>12} {:>8} {:>14.1f} {:>10}'.format('cached', name, t * 1e6, len(f())))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+
+# MIT License
+#
+# Copyright (c) 2020 Christopher Friedt
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+'''Session Memory Benchmark
+
+Measure the number of bytes per resident session, comparing a dict-based
+HanoiState with a list of towers and a Lock per Hanoi object (before) with
+HanoiState views over a SessionTable (after).
+
+PYTHONPATH=$PWD/src python3 benchmarks/session_memory_benchmark.py
+'''
+
+import threading
+import tracemalloc
+
+from hanoi import Hanoi
+from hanoi import HanoiState
+from hanoi import SessionTable
+
+
+class LegacyState(object):
+    '''HanoiState as it was before the SessionTable'''
+
+    def __init__(self, id, numberOfDiscs, source, target):
+        self.id = id
+        self.numberOfDiscs = numberOfDiscs
+        self.tower = [0, 0, 0]
+        self.tower[source] = (1 << numberOfDiscs) - 1
+        self.source = source
+        self.target = target
+        self.numberOfMoves = 0
+
+
+class LegacyHanoi(object):
+    '''Hanoi as it was before the SessionTable'''
+
+    def __init__(self, id, numberOfDiscs, source, target):
+        self._state = LegacyState(id, numberOfDiscs, source, target)
+        self._lock = threading.Lock()
+
+
+def measure(factory, count):
+    '''Measure the bytes per session of count sessions in a dict'''
+    sessions = {}
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for i in range(count):
+        h = factory(i)
+        sessions[i] = h
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / count
+
+
+def main():
+    count = 200000
+    # 64 discs, so that towers do not fit in cached small ints
+    n = 64
+    print('{:>10} {:>16} {:>16}'.format(
+        'sessions', 'before (B/ses)', 'after (B/ses)'))
+    for what, legacy, factory in [
+            ('HanoiState', LegacyState, lambda i: HanoiState(n, 0, 2)),
+            ('Hanoi', LegacyHanoi, lambda i: Hanoi(n, 0, 2))]:
+        # start with an empty table so that growth is included
+        HanoiState.table = SessionTable(1)
+        before = measure(lambda i: legacy(i, n, 0, 2), count)
+        after = measure(factory, count)
+        print('{:>10} {:>16.1f} {:>16.1f}  {}'.format(
+            count, before, after, what))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+
+# MIT License
+#
+# Copyright (c) 2020 Christopher Friedt
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+'''Worker Benchmark
+
+Measure the total moves/sec of 1, 2 and 4 worker processes that share one
+SharedSessionStore, each playing its own games, and compare it with the same
+number of threads sharing one in-memory SessionStore. Threads are limited by
+the interpreter lock, whereas processes should scale with the number of CPUs.
+
+PYTHONPATH=$PWD/src python3 benchmarks/worker_benchmark.py
+'''
+
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+
+from hanoi import HanoiSolver
+from hanoi import SessionStore
+from hanoi import SharedSessionStore
+
+numberOfDiscs = 10
+games = 16
+
+
+def play(store, duration):
+    '''Play games of store for duration seconds, returning the number of moves'''
+    sessions = [store.create(numberOfDiscs, 0, 2) for _ in range(games)]
+    moves = list(HanoiSolver.solution(numberOfDiscs, 0, 2))
+    undo = [(t, s) for s, t in reversed(moves)]
+    n = 0
+    end = time.monotonic() + duration
+    while time.monotonic() < end:
+        for h in sessions:
+            for s, t in moves if h.isComplete() is False else undo:
+                h.move(s, t)
+            n += len(moves)
+            if time.monotonic() >= end:
+                break
+    return n
+
+
+def worker(path, duration, result):
+    store = SharedSessionStore(path)
+    n = play(store, duration)
+    with result.get_lock():
+        result.value += n
+    store.close()
+
+
+def processes(count, duration):
+    path = os.path.join(tempfile.mkdtemp(), 'shared')
+    SharedSessionStore(path, 1 << 16).close()
+    result = multiprocessing.Value('Q', 0)
+    fork = multiprocessing.get_context('fork')
+    workers = [fork.Process(target=worker, args=(path, duration, result))
+               for _ in range(count)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    os.remove(path)
+    os.rmdir(os.path.dirname(path))
+    return result.value / duration
+
+
+def threads(count, duration):
+    store = SessionStore()
+    results = [0] * count
+
+    def run(i):
+        results[i] = play(store, duration)
+
+    workers = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return sum(results) / duration
+
+
+def main():
+    duration = 3
+    print('{} CPUs'.format(os.cpu_count()))
+    print('{:>8} {:>16} {:>16}'.format(
+        'workers', 'threads (m/s)', 'processes (m/s)'))
+    for count in [1, 2, 4]:
+        print('{:>8} {:>16.0f} {:>16.0f}'.format(
+            count, threads(count, duration), processes(count, duration)))
+
+
+if __name__ == '__main__':
+    main()
@@ -22,12 +22,31 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+import atexit
 import os
 import sys
+import tempfile
 
 sys.path.append(os.environ['PWD'] + '/src')
 
-from hanoi import app
+port = int(os.environ.get('HANOI_PORT', '8080'))
+# serve requests with this many worker processes, which share all sessions
+workers = int(os.environ.get('HANOI_WORKERS', '1'))
+if workers > 1 and not os.environ.get('HANOI_SHARED'):
+    shm = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    os.environ['HANOI_SHARED'] = os.path.join(shm, 'hanoi-{}'.format(os.getpid()))
+
+    @atexit.register
+    def remove():
+        # the session table, and the outcomes of idempotent requests
+        for suffix in ('', '.keys'):
+            if os.path.exists(os.environ['HANOI_SHARED'] + suffix):
+                os.remove(os.environ['HANOI_SHARED'] + suffix)
+
+from hanoi import app  # noqa: E402
 
 if __name__ == '__main__':
-    app.run(host='::', port=8080)
+    if workers > 1:
+        app.run(host='::', port=port, threaded=False, processes=workers)
+    else:
+        app.run(host='::', port=port)
@@ -0,0 +1,325 @@
+# MIT License
+#
+# Copyright (c) 2020 Christopher Friedt
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+'''The FrameStewart Class
+
+The FrameStewart Class solves the Towers of Hanoi with more than 3 towers,
+e.g. Reve's puzzle with 4, using the Frame-Stewart algorithm.
+
+To move n discs from source to target with k towers, the i smallest discs are
+first moved to an intermediate tower using all k towers, then the n - i
+largest discs are moved to target using the k - 1 remaining towers, and
+finally the i smallest discs are moved on top of them, again with k towers.
+With the best split i, this takes
+
+FS(n, k) = min(2 FS(i, k) + FS(n - i, k - 1)) for 1 <= i < n
+
+moves, where FS(n, 3) = 2^n - 1. This is optimal for 4 towers and conjectured
+to be optimal for more. The number of moves and the best split for every
+number of discs up to 64 and every number of towers up to 8 are computed once,
+when this module is loaded, and shared by every session.
+
+Individual moves of a solution are found by descending into the split that
+contains them, so any move can be found in O(N) and a solution can be
+streamed without building a move list.
+
+Hints for a game in progress place the discs on the target from largest to
+smallest. If the m smallest discs are on the path of the solution that moves
+them from some tower to their goal, e.g. if the game has followed the
+solution so far, their position on that path is found in O(N) and the rest of
+that solution may be used. Otherwise, if disc m is not on its goal, the
+smaller discs are first gathered on whichever spare tower is cheapest, then
+disc m is moved, and then the smaller discs follow as a Frame-Stewart tower.
+The cheaper of both is used, memoized by (m, goal), which takes O(N^2 k^2).
+With 3 towers, this is the optimal solution, but with more towers, hints for
+arbitrary states are not guaranteed to be optimal.
+
+Supported operations are:
+
+numberOfMoves = moves(numberOfDiscs, numberOfTowers)
+i = split(numberOfDiscs, numberOfTowers)
+(source, target) = moveAt(numberOfDiscs, numberOfTowers, source, target, k)
+for (source, target) in solution(numberOfDiscs, numberOfTowers, source, target, offset): ...
+k = position(numberOfDiscs, source, target, tower)
+(distance, moves) = plan(numberOfDiscs, source, target, tower)
+'''
+
+from hanoi.SessionTable import SessionTable
+
+MAX_DISCS = 64
+
+
+def _tables():
+    '''Compute the number of moves and best split for every n and k'''
+    moves = [None] * (SessionTable.MAX_TOWERS + 1)
+    splits = [None] * (SessionTable.MAX_TOWERS + 1)
+    moves[3] = [(1 << n) - 1 for n in range(MAX_DISCS + 1)]
+    splits[3] = [0] * (MAX_DISCS + 1)
+    for k in range(4, SessionTable.MAX_TOWERS + 1):
+        m = [0, 1]
+        s = [0, 0]
+        for n in range(2, MAX_DISCS + 1):
+            best = None
+            for i in range(1, n):
+                c = 2 * m[i] + moves[k - 1][n - i]
+                if best is None or c < best:
+                    best = c
+                    split = i
+            m.append(best)
+            s.append(split)
+        moves[k] = m
+        splits[k] = s
+    return moves, splits
+
+
+class FrameStewart(object):
+
+    # _moves[k][n] is FS(n, k), and _splits[k][n] the best i
+    _moves, _splits = _tables()
+
+    @staticmethod
+    def moves(numberOfDiscs, numberOfTowers):
+        '''Get the number of moves of the Frame-Stewart solution'''
+        return FrameStewart._moves[numberOfTowers][numberOfDiscs]
+
+    @staticmethod
+    def split(numberOfDiscs, numberOfTowers):
+        '''Get the number of discs that are moved aside first'''
+        return FrameStewart._splits[numberOfTowers][numberOfDiscs]
+
+    @staticmethod
+    def _via(towers, source, target):
+        '''Get the intermediate tower of a split'''
+        for t in towers:
+            if t != source and t != target:
+                return t
+
+    @staticmethod
+    def _relative(numberOfDiscs, source, target, other):
+        '''Map relative tower numbers of the 3-tower solution to towers
+
+        See HanoiSolver._towers().
+        '''
+        if numberOfDiscs & 1:
+            return (source, other, target)
+        return (source, target, other)
+
+    @staticmethod
+    def moveAt(numberOfDiscs, numberOfTowers, source, target, k):
+        '''Get move k (0-based) of the solution'''
+        n = numberOfDiscs
+        towers = list(range(numberOfTowers))
+        while True:
+            if len(towers) == 3:
+                t = FrameStewart._relative(
+                    n, source, target, FrameStewart._via(towers, source, target))
+                m = k + 1
+                return (t[(m & (m - 1)) % 3], t[((m | (m - 1)) + 1) % 3])
+            if n == 1:
+                return (source, target)
+            i = FrameStewart._splits[len(towers)][n]
+            a = FrameStewart._moves[len(towers)][i]
+            b = FrameStewart._moves[len(towers) - 1][n - i]
+            via = FrameStewart._via(towers, source, target)
+            if k < a:
+                n, target = i, via
+            elif k < a + b:
+                n, k = n - i, k - a
+                towers = [t for t in towers if t != via]
+            else:
+                n, k, source = i, k - a - b, via
+
+    @staticmethod
+    def solution(numberOfDiscs, numberOfTowers, source, target, offset=0):
+        '''Generate the solution, starting at move offset (0-based)'''
+        return FrameStewart._solution(
+            numberOfDiscs, source, target, list(range(numberOfTowers)), offset)
+
+    @staticmethod
+    def _solution(n, source, target, towers, skip):
+        if n == 0:
+            return
+        k = len(towers)
+        if k == 3:
+            t = FrameStewart._relative(
+                n, source, target, FrameStewart._via(towers, source, target))
+            for m in range(skip + 1, 1 << n):
+                yield (t[(m & (m - 1)) % 3], t[((m | (m - 1)) + 1) % 3])
+            return
+        if n == 1:
+            if skip == 0:
+                yield (source, target)
+            return
+        i = FrameStewart._splits[k][n]
+        a = FrameStewart._moves[k][i]
+        b = FrameStewart._moves[k - 1][n - i]
+        via = FrameStewart._via(towers, source, target)
+        if skip < a:
+            yield from FrameStewart._solution(i, source, via, towers, skip)
+            skip = 0
+        else:
+            skip -= a
+        if skip < b:
+            yield from FrameStewart._solution(
+                n - i, source, target, [t for t in towers if t != via], skip)
+            skip = 0
+        else:
+            skip -= b
+        yield from FrameStewart._solution(i, via, target, towers, skip)
+
+    @staticmethod
+    def position(numberOfDiscs, source, target, tower):
+        '''Get the number of moves of the solution that lead to tower
+
+        Returns None if tower is not on the path of the solution.
+        '''
+        return FrameStewart._position(
+            tower, 0, numberOfDiscs, source, target, list(range(len(tower))))
+
+    @staticmethod
+    def _position3(tower, lo, hi, source, target, other):
+        '''Get the position of discs lo to hi - 1 on the path of the 3-tower solution'''
+        p = 0
+        for d in range(hi - 1, lo - 1, -1):
+            bit = 1 << d
+            if tower[source] & bit:
+                target, other = other, target
+            elif tower[target] & bit:
+                # the smaller discs were moved aside, then disc d moved
+                p += 1 << (d - lo)
+                source, other = other, source
+            else:
+                return None
+        return p
+
+    @staticmethod
+    def _position(tower, lo, hi, source, target, towers):
+        '''Get the position of discs lo to hi - 1 on the path of the solution'''
+        n = hi - lo
+        if n == 0:
+            return 0
+        k = len(towers)
+        if k == 3:
+            return FrameStewart._position3(
+                tower, lo, hi, source, target, FrameStewart._via(towers, source, target))
+        if n == 1:
+            if tower[source] & (1 << lo):
+                return 0
+            if tower[target] & (1 << lo):
+                return 1
+            return None
+        i = FrameStewart._splits[k][n]
+        mid = lo + i
+        a = FrameStewart._moves[k][i]
+        b = FrameStewart._moves[k - 1][n - i]
+        via = FrameStewart._via(towers, source, target)
+        large = (1 << hi) - (1 << mid)
+        small = (1 << mid) - (1 << lo)
+        if tower[source] & large == large:
+            return FrameStewart._position(tower, lo, mid, source, via, towers)
+        if tower[target] & large == large:
+            p = FrameStewart._position(tower, lo, mid, via, target, towers)
+            return None if p is None else a + b + p
+        if tower[via] & small != small:
+            return None
+        p = FrameStewart._position(
+            tower, mid, hi, source, target, [t for t in towers if t != via])
+        return None if p is None else a + p
+
+    @staticmethod
+    def plan(numberOfDiscs, source, target, tower):
+        '''Get the number of moves to complete tower and a generator of them
+
+        tower is not modified, but must not change while moves are generated.
+        '''
+        cost = {}
+        distance = FrameStewart._cost(tower, numberOfDiscs, target, cost)
+        return distance, FrameStewart._plan(tower, numberOfDiscs, target, cost)
+
+    @staticmethod
+    def _cost(tower, m, goal, cost):
+        '''Get the number of moves to bring the m smallest discs to goal
+
+        cost memoizes (m, goal) to (moves, how) for _plan(), where how is
+        either None if the discs are already on goal or the largest of them
+        is, ('path', source, position) if the discs are on the path of the
+        solution from source, or ('spare', t) if the smaller discs are first
+        gathered on t.
+        '''
+        key = (m, goal)
+        if key in cost:
+            return cost[key][0]
+        if m == 0:
+            cost[key] = (0, None)
+            return 0
+        k = len(tower)
+        towers = list(range(k))
+        bit = 1 << (m - 1)
+        d = 0
+        while not tower[d] & bit:
+            d += 1
+        if d == goal:
+            best = (FrameStewart._cost(tower, m - 1, goal, cost), None)
+        else:
+            best = FrameStewart._spare(tower, m, d, goal, cost)
+        for t in towers:
+            if t != goal:
+                p = FrameStewart._position(tower, 0, m, t, goal, towers)
+                if p is not None and FrameStewart._moves[k][m] - p < best[0]:
+                    best = (FrameStewart._moves[k][m] - p, ('path', t, p))
+        cost[key] = best
+        return best[0]
+
+    @staticmethod
+    def _spare(tower, m, d, goal, cost):
+        '''Get (moves, how) of gathering the smaller discs on the cheapest spare
+
+        The m - 1 smallest discs are gathered on a tower other than d and goal,
+        then disc m is moved from d to goal, and the smaller discs follow it.
+        '''
+        k = len(tower)
+        best = None
+        for t in range(k):
+            if t != d and t != goal:
+                c = FrameStewart._cost(tower, m - 1, t, cost)
+                if best is None or c < best[0]:
+                    best = (c, ('spare', t))
+        return (best[0] + 1 + FrameStewart._moves[k][m - 1], best[1])
+
+    @staticmethod
+    def _plan(tower, m, goal, cost):
+        if m == 0:
+            return
+        k = len(tower)
+        how = cost[(m, goal)][1]
+        if how is None:
+            yield from FrameStewart._plan(tower, m - 1, goal, cost)
+        elif how[0] == 'path':
+            yield from FrameStewart._solution(m, how[1], goal, list(range(k)), how[2])
+        else:
+            spare = how[1]
+            yield from FrameStewart._plan(tower, m - 1, spare, cost)
+            d = 0
+            while not tower[d] & (1 << (m - 1)):
+                d += 1
+            yield (d, goal)
+            yield from FrameStewart._solution(m - 1, spare, goal, list(range(k)), 0)
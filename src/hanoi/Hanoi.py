@@ -20,9 +20,18 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+import contextlib
+import itertools
+import operator
 import threading
+import time
 
+from hanoi import HanoiOracle
+from hanoi.HanoiHistory import HanoiHistory
+from hanoi.Metrics import Metrics
+from hanoi import HanoiSolver
 from hanoi import HanoiState
+from hanoi.SessionTable import SessionTable
 
 '''The Hanoi Class
 
@@ -31,25 +40,104 @@ The Hanoi Class provides a means to operate on a HanoiState instance.
 Supported operations are:
 
 numberOfMoves = solve()
-move(source, target)
-state = getState()
+h = Hanoi(numberOfDiscs, source, target, numberOfTowers)
+[h, ...] = createMany([(numberOfDiscs, source, target, numberOfTowers), ...])
+h = restore(id, numberOfDiscs, source, target, numberOfMoves, tower, numberOfTowers, table)
+h = attach(state, lock)
+setMaxPending(count)
+subscribe(observer)
+evict()
+release()
+with locked(timeout): ...
+move(source, target, expectedMoves=None)
+moves([(source, target), ...], expectedMoves=None)
+undo(expectedMoves=None)
+redo(expectedMoves=None)
+(first, b) = history()
+[(source, target), ...] = legalMoves()
+snapshot = getState()
+(distance, moves) = hint(count)
+(distance, moves) = distance(tower, count)
+
+Every move is recorded in a HanoiHistory, so that it can be undone and redone,
+unless HanoiHistory.limit is 0. If HanoiHistory.limit is set, only the last
+HanoiHistory.limit moves or so are kept.
+Undoing a move is a move in its own right, i.e. it increments numberOfMoves
+and is seen by observers. The history is not kept for states attached to a
+shared table, since other processes move them as well.
+
+Moves are serialized by a lock, but reads are not. Every move marks the
+SessionTable record of the state as being written before modifying it, and as
+consistent afterwards, and getState() copies the record into an immutable
+HanoiSnapshot without taking the lock. isComplete(), legalMoves(), hint()
+and distance() operate on such a snapshot, so polling clients never contend
+with players or with each other. Moves that have to wait for the lock record
+the time waited in Metrics.default.
+
+Every operation that takes the lock waits for at most timeout seconds, if
+timeout is not -1, and raises TimeoutError otherwise. No more than maxPending
+threads wait for the lock of one session at a time; further callers get a
+Hanoi.Busy error right away, so that a hot session cannot tie up every worker
+thread of a server.
+
+Moves, undo() and redo() can be made conditional on the number of moves made
+so far, i.e. compare-and-set on numberOfMoves. If expectedMoves is given and
+does not match, nothing is moved and a Hanoi.Conflict with the current state is
+raised, so that a client which retries a move, or pipelines several moves,
+never applies one twice or out of order.
+
+A store that evicts a session from memory calls evict(), so that callers
+which still hold the evicted object get a Hanoi.Evicted error instead of
+making moves that would be lost, and look the session up again. The record of
+the state is given back to its SessionTable at the same time, and so it is by
+release(), once a session that is not held by a store is no longer needed.
 '''
 
 
 class Hanoi(object):
 
+    class Busy(TimeoutError):
+        '''Too many callers are already waiting for the session'''
+
+    class Conflict(ValueError):
+        '''The session has not made the expected number of moves
+
+        state is a HanoiSnapshot of the session at the time.
+        '''
+
+        def __init__(self, message, state):
+            super().__init__(message)
+            self.state = state
+
+    class Evicted(LookupError):
+        '''The session is no longer held by its store, and must be looked up again'''
+
+    # _history is None until the first move, and False if it is not kept
+    __slots__ = ('_state', '_lock', '_observers', '_history')
+
+    # the maximum number of threads waiting for the lock of a session, or None
+    maxPending = None
+    # the number of threads waiting for the lock of each session, by id
+    _pending = {}
+    _pendingLock = threading.Lock()
+
+    @staticmethod
+    def setMaxPending(count):
+        '''Set the maximum number of threads waiting for the lock of a session
+
+        None allows any number of threads to wait.
+        '''
+        if count is not None and count < 0:
+            raise ValueError('count {} is invalid'.format(count))
+        Hanoi.maxPending = count
+
     @staticmethod
     def popcount(x):
         '''Count the number of set bits in an unsigned integer.
         Like the GCC builtin __builtin_popcount(), or 'population count'
         See https://gcc.gnu.org/onlinedocs/gcc/Other-Builtins.html
         '''
-        r = 0
-        while x:
-            if x & 1:
-                r += 1
-            x >>= 1
-        return r
+        return bin(x).count('1')
 
     @staticmethod
     def fls(x):
@@ -59,67 +147,437 @@ class Hanoi(object):
         if not x:
             raise ValueError('fls should not be called with x == 0')
 
-        r = 0
-        while not (x & 1):
-            x >>= 1
-            r += 1
-        return r
+        # x & -x isolates the least-significant set bit
+        return (x & -x).bit_length() - 1
+
+    @staticmethod
+    def kernel(tower, source, target, base=0):
+        '''Move the top disc from source to target in a list of towers
+
+        This is the move kernel. Towers are modified in place and the
+        mask of the disc that was moved is returned. Each tower is tested
+        with a constant number of integer operations, regardless of the
+        number of discs. Source and target are assumed to be valid.
+
+        Tower 0 is found at index base of tower, which allows the kernel to
+        operate directly on a SessionTable record.
+        '''
+        source += base
+        target += base
+        src = tower[source]
+        if not src:
+            raise ValueError('source {} is empty'.format(source - base))
+        # the top of each tower is its least-significant set bit
+        mask = src & -src
+        dst = tower[target]
+        if dst:
+            top = dst & -dst
+            # cannot put a larger disc on top of a smaller disc
+            if mask > top:
+                raise ValueError('cannot put disc {} on top of disc {}'.format(
+                    mask.bit_length(), top.bit_length()))
+        tower[source] = src ^ mask
+        tower[target] = dst | mask
+        return mask
+
+    @staticmethod
+    def legal(tower):
+        '''Get all legal (source, target) moves for a list of towers'''
+        tops = [t & -t for t in tower]
+        towers = range(len(tops))
+        return [(s, t) for s in towers for t in towers
+                if s != t and tops[s] and (not tops[t] or tops[s] < tops[t])]
 
-    def __init__(self, numberOfDiscs, source, target):
+    def __init__(self, numberOfDiscs, source, target, numberOfTowers=3):
         '''Initialize a Hanoi object'''
-        self._state = HanoiState(numberOfDiscs, source, target)
+        self._state = HanoiState(numberOfDiscs, source, target,
+                                 numberOfTowers=numberOfTowers)
         self._lock = threading.Lock()
+        self._observers = ()
+        self._history = None
 
-    def getState(self, timeout=-1):
-        '''Get a copy of the internal state'''
-        locked = self._lock.acquire(timeout=timeout)
-        if locked:
-            s = self._state
+    @staticmethod
+    def createMany(games):
+        '''Create a Hanoi object per game, with consecutive ids
+
+        See HanoiState.createMany()
+        '''
+        hs = []
+        for state in HanoiState.createMany(games):
+            h = Hanoi.__new__(Hanoi)
+            h._state = state
+            h._lock = threading.Lock()
+            h._observers = ()
+            h._history = None
+            hs.append(h)
+        return hs
+
+    @staticmethod
+    def restore(id, numberOfDiscs, source, target, numberOfMoves=0, tower=None,
+                numberOfTowers=3, table=None):
+        '''Restore a Hanoi object from persistent storage
+
+        See HanoiState.restore()
+        '''
+        h = Hanoi.__new__(Hanoi)
+        h._state = HanoiState.restore(
+            id, numberOfDiscs, source, target, numberOfMoves, tower, numberOfTowers, table)
+        h._lock = threading.Lock()
+        h._observers = ()
+        h._history = None
+        return h
+
+    @staticmethod
+    def attach(state, lock):
+        '''Get a Hanoi object for an existing HanoiState
+
+        This is used to operate on states of a shared SessionTable, where
+        lock must exclude other processes as well as other threads.
+        '''
+        h = Hanoi.__new__(Hanoi)
+        h._state = state
+        h._lock = lock
+        h._observers = ()
+        # other processes (or a HanoiBatch) move the state as well
+        h._history = False
+        return h
+
+    def subscribe(self, observer):
+        '''Call observer(hanoi, numberOfMoves, moves) after every move
+
+        The observer is called with the lock held, after moves (a list of
+        (source, target) pairs) have been applied successfully, and
+        numberOfMoves is the number of moves that had been made before.
+        If the observer raises an exception, the moves are rolled back.
+        '''
+        self._observers += (observer,)
+
+    def unsubscribe(self, observer):
+        '''Stop calling observer after every move'''
+        self._observers = tuple(o for o in self._observers if o != observer)
+
+    def evict(self):
+        '''Make every further move fail with Hanoi.Evicted
+
+        This is called with the lock held, when a store stops holding this
+        object. Failing moves are rolled back like any other failed move, and
+        the record of the state is released, see _detach().
+        '''
+        self._observers = (Hanoi._evicted,)
+        self._detach()
+
+    def release(self):
+        '''Give the record of the state back to its SessionTable
+
+        This is up to the owner of a session that is not held by a store,
+        once it is no longer needed. The object still reads the last state.
+        '''
+        self._acquire(-1)
+        try:
+            self._detach()
+        finally:
             self._lock.release()
-        else:
-            raise TimeoutError()
+
+    def _detach(self):
+        '''Release the record of the state with the lock held
+
+        The state is replaced by one over a private copy of the record, in a
+        single assignment, so that readers without the lock see either one.
+        '''
+        state = self._state.detach()
+        if state is not None:
+            self._state = state
+
+    @staticmethod
+    def _evicted(h, numberOfMoves, moves):
+        raise Hanoi.Evicted('session {} was evicted'.format(h._state.id))
+
+    def _notify(self, numberOfMoves, moves):
+        for observer in self._observers:
+            observer(self, numberOfMoves, moves)
+
+    def _acquire(self, timeout):
+        '''Acquire the lock, or raise TimeoutError
+
+        Callers are only counted against maxPending, and the time they wait
+        recorded in Metrics.default, if the lock is contended.
+        '''
+        if self._lock.acquire(False):
+            return
+        id = self._state.id
+        if not timeout:
+            raise TimeoutError('session {} is locked'.format(id))
+        pending = Hanoi._pending
+        Hanoi._pendingLock.acquire()
+        try:
+            n = pending.get(id, 0)
+            if Hanoi.maxPending is not None and n >= Hanoi.maxPending:
+                raise Hanoi.Busy('session {} is busy'.format(id))
+            pending[id] = n + 1
+        finally:
+            Hanoi._pendingLock.release()
+        start = time.perf_counter()
+        try:
+            locked = self._lock.acquire(timeout=timeout)
+        finally:
+            Hanoi._pendingLock.acquire()
+            try:
+                n = pending[id] - 1
+                if n:
+                    pending[id] = n
+                else:
+                    del pending[id]
+            finally:
+                Hanoi._pendingLock.release()
+        if not locked:
+            raise TimeoutError('timed out waiting for session {}'.format(id))
+        Metrics.default.wait(time.perf_counter() - start)
+
+    @contextlib.contextmanager
+    def locked(self, timeout=-1):
+        '''Hold the lock for the duration of a with statement
+
+        Like every other operation, this waits for at most timeout seconds,
+        and raises TimeoutError, or Hanoi.Busy, instead.
+        '''
+        self._acquire(timeout)
+        try:
+            yield self
+        finally:
+            self._lock.release()
+
+    def getState(self, timeout=-1):
+        '''Get an immutable HanoiSnapshot of the state
+
+        The snapshot is taken without locking, so readers never wait for
+        each other, and only wait (for up to timeout seconds) if a move is
+        in progress at the time.
+        '''
+        s = self._state.snapshot()
+        if s is None:
+            self._acquire(timeout)
+            try:
+                s = self._state.snapshot()
+            finally:
+                self._lock.release()
         return s
 
-    def move(self, source, target, timeout=-1):
-        '''Move the top disc from source to target'''
-        if source < 0 or source > 2:
+    @staticmethod
+    def _check(source, target, numberOfTowers=3):
+        '''Check that source and target are valid towers'''
+        if source < 0 or source >= numberOfTowers:
             raise ValueError('source {} is invalid'.format(source))
-        if target < 0 or target > 2:
+        if target < 0 or target >= numberOfTowers:
             raise ValueError('target {} is invalid'.format(target))
         if source == target:
             raise ValueError('source may not equal target')
 
-        locked = self._lock.acquire(timeout=timeout)
-        if locked:
-            if Hanoi.popcount(self._state.tower[source]) == 0:
-                raise ValueError('source {} is empty'.format(source))
-            froN = Hanoi.fls(self._state.tower[source])
-            if Hanoi.popcount(self._state.tower[target]) != 0:
-                toN = Hanoi.fls(self._state.tower[target])
-                # cannot put a larger disc on top of a smaller disc
-                if froN > toN:
-                    raise ValueError(
-                        'cannot put disc {} on top of disc {}'.format(froN + 1, toN + 1))
-            N = froN
-            mask = 1 << N
-            # remove disc N from the source tower
-            self._state.tower[source] &= ~mask
-            # add disc N to the target tower
-            self._state.tower[target] |= mask
-            self._state.numberOfMoves += 1
-            self._lock.release()
+    def _move(self, source, target):
+        '''Move the top disc from source to target with the lock held'''
+        words = self._state._table.words
+        base = self._state._base
+        Hanoi.kernel(words, source, target, base + SessionTable.TOWER)
+        words[base + SessionTable.MOVES] += 1
+
+    def move(self, source, target, timeout=-1, expectedMoves=None):
+        '''Move the top disc from source to target
+
+        If expectedMoves is not None, the disc is only moved if exactly
+        expectedMoves moves have been made, see Hanoi.Conflict.
+        '''
+        words = self._state._table.words
+        meta = self._state._base + SessionTable.META
+        # the number of towers of a record never changes
+        Hanoi._check(source, target, ((words[meta] >> 12) & 0xf) + 3)
+        self._step(source, target, 0, timeout, expectedMoves)
+
+    def undo(self, timeout=-1, expectedMoves=None):
+        '''Undo the last move
+
+        The disc that was moved last is moved back. Like any other move, this
+        increments numberOfMoves and is seen by observers.
+        '''
+        self._step(None, None, -1, timeout, expectedMoves)
+
+    def redo(self, timeout=-1, expectedMoves=None):
+        '''Make the last move that was undone again'''
+        self._step(None, None, 1, timeout, expectedMoves)
+
+    def _newHistory(self):
+        '''Get a new HanoiHistory, or False if no history is kept'''
+        if HanoiHistory.limit == 0:
+            return False
+        return HanoiHistory(self._state.numberOfMoves)
+
+    def _expect(self, expectedMoves):
+        '''Check that expectedMoves moves have been made, with the lock held'''
+        numberOfMoves = self._state.numberOfMoves
+        if numberOfMoves != expectedMoves:
+            raise Hanoi.Conflict('expected {} moves but session {} has made {}'.format(
+                expectedMoves, self._state.id, numberOfMoves), self._state.snapshot())
+
+    def _pick(self, source, target, direction):
+        '''Get the history and the (source, target) move of a step, with the lock held'''
+        history = self._history
+        if history is None:
+            history = self._history = self._newHistory()
+        if not direction:
+            return history, source, target
+        if history is False:
+            raise ValueError('the history of session {} is not available'.format(
+                self._state.id))
+        if direction < 0:
+            target, source = history.undo()
         else:
-            raise TimeoutError()
+            source, target = history.redo()
+        return history, source, target
 
-    def isComplete(self, timeout=-1):
-        '''Get a copy of the internal state'''
-        locked = self._lock.acquire(timeout=timeout)
-        complete = False
-        if locked:
-            n = self._state.numberOfDiscs
-            t = target = self._state.target
-            complete = self._state.tower[t] == ((1 << n) - 1)
+    def _record(self, history, source, target, direction):
+        '''Record a step that was made in the history, with the lock held'''
+        if direction < 0:
+            history.undone()
+        elif direction > 0:
+            history.redone(self._state.numberOfMoves)
+        elif history is not False:
+            history.push(source, target, self._state.numberOfMoves)
+
+    def _step(self, source, target, direction, timeout, expectedMoves=None):
+        '''Make a new move (direction 0), or undo (-1) or redo (1) a move'''
+        self._acquire(timeout)
+        try:
+            # the state may have been detached while the lock was awaited
+            words = self._state._table.words
+            meta = self._state._base + SessionTable.META
+            if expectedMoves is not None:
+                self._expect(expectedMoves)
+            history, source, target = self._pick(source, target, direction)
+            # SessionTable.begin() and end(), inlined
+            words[meta] = (words[meta] + SessionTable.SEQUENCE) & SessionTable.WORD
+            try:
+                self._move(source, target)
+                if self._observers:
+                    try:
+                        self._notify(self._state.numberOfMoves - 1,
+                                     [(source, target)])
+                    except Exception:
+                        # roll back
+                        self._move(target, source)
+                        self._state.numberOfMoves -= 2
+                        raise
+            finally:
+                words[meta] = (words[meta] + SessionTable.SEQUENCE) & SessionTable.WORD
+            self._record(history, source, target, direction)
+        finally:
             self._lock.release()
-        else:
-            raise TimeoutError()
-        return complete
+
+    @staticmethod
+    def _pair(m, numberOfTowers):
+        '''Get a checked (source, target) pair from a move of a sequence'''
+        try:
+            source, target = m
+            source, target = operator.index(source), operator.index(target)
+        except (TypeError, ValueError):
+            raise ValueError('expected (source, target) but got {}'.format(m)) from None
+        Hanoi._check(source, target, numberOfTowers)
+        return source, target
+
+    def _apply(self, moves):
+        '''Apply a sequence of moves and notify observers, with the lock held
+
+        If any move fails, or an observer raises an exception, every move
+        is rolled back and the exception raised again.
+        '''
+        tower = list(self._state.tower)
+        numberOfMoves = self._state.numberOfMoves
+        applied = []
+        try:
+            for i, m in enumerate(moves):
+                try:
+                    source, target = Hanoi._pair(m, len(tower))
+                    self._move(source, target)
+                except ValueError as e:
+                    raise ValueError('move {}: {}'.format(i, e)) from None
+                applied.append((source, target))
+            if self._observers and applied:
+                self._notify(numberOfMoves, applied)
+        except Exception:
+            # roll back
+            self._state.tower = tower
+            self._state.numberOfMoves = numberOfMoves
+            raise
+        return applied
+
+    def moves(self, moves, timeout=-1, expectedMoves=None):
+        '''Apply a sequence of (source, target) moves atomically
+
+        Either every move is applied, or the state is left unchanged and a
+        ValueError identifies the index of the first illegal or malformed
+        move. If expectedMoves is not None, no move is applied unless exactly
+        expectedMoves moves have been made, see Hanoi.Conflict.
+        '''
+        self._acquire(timeout)
+        try:
+            if expectedMoves is not None:
+                self._expect(expectedMoves)
+            table = self._state._table
+            base = self._state._base
+            if self._history is None:
+                self._history = self._newHistory()
+            table.begin(base)
+            try:
+                applied = self._apply(moves)
+            finally:
+                table.end(base)
+            if self._history is not False:
+                number = self._state.numberOfMoves - len(applied)
+                for s, t in applied:
+                    number += 1
+                    self._history.push(s, t, number)
+        finally:
+            self._lock.release()
+
+    def history(self, timeout=-1):
+        '''Get the moves to the current state, packed one per byte
+
+        The history begins when this object is created, i.e. when the
+        session is created, or loaded from storage, and only holds the last
+        HanoiHistory.limit moves or so, if that is set. first is the number
+        of moves made in the state in which the returned moves begin. See
+        HanoiHistory.
+        '''
+        self._acquire(timeout)
+        try:
+            if self._history is False:
+                raise ValueError('the history of session {} is not available'.format(
+                    self._state.id))
+            if self._history is None:
+                return self._state.numberOfMoves, b''
+            return self._history.first, self._history.packed()
+        finally:
+            self._lock.release()
+
+    def legalMoves(self, timeout=-1):
+        '''Get all legal (source, target) moves'''
+        return Hanoi.legal(self.getState(timeout).tower)
+
+    def isComplete(self, timeout=-1):
+        '''Check whether all discs are on the target tower'''
+        return self.getState(timeout).isComplete()
+
+    def hint(self, count=1, timeout=-1):
+        '''Get the remaining distance and the next count optimal moves'''
+        s = self.getState(timeout)
+        return HanoiSolver.distance(s), HanoiSolver.nextMoves(s, count)
+
+    def distance(self, tower=None, count=0, timeout=-1):
+        '''Get the distance and the first count moves of a shortest path to tower
+
+        If tower is None, this is the path back to the initial configuration.
+        '''
+        s = self.getState(timeout)
+        if tower is None:
+            tower = [0] * len(s.tower)
+            tower[s.source] = (1 << s.numberOfDiscs) - 1
+        distance = HanoiOracle.distance(s.numberOfDiscs, s.tower, tower)
+        moves = HanoiOracle.path(s.numberOfDiscs, s.tower, tower)
+        return distance, list(itertools.islice(moves, count))
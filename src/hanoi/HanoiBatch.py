@@ -0,0 +1,160 @@
+# MIT License
+#
+# Copyright (c) 2020 Christopher Friedt
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+'''The HanoiBatch Class
+
+The HanoiBatch Class plays many games at once, e.g. for simulations or for
+grading, where millions of moves would otherwise go through Hanoi.move() one
+Python call at a time.
+
+The games of a batch are the records of a SessionTable of their own, and the
+words of that table are viewed as a NumPy array of uint64, with one row (or
+lane) per game. A step applies one move to every lane with a constant number
+of vectorised operations: the top discs are isolated with x & -x, as in
+Hanoi.kernel(), illegal moves are flagged per lane, and legal moves are
+applied to the towers and counted. Lanes with illegal moves are left
+unchanged.
+
+Since the records are ordinary SessionTable records, batch[i] is a Hanoi
+object that operates on lane i, e.g. to take a snapshot, to get a hint or to
+make a single move. Every lane shares the lock of the batch, and steps mark
+the records they modify as being written, so snapshots are consistent with
+steps as well. Observers of a lane are not notified of moves made by steps.
+
+This class requires NumPy, and is not imported by the hanoi package.
+
+Supported operations are:
+
+batch = HanoiBatch(numberOfSessions, numberOfDiscs, source, target, numberOfTowers)
+h = batch[i]
+codes = move(sources, targets)
+[complete, ...] = isComplete()
+'''
+
+import threading
+
+import numpy as np
+
+from hanoi.Hanoi import Hanoi
+from hanoi.HanoiState import HanoiState
+from hanoi.SessionTable import SessionTable
+
+
+class HanoiBatch(object):
+
+    # the per-lane result codes of move()
+    OK = 0
+    # source or target is not a tower of the game, or source == target
+    INVALID = 1
+    # source is empty
+    EMPTY = 2
+    # the top disc of source is larger than the top disc of target
+    LARGER = 3
+
+    def __init__(self, numberOfSessions, numberOfDiscs=4, source=0, target=2,
+                 numberOfTowers=3):
+        '''Initialize a HanoiBatch object
+
+        Upon initialization, every game has numberOfDiscs discs on source.
+        Session ids are allocated by the table of the batch, so they are
+        only unique within the batch.
+
+        :param numberOfSessions: the number of games, i.e. lanes
+        :param numberOfDiscs: the number of discs in each game
+        :param source: the tower from which discs should be moved
+        :param target: the tower to which discs should be moved
+        :param numberOfTowers: the number of towers in each game
+        '''
+        if numberOfSessions <= 0:
+            raise ValueError(
+                'numberOfSessions {} is invalid'.format(numberOfSessions))
+        HanoiState._check(numberOfDiscs, source, target, numberOfTowers)
+        self.table = SessionTable(numberOfSessions, towers=numberOfTowers)
+        self._lock = threading.Lock()
+        # every record is allocated before the words are viewed by NumPy,
+        # since the table can no longer grow once they are
+        self._sessions = [
+            Hanoi.attach(HanoiState(numberOfDiscs, source, target, self.table,
+                                    numberOfTowers), self._lock)
+            for _ in range(numberOfSessions)]
+        words = np.frombuffer(self.table.words, dtype=np.uint64).reshape(
+            numberOfSessions, self.table.width)
+        self._meta = words[:, SessionTable.META]
+        self.numberOfMoves = words[:, SessionTable.MOVES]
+        self.tower = words[:, SessionTable.TOWER:]
+        self._lanes = np.arange(numberOfSessions)
+        self._target = target
+        self._complete = np.uint64((1 << numberOfDiscs) - 1)
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def __getitem__(self, i):
+        '''Get a Hanoi object for lane i'''
+        return self._sessions[i]
+
+    def move(self, sources, targets, timeout=-1):
+        '''Move the top disc from sources[i] to targets[i] in every lane i
+
+        Returns an array of one result code per lane, i.e. OK if the move
+        was applied, or the reason it was not. A lane can be left alone with
+        a source of -1, for which the result is INVALID.
+        '''
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        if sources.shape != self._lanes.shape or targets.shape != self._lanes.shape:
+            raise ValueError('expected {} sources and targets but got {} and {}'.format(
+                len(self._lanes), len(sources), len(targets)))
+        k = self.table.towers
+        valid = ((sources >= 0) & (sources < k) & (targets >= 0) & (targets < k)
+                 & (sources != targets))
+        sources = np.where(valid, sources, 0)
+        targets = np.where(valid, targets, 0)
+
+        locked = self._lock.acquire(timeout=timeout)
+        if not locked:
+            raise TimeoutError()
+        try:
+            src = self.tower[self._lanes, sources]
+            dst = self.tower[self._lanes, targets]
+            # the top of each tower is its least-significant set bit
+            mask = src & (~src + 1)
+            top = dst & (~dst + 1)
+            codes = np.full(len(self._lanes), HanoiBatch.INVALID, dtype=np.uint8)
+            codes[valid] = HanoiBatch.OK
+            codes[valid & (src == 0)] = HanoiBatch.EMPTY
+            codes[valid & (src != 0) & (dst != 0) & (mask > top)] = HanoiBatch.LARGER
+            ok = codes == HanoiBatch.OK
+            lanes = self._lanes[ok]
+            # SessionTable.begin() and end() of every lane that moves
+            self._meta[ok] += SessionTable.SEQUENCE
+            self.tower[lanes, sources[ok]] = src[ok] ^ mask[ok]
+            self.tower[lanes, targets[ok]] = dst[ok] | mask[ok]
+            self.numberOfMoves[ok] += 1
+            self._meta[ok] += SessionTable.SEQUENCE
+        finally:
+            self._lock.release()
+        return codes
+
+    def isComplete(self):
+        '''Check whether all discs are on the target tower, in every lane'''
+        return self.tower[:, self._target] == self._complete
@@ -0,0 +1,173 @@
+# MIT License
+#
+# Copyright (c) 2020 Christopher Friedt
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+'''The HanoiHistory Class
+
+The HanoiHistory Class records the moves of one game, so that they can be
+undone, redone, audited and replayed.
+
+Each move is packed into a single byte, source << 4 | target, which leaves
+room for 16 towers. Moves are kept in a bytearray, so the history of a game
+of a million moves takes about a megabyte. The first position moves of the
+bytearray lead from the state in which the history began to the current
+state. The moves after position have been undone, and may be redone, until
+a new move is made.
+
+By default every move is kept, so that a game can be audited and replayed
+from the state in which its history began. If a limit is set, only the last
+limit moves are kept, and older moves are dropped in batches, once there are
+an eighth more, so a history takes up to limit + limit / 8 bytes. A limit of
+0 keeps no history at all, see Hanoi.
+
+first is the number of moves that the game had made in the state in which the
+history begins, so a history is complete if first is 0. Undoing and redoing
+moves are moves too, so the moves of the history are not always numbered
+consecutively. The number of a move is only recorded where it is not that of
+the move before it plus one, so that first is still known after older moves
+are dropped.
+
+Supported operations are:
+
+setLimit(count)
+h = HanoiHistory(first)
+push(source, target, number)
+(source, target) = undo()
+undone()
+(source, target) = redo()
+redone(number)
+number = number(index)
+b = packed()
+for (source, target) in h: ...
+'''
+
+import bisect
+
+
+class HanoiHistory(object):
+
+    __slots__ = ('moves', 'position', 'first', '_indices', '_numbers')
+
+    # the number of moves kept, or None
+    limit = None
+
+    @staticmethod
+    def setLimit(count):
+        '''Set the number of moves kept by each history
+
+        None keeps every move, and 0 keeps no history at all.
+        '''
+        if count is not None and count < 0:
+            raise ValueError('count {} is invalid'.format(count))
+        HanoiHistory.limit = count
+
+    def __init__(self, first=0):
+        self.moves = bytearray()
+        self.position = 0
+        self.first = first
+        # the indices and numbers of moves that were not made right after
+        # the move before them, i.e. after an undo or redo
+        self._indices = []
+        self._numbers = []
+
+    def __len__(self):
+        '''Get the number of moves to the current state'''
+        return self.position
+
+    def __iter__(self):
+        '''Generate the (source, target) moves to the current state'''
+        for b in self.moves[:self.position]:
+            yield (b >> 4, b & 0xf)
+
+    def number(self, index):
+        '''Get the number of the move at index of the moves to the current state'''
+        i = bisect.bisect_right(self._indices, index) - 1
+        if i < 0:
+            return self.first + index + 1
+        return self._numbers[i] + index - self._indices[i]
+
+    def _made(self, number):
+        '''Record the number of the move at position'''
+        if number is None:
+            return
+        i = bisect.bisect_left(self._indices, self.position)
+        del self._indices[i:]
+        del self._numbers[i:]
+        if self.number(self.position) != number:
+            self._indices.append(self.position)
+            self._numbers.append(number)
+
+    def _drop(self, count):
+        '''Drop the oldest count moves'''
+        first = self.number(count - 1)
+        following = self.number(count)
+        i = bisect.bisect_right(self._indices, count)
+        self._indices = [index - count for index in self._indices[i:]]
+        self._numbers = self._numbers[i:]
+        if following != first + 1:
+            self._indices.insert(0, 0)
+            self._numbers.insert(0, following)
+        del self.moves[:count]
+        self.position -= count
+        self.first = first
+
+    def push(self, source, target, number=None):
+        '''Record a new move, which discards any moves that were undone
+
+        number is the number of the move, i.e. the number of moves made once
+        it has been made, or None if it follows the move before it.
+        '''
+        if self.position != len(self.moves):
+            del self.moves[self.position:]
+        self._made(number)
+        self.moves.append(source << 4 | target)
+        self.position += 1
+        limit = HanoiHistory.limit
+        if limit is not None and self.position > limit + (limit >> 3):
+            self._drop(self.position - limit)
+
+    def undo(self):
+        '''Get the last move, which is to be undone
+
+        The move is only removed by undone(), once it has been reversed.
+        '''
+        if not self.position:
+            raise ValueError('there is no move to undo')
+        b = self.moves[self.position - 1]
+        return (b >> 4, b & 0xf)
+
+    def undone(self):
+        self.position -= 1
+
+    def redo(self):
+        '''Get the last move that was undone, which is to be made again'''
+        if self.position == len(self.moves):
+            raise ValueError('there is no move to redo')
+        b = self.moves[self.position]
+        return (b >> 4, b & 0xf)
+
+    def redone(self, number=None):
+        self._made(number)
+        self.position += 1
+
+    def packed(self):
+        '''Get the moves to the current state, packed one per byte'''
+        return bytes(self.moves[:self.position])
@@ -0,0 +1,239 @@
+# MIT License
+#
+# Copyright (c) 2020 Christopher Friedt
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+'''The HanoiOracle Class
+
+The HanoiOracle Class finds the shortest path between any two legal
+configurations of a game with 3 towers, not just from a configuration to the
+target tower as HanoiSolver does.
+
+Discs that are on the same tower in both configurations and larger than any
+disc that is not never have to move. For the largest disc k that is on tower
+a in one configuration and on tower b in the other, with c = 3 - a - b, there
+are only two candidates:
+
+1. stack the k - 1 smaller discs on c, move disc k from a to b, and then move
+   the smaller discs from c to their place in the other configuration.
+2. stack the smaller discs on b, move disc k from a to c, move the smaller
+   discs from b to a, i.e. 2^(k-1) - 1 moves, move disc k from c to b, and
+   then move the smaller discs from a to their place.
+
+Stacking the smaller discs on a tower is the problem solved by HanoiSolver,
+and unstacking them is the same problem in reverse, so each candidate costs
+O(N) bit operations and the distance is found in O(N). For many discs, the
+same distance is computed in O(log N) steps instead, see _stacked(). The
+second candidate is shorter for some configurations, e.g. when the smaller
+discs already sit on b in both. Moves along either path are generated one at
+a time.
+
+The efficiency of a game is the distance from its initial configuration to
+its current configuration divided by the number of moves made, i.e. 1.0 as
+long as no move has been wasted.
+
+Supported operations are:
+
+numberOfMoves = distance(numberOfDiscs, tower, other)
+for (source, target) in path(numberOfDiscs, tower, other): ...
+e = efficiency(state)
+'''
+
+from hanoi.HanoiSolver import HanoiSolver
+
+ALL = (1 << 64) - 1
+EVEN = 0x5555555555555555
+# below this, walking the discs one at a time is faster than scanning
+SCAN_DISCS = 24
+
+
+def _peg(tower, bit):
+    if tower[0] & bit:
+        return 0
+    if tower[1] & bit:
+        return 1
+    return 2
+
+
+class HanoiOracle(object):
+
+    @staticmethod
+    def _stacked(numberOfDiscs, tower, goal):
+        '''Get the number of moves to stack the smallest numberOfDiscs on goal
+
+        This is the distance of HanoiSolver, computed for all discs at once.
+        Walking from the largest disc, the goal of disc k - 1 is
+        g(k - 1) = -(p(k) + g(k)) mod 3, where disc k is on tower p(k), and
+        disc k is misplaced if and only if p(k) != g(k). With
+        v(k) = (-1)^k p(k) and h(k) = (-1)^k g(k), it follows that
+        h(k) = h(N - 1) + sum(v(j) for j > k) and that disc k is misplaced if
+        and only if v(k) != h(k). The suffix sums modulo 3 are found in
+        O(log N) steps, by doubling, with one bitmask for each residue.
+        '''
+        if numberOfDiscs < SCAN_DISCS:
+            return HanoiSolver._solve(numberOfDiscs, tower, goal)[0]
+        mask = (1 << numberOfDiscs) - 1
+        if numberOfDiscs <= 64:
+            width, full, even = 64, ALL, EVEN
+        else:
+            # a multiple of 64 bits, which is even, so 0b0101...01 = full / 3
+            width = (numberOfDiscs + 63) & ~63
+            full = (1 << width) - 1
+            even = full // 3
+        odd = even << 1
+        t0, t1, t2 = tower
+        # towers 1 and 2 trade places for odd discs, since -1 = 2 mod 3
+        v1 = ((t1 & even) | (t2 & odd)) & mask
+        v2 = ((t2 & even) | (t1 & odd)) & mask
+        v0 = full & ~(v1 | v2)
+        # x(k) = v(k + 1), then x(k) = x(k) + x(k + s) for s = 1, 2, 4, ...
+        x0 = (v0 >> 1) | (1 << (width - 1))
+        x1 = v1 >> 1
+        x2 = v2 >> 1
+        s = 1
+        while s < numberOfDiscs:
+            b0 = (x0 >> s) | (full & ~(full >> s))
+            b1 = x1 >> s
+            b2 = x2 >> s
+            x0, x1, x2 = ((x0 & b0) | (x1 & b2) | (x2 & b1),
+                          (x0 & b1) | (x1 & b0) | (x2 & b2),
+                          (x0 & b2) | (x1 & b1) | (x2 & b0))
+            s <<= 1
+        h = goal if numberOfDiscs & 1 else -goal % 3
+        if h == 1:
+            x0, x1, x2 = x2, x0, x1
+        elif h == 2:
+            x0, x1, x2 = x1, x2, x0
+        return mask & ~((v0 & x0) | (v1 & x1) | (v2 & x2))
+
+    @staticmethod
+    def _check(numberOfDiscs, tower, other):
+        if numberOfDiscs <= 0 or numberOfDiscs > 64:
+            raise ValueError(
+                'numberOfDiscs {} is invalid'.format(numberOfDiscs))
+        if len(tower) != 3 or len(other) != 3:
+            raise ValueError('distances are only supported for 3 towers')
+        HanoiSolver._check(numberOfDiscs, tower)
+        HanoiSolver._check(numberOfDiscs, other)
+
+    @staticmethod
+    def _split(numberOfDiscs, tower, other):
+        '''Find the largest disc that differs and the cheaper candidate
+
+        Returns a tuple (distance, k, a, b, detour) where disc k moves from a
+        to b, directly or by way of the third tower if detour is True, or
+        (0, None, None, None, False) if both configurations are equal.
+        '''
+        for k in range(numberOfDiscs - 1, -1, -1):
+            bit = 1 << k
+            a = _peg(tower, bit)
+            b = _peg(other, bit)
+            if a != b:
+                break
+        else:
+            return 0, None, None, None, False
+        c = 3 - a - b
+        direct = (HanoiOracle._stacked(k, tower, c) + 1
+                  + HanoiOracle._stacked(k, other, c))
+        detour = (HanoiOracle._stacked(k, tower, b) + (1 << k) + 1
+                  + HanoiOracle._stacked(k, other, a))
+        if detour < direct:
+            return detour, k, a, b, True
+        return direct, k, a, b, False
+
+    @staticmethod
+    def distance(numberOfDiscs, tower, other):
+        '''Get the minimum number of moves from tower to other'''
+        HanoiOracle._check(numberOfDiscs, tower, other)
+        return HanoiOracle._split(numberOfDiscs, tower, other)[0]
+
+    @staticmethod
+    def path(numberOfDiscs, tower, other):
+        '''Generate the moves of a shortest path from tower to other
+
+        Arguments are checked before the generator is returned.
+        '''
+        HanoiOracle._check(numberOfDiscs, tower, other)
+        return HanoiOracle._path(tuple(tower), tuple(other),
+                                 *HanoiOracle._split(numberOfDiscs, tower, other)[1:])
+
+    @staticmethod
+    def _path(tower, other, k, a, b, detour):
+        if k is None:
+            return
+        c = 3 - a - b
+        if detour:
+            yield from HanoiOracle._stack(tower, k, b)
+            yield (a, c)
+            yield from HanoiOracle._transfer(k, b, a)
+            yield (c, b)
+            yield from HanoiOracle._unstack(other, k, a)
+        else:
+            yield from HanoiOracle._stack(tower, k, c)
+            yield (a, b)
+            yield from HanoiOracle._unstack(other, k, c)
+
+    @staticmethod
+    def _transfer(m, source, target):
+        '''Move the m smallest discs, stacked on source, to target'''
+        if m:
+            towers = HanoiSolver._towers(m, source, target)
+            yield from HanoiSolver._solution(towers, 1, 1 << m)
+
+    @staticmethod
+    def _stack(tower, m, goal):
+        '''Stack the m smallest discs of tower on goal'''
+        for k in range(m - 1, -1, -1):
+            t = _peg(tower, 1 << k)
+            if t != goal:
+                spare = 3 - t - goal
+                yield from HanoiOracle._stack(tower, k, spare)
+                yield (t, goal)
+                yield from HanoiOracle._transfer(k, spare, goal)
+                return
+
+    @staticmethod
+    def _unstack(tower, m, source):
+        '''Move the m smallest discs from source to their place in tower
+
+        The m smallest discs must be stacked on source.
+        '''
+        for k in range(m - 1, -1, -1):
+            t = _peg(tower, 1 << k)
+            if t != source:
+                spare = 3 - t - source
+                yield from HanoiOracle._transfer(k, source, spare)
+                yield (source, t)
+                yield from HanoiOracle._unstack(tower, k, spare)
+                return
+
+    @staticmethod
+    def efficiency(state):
+        '''Get the efficiency of the moves made so far in state
+
+        Returns None for games of more than 3 towers.
+        '''
+        if len(state.tower) != 3:
+            return None
+        if not state.numberOfMoves:
+            return 1.0
+        # the initial configuration has every disc on the source tower
+        d = HanoiOracle._stacked(state.numberOfDiscs, state.tower, state.source)
+        return d / state.numberOfMoves
@@ -0,0 +1,64 @@
+# MIT License
+#
+# Copyright (c) 2020 Christopher Friedt
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+'''The HanoiSnapshot Class
+
+The HanoiSnapshot Class is an immutable copy of a HanoiState, taken at one
+point in time. Unlike a HanoiState, which is a live view over a SessionTable
+record, a HanoiSnapshot never changes after it was taken, so it can be read,
+serialized or shared between threads without holding any lock. The tower
+and numberOfMoves of a snapshot are always consistent with each other.
+
+Snapshots are returned by Hanoi.getState().
+'''
+
+from collections import namedtuple
+
+from hanoi.Serializer import Serializer
+from hanoi.SessionTable import SessionTable
+
+
+class HanoiSnapshot(namedtuple('HanoiSnapshot', (
+        'id', 'numberOfDiscs', 'source', 'target', 'numberOfMoves', 'tower'))):
+
+    __slots__ = ()
+
+    @staticmethod
+    def fromRecord(record):
+        '''Create a HanoiSnapshot from a copy of a SessionTable record'''
+        meta = record[SessionTable.META]
+        t = SessionTable.TOWER
+        return HanoiSnapshot(
+            record[SessionTable.ID], (meta & 0xff) | ((meta >> 11) & 0x1f00),
+            (meta >> 8) & 0xf, (meta >> 16) & 0x7, record[SessionTable.MOVES],
+            tuple(record[t:t + ((meta >> 12) & 0xf) + 3]))
+
+    @property
+    def numberOfTowers(self):
+        return len(self.tower)
+
+    def isComplete(self):
+        '''Check whether all discs are on the target tower'''
+        return self.tower[self.target] == (1 << self.numberOfDiscs) - 1
+
+    def to_json(self):
+        return Serializer.encode(Serializer.session(self)).decode('utf-8')
@@ -0,0 +1,258 @@
+# MIT License
+#
+# Copyright (c) 2020 Christopher Friedt
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+'''The HanoiSolver Class
+
+The HanoiSolver Class computes optimal moves for a HanoiState without any
+search or precomputed tables.
+
+For any legal configuration, the optimal path to the target tower is found by
+looking at the discs from largest to smallest. If disc k is already on its goal
+tower, nothing needs to happen to it. Otherwise, disc k must move exactly once,
+which first requires the k - 1 smaller discs to be stacked on the remaining
+tower, i.e. 2^(k-1) moves in total. The remaining tower then becomes the goal
+for all of the smaller discs.
+
+Consequently, bit k - 1 of the remaining distance is set if and only if disc k
+is not on its goal, and the next optimal move is that of the smallest disc
+that is not on its goal. Both are computed with O(N) bit operations on the
+tower bitmasks.
+
+The same walk yields the whole optimal path: from the smallest disc that is
+not on its goal to the largest, each such disc k moves to its goal, and then
+the k - 1 smaller discs, which are stacked on the remaining tower, follow it
+as in the classical solution below. So count moves take O(N + count).
+
+Supported operations are:
+
+numberOfMoves = distance(state)
+(source, target) = nextMove(state)
+[(source, target), ...] = nextMoves(state, count)
+(source, target) = moveAt(numberOfDiscs, source, target, k, numberOfTowers)
+for (source, target) in solution(numberOfDiscs, source, target, offset, limit, numberOfTowers): ...
+
+The optimal solution from the initial state is not computed by the above, but
+directly from the binary representation of the move number. Move m (1-based)
+moves disc ffs(m), from tower (m & (m - 1)) % 3 to tower ((m | (m - 1)) + 1) % 3,
+where towers are numbered relative to the source and the direction depends on
+the parity of N. No move list is ever built, so any move of a 64-disc solution
+can be found in O(1) and a solution can be streamed with O(1) memory.
+
+Games of more than 3 towers are solved by FrameStewart instead.
+'''
+
+import itertools
+
+from hanoi.FrameStewart import FrameStewart
+from hanoi.SessionTable import SessionTable
+
+
+class HanoiSolver(object):
+
+    @staticmethod
+    def _check(numberOfDiscs, tower):
+        '''Ensure that each disc is on exactly one tower'''
+        if len(tower) < SessionTable.MIN_TOWERS or len(tower) > SessionTable.MAX_TOWERS:
+            raise ValueError('expected 3 to {} towers but got {}'.format(
+                SessionTable.MAX_TOWERS, len(tower)))
+        mask = (1 << numberOfDiscs) - 1
+        seen = 0
+        for t in tower:
+            if seen & t:
+                break
+            seen |= t
+        else:
+            if seen == mask:
+                return
+        raise ValueError('towers {} are not a legal configuration of {} discs'.format(
+            list(tower), numberOfDiscs))
+
+    @staticmethod
+    def _solve(numberOfDiscs, tower, target):
+        '''Walk the discs from largest to smallest
+
+        Returns a tuple (distance, source, target) where distance is the
+        number of moves remaining and (source, target) is the next optimal
+        move, or (0, None, None) if all discs are already on target.
+        '''
+        a, b, _ = tower
+        goal = target
+        distance = 0
+        source = None
+        dest = None
+        for k in range(numberOfDiscs - 1, -1, -1):
+            bit = 1 << k
+            if a & bit:
+                t = 0
+            elif b & bit:
+                t = 1
+            else:
+                t = 2
+            if t != goal:
+                distance |= bit
+                source = t
+                dest = goal
+                goal = 3 - t - goal
+        return distance, source, dest
+
+    @staticmethod
+    def distance(state):
+        '''Get the minimum number of moves remaining to complete state
+
+        With more than 3 towers, this is the number of moves of the hint,
+        see FrameStewart.plan().
+        '''
+        HanoiSolver._check(state.numberOfDiscs, state.tower)
+        if len(state.tower) > 3:
+            return FrameStewart.plan(
+                state.numberOfDiscs, state.source, state.target, state.tower)[0]
+        return HanoiSolver._solve(state.numberOfDiscs, state.tower, state.target)[0]
+
+    @staticmethod
+    def nextMove(state):
+        '''Get the next optimal move for state
+
+        Returns a (source, target) tuple, or None if the game is complete.
+        '''
+        if len(state.tower) > 3:
+            moves = HanoiSolver.nextMoves(state, 1)
+            return moves[0] if moves else None
+        HanoiSolver._check(state.numberOfDiscs, state.tower)
+        _, source, target = HanoiSolver._solve(
+            state.numberOfDiscs, state.tower, state.target)
+        if source is None:
+            return None
+        return (source, target)
+
+    @staticmethod
+    def nextMoves(state, count):
+        '''Get up to count optimal moves for state
+
+        Fewer than count moves are returned if the game is completed sooner.
+        The state itself is not modified.
+        '''
+        if count < 0:
+            raise ValueError('count {} is invalid'.format(count))
+        n = state.numberOfDiscs
+        HanoiSolver._check(n, state.tower)
+        if len(state.tower) > 3:
+            _, moves = FrameStewart.plan(n, state.source, state.target, tuple(state.tower))
+            return list(itertools.islice(moves, count))
+        return list(itertools.islice(
+            HanoiSolver._path(n, state.tower, state.target), count))
+
+    @staticmethod
+    def _path(numberOfDiscs, tower, target):
+        '''Generate the optimal moves from tower to target, see _solve()'''
+        a, b, _ = tower
+        goal = target
+        # (disc, source, target) of each disc that is not on its goal
+        steps = []
+        for k in range(numberOfDiscs - 1, -1, -1):
+            bit = 1 << k
+            if a & bit:
+                t = 0
+            elif b & bit:
+                t = 1
+            else:
+                t = 2
+            if t != goal:
+                steps.append((k, t, goal))
+                goal = 3 - t - goal
+        for k, source, dest in reversed(steps):
+            yield (source, dest)
+            # the k smaller discs follow from the remaining tower
+            other = 3 - source - dest
+            towers = (other, source, dest) if k & 1 else (other, dest, source)
+            yield from HanoiSolver._solution(towers, 1, 1 << k)
+
+    @staticmethod
+    def _checkSolution(numberOfDiscs, source, target, numberOfTowers):
+        if numberOfDiscs <= 0 or numberOfDiscs > 64:
+            raise ValueError(
+                'numberOfDiscs {} is invalid'.format(numberOfDiscs))
+        SessionTable.checkTowers(numberOfTowers)
+        if source < 0 or source >= numberOfTowers:
+            raise ValueError('source {} is invalid'.format(source))
+        if target < 0 or target >= numberOfTowers:
+            raise ValueError('target {} is invalid'.format(target))
+        if source == target:
+            raise ValueError('source may not equal target')
+
+    @staticmethod
+    def _towers(numberOfDiscs, source, target):
+        '''Map relative tower numbers to absolute tower numbers'''
+        HanoiSolver._checkSolution(numberOfDiscs, source, target, 3)
+        other = 3 - source - target
+        # relative to source, an odd number of discs ends up on tower 2
+        # and an even number of discs ends up on tower 1
+        if numberOfDiscs & 1:
+            return (source, other, target)
+        return (source, target, other)
+
+    @staticmethod
+    def moveAt(numberOfDiscs, source, target, k, numberOfTowers=3):
+        '''Get move k (0-based) of the optimal solution'''
+        if numberOfTowers != 3:
+            HanoiSolver._checkSolution(numberOfDiscs, source, target, numberOfTowers)
+            if k < 0 or k >= FrameStewart.moves(numberOfDiscs, numberOfTowers):
+                raise ValueError('move {} is invalid'.format(k))
+            return FrameStewart.moveAt(numberOfDiscs, numberOfTowers, source, target, k)
+        towers = HanoiSolver._towers(numberOfDiscs, source, target)
+        if k < 0 or k >= (1 << numberOfDiscs) - 1:
+            raise ValueError('move {} is invalid'.format(k))
+        m = k + 1
+        return (towers[(m & (m - 1)) % 3], towers[((m | (m - 1)) + 1) % 3])
+
+    @staticmethod
+    def solution(numberOfDiscs, source, target, offset=0, limit=None, numberOfTowers=3):
+        '''Generate the optimal solution, starting at move offset (0-based)
+
+        At most limit moves are generated, or all remaining moves if limit
+        is None. Arguments are checked before the generator is returned.
+        '''
+        if numberOfTowers != 3:
+            HanoiSolver._checkSolution(numberOfDiscs, source, target, numberOfTowers)
+            end = FrameStewart.moves(numberOfDiscs, numberOfTowers)
+            if offset < 0 or offset > end:
+                raise ValueError('offset {} is invalid'.format(offset))
+            if limit is not None and limit < 0:
+                raise ValueError('limit {} is invalid'.format(limit))
+            moves = FrameStewart.solution(
+                numberOfDiscs, numberOfTowers, source, target, offset)
+            if limit is None:
+                return moves
+            return itertools.islice(moves, limit)
+        towers = HanoiSolver._towers(numberOfDiscs, source, target)
+        end = (1 << numberOfDiscs) - 1
+        if offset < 0 or offset > end:
+            raise ValueError('offset {} is invalid'.format(offset))
+        if limit is not None:
+            if limit < 0:
+                raise ValueError('limit {} is invalid'.format(limit))
+            end = min(end, offset + limit)
+        return HanoiSolver._solution(towers, offset + 1, end + 1)
+
+    @staticmethod
+    def _solution(towers, begin, end):
+        for m in range(begin, end):
+            yield (towers[(m & (m - 1)) % 3], towers[((m | (m - 1)) + 1) % 3])
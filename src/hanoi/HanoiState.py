@@ -31,30 +31,107 @@ The optimal solution to the Towers of Hanoi requires 2^N - 1 moves. Thus, the
 time complexity is O(2^N). The memory requirements are O(N), where N is the
 number of discs.
 
-Currently a maximum of 64 discs are 'supported'. I say that loosely because
+Currently a maximum of 4096 discs are 'supported'. I say that loosely because
 it could take an extremely long amount of time for a single computer to solve
-the problem when N is 64.
+the problem when N is 64, let alone 4096.
 
-The way that this object keeps track of the state of the 3 towers is by encoding
+The way that this object keeps track of the state of the towers is by encoding
 each disc as a bit in an unsigned integer. Specifically, disc N is represented by
 bit N - 1 of any given tower.
 
-Towers are numbered 0 to 2.
+The classic puzzle has 3 towers, but games of up to 8 towers are supported
+(e.g. Reve's puzzle has 4). Towers are numbered 0 to numberOfTowers - 1.
 
-This class itself does not have methods, so it's more like a data aggregate.
+The state itself is stored in a record of a SessionTable, so that millions of
+games can be kept in memory. A HanoiState instance is a thin view over that
+record; e.g. h.tower[0] reads tower 0 directly from the table. Games of 3
+towers are stored in HanoiState.table, and games of more towers in the wider
+records of HanoiState.wideTable, but all session ids are allocated by
+HanoiState.table. Games of more than 64 discs, which must have 3 towers, are
+stored in HanoiState.bigTable, where each tower is a Python int of arbitrary
+width rather than a 64-bit word.
+
+Whoever creates or restores a state owns its record, and gives it back to
+its table with detach() once the state is no longer needed, e.g. when a store
+evicts the session. Records are not released when a HanoiState is garbage
+collected, since a finalizer may run while the table is locked by the same
+thread, and several views may refer to the same record.
+
+Apart from snapshot(), which copies the record into an immutable
+HanoiSnapshot without locking, and detach(), this class only has properties,
+so it's more like a data aggregate.
 
 To operate on a HanoiState instance, use the Hanoi Class. 
 '''
 
-from threading import Lock
+from hanoi.HanoiSnapshot import HanoiSnapshot
+from hanoi.Serializer import Serializer
+from hanoi.SessionTable import SessionTable
+
+
+class TowerView(object):
+    '''A list-like view of the towers of one SessionTable record'''
+
+    __slots__ = ('_words', '_base', '_length')
+
+    def __init__(self, words, base, length=3):
+        self._words = words
+        self._base = base
+        self._length = length
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, i):
+        if i < 0 or i >= self._length:
+            raise IndexError('tower {} is invalid'.format(i))
+        return self._words[self._base + i]
 
-counterLock = Lock()
-counter = 0
+    def __setitem__(self, i, value):
+        if i < 0 or i >= self._length:
+            raise IndexError('tower {} is invalid'.format(i))
+        self._words[self._base + i] = value
+
+    def __iter__(self):
+        return iter(self._words[self._base:self._base + self._length])
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __repr__(self):
+        return repr(list(self))
 
 
 class HanoiState(object):
 
-    def __init__(self, numberOfDiscs=4, source=0, target=2):
+    __slots__ = ('_table', '_base')
+
+    # the table in which game states of 3 towers are stored
+    table = SessionTable()
+    # the table in which game states of more towers are stored
+    wideTable = SessionTable(towers=SessionTable.MAX_TOWERS)
+    # the table in which game states of more than 64 discs are stored
+    bigTable = SessionTable(64, discs=SessionTable.MAX_DISCS)
+
+    @staticmethod
+    def _check(numberOfDiscs, source, target, numberOfTowers):
+        '''Check the arguments of a new game'''
+        if numberOfDiscs <= 0 or numberOfDiscs > SessionTable.MAX_DISCS:
+            raise ValueError(
+                'numberOfDiscs {} is invalid'.format(numberOfDiscs))
+        SessionTable.checkTowers(numberOfTowers)
+        if numberOfDiscs > SessionTable.WORD_DISCS and numberOfTowers != 3:
+            raise ValueError('games of more than {} discs must have 3 towers'.format(
+                SessionTable.WORD_DISCS))
+        if source < 0 or source >= numberOfTowers:
+            raise ValueError('source {} is invalid'.format(source))
+        if target < 0 or target >= numberOfTowers:
+            raise ValueError('target {} is invalid'.format(target))
+        if source == target:
+            raise ValueError('source may not equal target')
+
+    def __init__(self, numberOfDiscs=4, source=0, target=2, table=None,
+                 numberOfTowers=3):
         '''Initialize a HanoiState object
 
         Upon initialization, numberOfDiscs discs are placed on
@@ -64,41 +141,216 @@ class HanoiState(object):
         :param numberOfDiscs: the number of discs in the game
         :param source: the tower from which discs should be moved
         :param target: the tower to which discs should be moved
+        :param table: the SessionTable to store the state in, which also
+                      allocates its id, or None for HanoiState.table
+        :param numberOfTowers: the number of towers in the game
         '''
 
-        global counter
+        HanoiState._check(numberOfDiscs, source, target, numberOfTowers)
 
-        # check arguments
-        if numberOfDiscs <= 0 or numberOfDiscs > 64:
+        if table is None:
+            id = HanoiState.table.nextId()
+            table = HanoiState._tableFor(numberOfDiscs, numberOfTowers)
+        elif numberOfTowers > table.towers:
+            raise ValueError(
+                'numberOfTowers {} is invalid'.format(numberOfTowers))
+        elif numberOfDiscs > table.discs:
             raise ValueError(
                 'numberOfDiscs {} is invalid'.format(numberOfDiscs))
-        if source < 0 or source > 2:
-            raise ValueError('source {} is invalid'.format(source))
-        if target < 0 or target > 2:
-            raise ValueError('target {} is invalid'.format(target))
-        if source == target:
-            raise ValueError('source may not equal target')
+        else:
+            id = table.nextId()
+        self._table = table
+        self._base = self._table.allocate(
+            id, numberOfDiscs, source, target, numberOfTowers) * table.width
+
+    @staticmethod
+    def createMany(games, table=None):
+        '''Initialize a HanoiState object per game, with consecutive ids
+
+        This is equivalent to creating each game in turn, but ids are
+        reserved with one counter bump, and records are allocated in bulk.
+
+        :param games: a list of (numberOfDiscs, source, target,
+                      numberOfTowers) tuples
+        :param table: the SessionTable to store the states in, which also
+                      allocates their ids, or None as in __init__
+        '''
+        if not games:
+            raise ValueError('count 0 is invalid')
+        for numberOfDiscs, source, target, numberOfTowers in games:
+            HanoiState._check(numberOfDiscs, source, target, numberOfTowers)
+            if table is None:
+                continue
+            if numberOfTowers > table.towers:
+                raise ValueError(
+                    'numberOfTowers {} is invalid'.format(numberOfTowers))
+            if numberOfDiscs > table.discs:
+                raise ValueError(
+                    'numberOfDiscs {} is invalid'.format(numberOfDiscs))
+
+        if table is None:
+            first = HanoiState.table.nextIds(len(games))
+            # games of each table, in order
+            groups = {}
+            for i, (numberOfDiscs, _, _, numberOfTowers) in enumerate(games):
+                groups.setdefault(HanoiState._tableFor(
+                    numberOfDiscs, numberOfTowers), []).append(i)
+        else:
+            first = table.nextIds(len(games))
+            groups = {table: range(len(games))}
+
+        states = [None] * len(games)
+        for t, indices in groups.items():
+            slots = t.allocateMany([first + i for i in indices],
+                                   [games[i] for i in indices])
+            for i, slot in zip(indices, slots):
+                h = HanoiState.__new__(HanoiState)
+                h._table = t
+                h._base = slot * t.width
+                states[i] = h
+        return states
+
+    @staticmethod
+    def _tableFor(numberOfDiscs, numberOfTowers):
+        if numberOfDiscs > HanoiState.table.discs:
+            return HanoiState.bigTable
+        if numberOfTowers > HanoiState.table.towers:
+            return HanoiState.wideTable
+        return HanoiState.table
 
-        counterLock.acquire()
-        self.id = counter
-        counter += 1
-        counterLock.release()
+    @staticmethod
+    def restore(id, numberOfDiscs, source, target, numberOfMoves=0, tower=None,
+                numberOfTowers=3, table=None):
+        '''Restore a HanoiState object with a given id
 
-        self.numberOfDiscs = numberOfDiscs
-        self.tower = [0, 0, 0]
-        self.tower[source] = (1 << numberOfDiscs) - 1
-        self.source = source
-        self.target = target
-        self.numberOfMoves = 0
+        This is used to rebuild states from persistent storage. The session
+        id counter is advanced past id, so that new ids never collide with
+        restored ones.
+
+        :param id: the session id
+        :param numberOfDiscs: the number of discs in the game
+        :param source: the tower from which discs should be moved
+        :param target: the tower to which discs should be moved
+        :param numberOfMoves: the number of moves made so far
+        :param tower: the towers, or None for the initial state
+        :param numberOfTowers: the number of towers in the game
+        :param table: the SessionTable to store the state in, or None as in
+                      __init__
+        '''
+
+        HanoiState._check(numberOfDiscs, source, target, numberOfTowers)
+
+        HanoiState.table.setCounter(id + 1)
+
+        h = HanoiState.__new__(HanoiState)
+        if table is None:
+            table = HanoiState._tableFor(numberOfDiscs, numberOfTowers)
+        h._table = table
+        h._base = h._table.allocate(
+            id, numberOfDiscs, source, target, numberOfTowers) * h._table.width
+        h.numberOfMoves = numberOfMoves
+        if tower is not None:
+            h.tower = tower
+        return h
+
+    @staticmethod
+    def attach(table, slot):
+        '''Get a HanoiState for an existing record of table
+
+        This is used to access states created by another process in a
+        shared SessionTable.
+        '''
+        h = HanoiState.__new__(HanoiState)
+        h._table = table
+        h._base = slot * table.width
+        return h
+
+    @staticmethod
+    def getCounter():
+        '''Get the id of the next session to be created'''
+        return HanoiState.table.getCounter()
+
+    @staticmethod
+    def setNode(node):
+        '''Allocate subsequent session ids for node
+
+        See SessionTable.setNode().
+        '''
+        HanoiState.table.setNode(node)
+
+    @staticmethod
+    def setCounter(c):
+        '''Advance the id of the next session to be created to at least c'''
+        HanoiState.table.setCounter(c)
+
+    def detach(self):
+        '''Give the record back to its table, and get a state over a copy of it
+
+        The copy is private to the new state, so that whoever still refers to
+        the session reads its last state rather than that of a later game.
+        This state must not be used any more. Returns None if records of the
+        table are never reused, or if the record had been released already.
+        '''
+        table = self._table.detach(self._base // self._table.width)
+        if table is None:
+            return None
+        h = HanoiState.__new__(HanoiState)
+        h._table = table
+        h._base = 0
+        return h
+
+    @property
+    def id(self):
+        return self._table.words[self._base + SessionTable.ID]
+
+    @property
+    def numberOfDiscs(self):
+        meta = self._table.words[self._base + SessionTable.META]
+        return (meta & 0xff) | ((meta >> 11) & 0x1f00)
+
+    @property
+    def source(self):
+        return (self._table.words[self._base + SessionTable.META] >> 8) & 0xf
+
+    @property
+    def numberOfTowers(self):
+        return ((self._table.words[self._base + SessionTable.META] >> 12) & 0xf) + 3
+
+    @property
+    def target(self):
+        return (self._table.words[self._base + SessionTable.META] >> 16) & 0x7
+
+    @property
+    def numberOfMoves(self):
+        return self._table.words[self._base + SessionTable.MOVES]
+
+    @numberOfMoves.setter
+    def numberOfMoves(self, value):
+        self._table.words[self._base + SessionTable.MOVES] = value
+
+    @property
+    def tower(self):
+        return TowerView(self._table.words, self._base + SessionTable.TOWER,
+                         self.numberOfTowers)
+
+    @tower.setter
+    def tower(self, value):
+        k = self.numberOfTowers
+        if len(value) != k:
+            raise ValueError('expected {} towers but got {}'.format(k, len(value)))
+        base = self._base + SessionTable.TOWER
+        for i in range(k):
+            self._table.words[base + i] = value[i]
+
+    def snapshot(self):
+        '''Get an immutable HanoiSnapshot of this state without locking
+
+        Returns None if the state is being modified.
+        '''
+        record = self._table.read(self._base)
+        if record is None:
+            return None
+        return HanoiSnapshot.fromRecord(record)
 
     def to_json(self):
-        s = ''
-        s += '{'
-        s += '"sessionId": {}'.format(self.id) + ', '
-        s += '"numberOfDiscs": {}'.format(self.numberOfDiscs) + ', '
-        s += '"fromTower": {}'.format(self.source) + ', '
-        s += '"toTower": {}'.format(self.target) + ', '
-        s += '"numberOfMoves": {}'.format(self.numberOfMoves) + ', '
-        s += '"towers": {}'.format(self.tower)
-        s += '}'
-        return s
+        return Serializer.encode(Serializer.session(self)).decode('utf-8')
@@ -0,0 +1,106 @@
+# MIT License
+#
+# Copyright (c) 2020 Christopher Friedt
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+'''The HashRing Class
+
+The HashRing Class implements consistent hashing. Each node is placed on a
+ring of 64-bit hashes at a number of pseudo-random points (replicas), and a
+key belongs to the node at the first point at or after the hash of the key.
+
+When a node is added to a ring of N nodes, it only takes over the keys
+between its own points and their predecessors, i.e. about 1 / (N + 1) of all
+keys, and every other key stays where it was. Likewise, removing a node only
+moves the keys of that node. Replicas even out the share of each node.
+
+Supported operations are:
+
+add(node)
+remove(node)
+node = lookup(key)
+[node, ...] = nodes()
+'''
+
+import hashlib
+from bisect import bisect_left
+
+
+class HashRing(object):
+
+    def __init__(self, nodes=(), replicas=100):
+        '''Initialize a HashRing object
+
+        :param nodes: the initial nodes
+        :param replicas: the number of points per node
+        '''
+        if replicas <= 0:
+            raise ValueError('replicas {} is invalid'.format(replicas))
+        self._replicas = replicas
+        # sorted points and the node at each point
+        self._points = []
+        self._owners = []
+        for node in nodes:
+            self.add(node)
+
+    @staticmethod
+    def hash(key):
+        '''Hash a key (or node) to a 64-bit integer'''
+        digest = hashlib.blake2b(
+            '{}'.format(key).encode('utf-8'), digest_size=8).digest()
+        return int.from_bytes(digest, 'big')
+
+    def __len__(self):
+        return len(set(self._owners))
+
+    def __contains__(self, node):
+        return node in self._owners
+
+    def nodes(self):
+        '''Get a sorted list of all nodes'''
+        return sorted(set(self._owners))
+
+    def add(self, node):
+        '''Add node to the ring'''
+        if node in self:
+            raise ValueError('node {} is already in the ring'.format(node))
+        for i in range(self._replicas):
+            point = HashRing.hash('{}#{}'.format(node, i))
+            j = bisect_left(self._points, point)
+            self._points.insert(j, point)
+            self._owners.insert(j, node)
+
+    def remove(self, node):
+        '''Remove node from the ring'''
+        if node not in self:
+            raise ValueError('node {} is not in the ring'.format(node))
+        keep = [(p, o) for p, o in zip(self._points, self._owners) if o != node]
+        self._points = [p for p, _ in keep]
+        self._owners = [o for _, o in keep]
+
+    def lookup(self, key):
+        '''Get the node that key belongs to'''
+        if not self._points:
+            raise ValueError('the ring is empty')
+        i = bisect_left(self._points, HashRing.hash(key))
+        if i == len(self._points):
+            # wrap around
+            i = 0
+        return self._owners[i]
@@ -0,0 +1,113 @@
+# MIT License
+#
+# Copyright (c) 2020 Christopher Friedt
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+'''The IdempotencyCache Class
+
+The IdempotencyCache Class remembers the outcome of requests by their
+idempotency key, so that clients can retry a request whose response was lost,
+e.g. a move, without the request being executed twice.
+
+begin() reserves a new key for its caller, who then either records the outcome
+of the request with end(), or releases the key with abort() if the request may
+be executed again, e.g. because it timed out. Until then, begin() returns
+PENDING for the same key. Outcomes are opaque to the cache. When the cache is
+full, the oldest outcome is dropped.
+
+A key may also be given a fingerprint of the request, e.g. a hash of its
+operation and parameters. If a key is used again with a different
+fingerprint, begin() returns MISMATCH, since the client reused the key for a
+different request.
+
+This cache is private to a process. SharedIdempotencyCache shares outcomes
+between worker processes.
+
+Supported operations are:
+
+outcome = begin(key, fingerprint)
+end(key, outcome)
+abort(key)
+'''
+
+from threading import Lock
+
+
+class IdempotencyCache(object):
+
+    # the outcome of a request that is still being executed
+    PENDING = 'pending'
+    # the outcome of a key that was used for a different request
+    MISMATCH = 'mismatch'
+
+    def __init__(self, capacity=65536):
+        '''Initialize an IdempotencyCache of up to capacity outcomes
+
+        A capacity of 0 disables the cache, i.e. every request is executed.
+        '''
+        if capacity < 0:
+            raise ValueError('capacity {} is invalid'.format(capacity))
+        self.capacity = capacity
+        # key -> (fingerprint, outcome), oldest first
+        self._entries = {}
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def begin(self, key, fingerprint=None):
+        '''Get the outcome of key, or reserve key and get None if it is new'''
+        if not self.capacity:
+            return None
+        self._lock.acquire()
+        try:
+            entry = self._entries.get(key)
+            if entry is None:
+                entries = self._entries
+                while len(entries) >= self.capacity:
+                    del entries[next(iter(entries))]
+                entries[key] = (fingerprint, IdempotencyCache.PENDING)
+                return None
+            if entry[0] != fingerprint:
+                return IdempotencyCache.MISMATCH
+            return entry[1]
+        finally:
+            self._lock.release()
+
+    def end(self, key, outcome):
+        '''Record the outcome of key, reserved by begin()'''
+        if not self.capacity:
+            return
+        self._lock.acquire()
+        try:
+            # unless it has been dropped in the meantime
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries[key] = (entry[0], outcome)
+        finally:
+            self._lock.release()
+
+    def abort(self, key):
+        '''Release key, reserved by begin(), without recording an outcome'''
+        self._lock.acquire()
+        try:
+            self._entries.pop(key, None)
+        finally:
+            self._lock.release()
@@ -0,0 +1,258 @@
+# MIT License
+#
+# Copyright (c) 2020 Christopher Friedt
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+'''The Metrics Class
+
+The Metrics Class counts requests, errors and lock waits, and renders them in
+the Prometheus text format.
+
+Recording must be cheap enough to leave on in production, so it takes no lock.
+Each thread records into a shard of its own, i.e. a few dicts that no other
+thread writes to, and render() sums the shards of all threads. Shards of
+threads that have exited are folded into one, so that servers with a thread per
+request do not accumulate them.
+
+Latencies are recorded in histograms of fixed buckets, from 10 us to 10 s.
+Only acquisitions of a session lock that was busy are recorded as lock waits,
+so uncontended moves pay nothing for it.
+The count of a request histogram is the number of requests of that operation.
+Errors are counted by message class, i.e. the exception type and its message
+with every number replaced by N, e.g. "ValueError: source N is empty", so
+that the number of distinct label values stays small. Beyond MAX_CLASSES
+classes, errors are counted as "other".
+
+Supported operations are:
+
+f = timed(operation)(f)
+count(name, labels)
+observe(name, seconds, labels)
+wait(seconds)
+error(e)
+s = render()
+
+Metrics.default is the instance used by the Hanoi Class and the servers.
+'''
+
+import functools
+import inspect
+import re
+import threading
+import time
+from bisect import bisect_left
+
+
+class _Shard(object):
+
+    __slots__ = ('thread', 'counters', 'histograms')
+
+    def __init__(self, thread):
+        self.thread = thread
+        # (name, labels) -> count
+        self.counters = {}
+        # (name, labels) -> [count per bucket ..., count above all buckets, sum]
+        self.histograms = {}
+
+    def merge(self, other):
+        '''Add the counts of other to this shard'''
+        for key, n in dict(other.counters).items():
+            self.counters[key] = self.counters.get(key, 0) + n
+        for key, h in dict(other.histograms).items():
+            mine = self.histograms.get(key)
+            if mine is None:
+                mine = self.histograms[key] = [0] * len(h)
+            for i, n in enumerate(list(h)):
+                mine[i] += n
+
+
+class Metrics(object):
+
+    # upper bounds of histogram buckets, in seconds
+    BUCKETS = (1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 1e-2,
+               2.5e-2, 5e-2, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+    # the maximum number of distinct error classes
+    MAX_CLASSES = 64
+    # the maximum length of an error class
+    MAX_CLASS_LENGTH = 96
+
+    REQUEST = 'hanoi_request_seconds'
+    LOCK_WAIT = 'hanoi_lock_wait_seconds'
+    ERRORS = 'hanoi_errors_total'
+
+    NUMBER = re.compile(r'\d+')
+
+    def __init__(self):
+        '''Initialize a Metrics object'''
+        # only taken to add and fold shards, and to add error classes
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._shards = []
+        # the counts of threads that have exited
+        self._retired = _Shard(None)
+        # fold exited threads when there are this many shards
+        self._limit = 64
+        self._classes = set()
+
+    def _shard(self):
+        '''Add a shard for the calling thread'''
+        shard = self._local.shard = _Shard(threading.current_thread())
+        self._lock.acquire()
+        try:
+            self._shards.append(shard)
+            if len(self._shards) >= self._limit:
+                self._fold()
+                self._limit = max(64, 2 * len(self._shards))
+        finally:
+            self._lock.release()
+        return shard
+
+    def _fold(self):
+        '''Fold the shards of exited threads into one, with the lock held'''
+        live = []
+        for shard in self._shards:
+            if shard.thread.is_alive():
+                live.append(shard)
+            else:
+                self._retired.merge(shard)
+        self._shards = live
+
+    def count(self, name, labels=''):
+        '''Increment the counter name{labels}'''
+        try:
+            counters = self._local.shard.counters
+        except AttributeError:
+            counters = self._shard().counters
+        key = (name, labels)
+        counters[key] = counters.get(key, 0) + 1
+
+    def observe(self, name, seconds, labels=''):
+        '''Record seconds in the histogram name{labels}'''
+        try:
+            histograms = self._local.shard.histograms
+        except AttributeError:
+            histograms = self._shard().histograms
+        key = (name, labels)
+        h = histograms.get(key)
+        if h is None:
+            h = histograms[key] = [0] * (len(Metrics.BUCKETS) + 2)
+        h[bisect_left(Metrics.BUCKETS, seconds)] += 1
+        h[-1] += seconds
+
+    def wait(self, seconds):
+        '''Record the time waited for a busy session lock'''
+        self.observe(Metrics.LOCK_WAIT, seconds)
+
+    def timed(self, operation):
+        '''Decorate a request handler, or a coroutine function, to be timed'''
+        labels = 'operation="{}"'.format(operation)
+
+        def decorator(f):
+            if inspect.iscoroutinefunction(f):
+                @functools.wraps(f)
+                async def timedCoroutine(*args, **kwargs):
+                    start = time.perf_counter()
+                    try:
+                        return await f(*args, **kwargs)
+                    finally:
+                        self.observe(Metrics.REQUEST, time.perf_counter() - start, labels)
+                return timedCoroutine
+
+            @functools.wraps(f)
+            def timedFunction(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return f(*args, **kwargs)
+                finally:
+                    self.observe(Metrics.REQUEST, time.perf_counter() - start, labels)
+            return timedFunction
+
+        return decorator
+
+    @staticmethod
+    def errorClass(e):
+        '''Get the class of an exception, e.g. "ValueError: source N is empty"'''
+        if isinstance(e, Exception):
+            s = '{}: {}'.format(type(e).__name__, e)
+        else:
+            s = '{}'.format(e)
+        return Metrics.NUMBER.sub('N', s)[:Metrics.MAX_CLASS_LENGTH]
+
+    def error(self, e):
+        '''Count an exception (or message) by its class'''
+        c = Metrics.errorClass(e)
+        if c not in self._classes:
+            self._lock.acquire()
+            try:
+                if len(self._classes) < Metrics.MAX_CLASSES:
+                    self._classes.add(c)
+                else:
+                    c = 'other'
+            finally:
+                self._lock.release()
+        self.count(Metrics.ERRORS, 'error="{}"'.format(Metrics.escape(c)))
+
+    @staticmethod
+    def escape(value):
+        '''Escape a label value'''
+        return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+    def _total(self):
+        '''Sum the shards of all threads'''
+        self._lock.acquire()
+        try:
+            self._fold()
+            total = _Shard(None)
+            total.merge(self._retired)
+            for shard in self._shards:
+                total.merge(shard)
+        finally:
+            self._lock.release()
+        return total
+
+    def render(self):
+        '''Render all counters and histograms in the Prometheus text format'''
+        out = []
+        total = self._total()
+        typed = set()
+        for (name, labels), n in sorted(total.counters.items()):
+            if name not in typed:
+                typed.add(name)
+                out.append('# TYPE {} counter\n'.format(name))
+            out.append('{}{{{}}} {}\n'.format(name, labels, n) if labels else
+                       '{} {}\n'.format(name, n))
+        for (name, labels), h in sorted(total.histograms.items()):
+            if name not in typed:
+                typed.add(name)
+                out.append('# TYPE {} histogram\n'.format(name))
+            sep = ',' if labels else ''
+            n = 0
+            for bound, count in zip(Metrics.BUCKETS, h):
+                n += count
+                out.append('{}_bucket{{{}{}le="{}"}} {}\n'.format(name, labels, sep, bound, n))
+            n += h[-2]
+            out.append('{}_bucket{{{}{}le="+Inf"}} {}\n'.format(name, labels, sep, n))
+            suffix = '{{{}}}'.format(labels) if labels else ''
+            out.append('{}_sum{} {}\n'.format(name, suffix, h[-1]))
+            out.append('{}_count{} {}\n'.format(name, suffix, n))
+        return ''.join(out)
+
+
+Metrics.default = Metrics()
@@ -0,0 +1,110 @@
+# MIT License
+#
+# Copyright (c) 2020 Christopher Friedt
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+'''The ResponseCache Class
+
+The ResponseCache Class keeps encoded response bodies of session reads, so that
+polling an unchanged session costs a dict lookup rather than serialization.
+
+Every entry is stored with the version of the session it was encoded from, i.e.
+its numberOfMoves, which every move, undo and redo increments. An entry is only
+returned for the version it was encoded from, so a move invalidates the entries
+of its session without having to find them, even if it is made by another
+worker process sharing the same table. The same version makes up the ETag of a
+response, so clients that already have it get 304 Not Modified instead. The
+ETag also names the generation of the store (see SessionStore) and the
+representation, e.g. 'session.json', so that a tag is never matched by another
+representation, nor by a session of a restarted server that reuses the id.
+
+Lookups take no lock. When the cache is full, the oldest entry is dropped.
+
+Supported operations are:
+
+body = get(key, version)
+put(key, version, body)
+etag = etag(generation, id, version, representation)
+b = matches(ifNoneMatch, etag)
+'''
+
+from threading import Lock
+
+
+class ResponseCache(object):
+
+    def __init__(self, capacity=4096):
+        '''Initialize a ResponseCache of up to capacity bodies
+
+        A capacity of 0 disables the cache.
+        '''
+        if capacity < 0:
+            raise ValueError('capacity {} is invalid'.format(capacity))
+        self.capacity = capacity
+        # key -> (version, body), oldest first
+        self._entries = {}
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, version):
+        '''Get the body of key encoded from version, or None'''
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+        return None
+
+    def put(self, key, version, body):
+        '''Store the body of key encoded from version'''
+        if not self.capacity:
+            return
+        self._lock.acquire()
+        try:
+            entries = self._entries
+            # re-inserted entries become the newest
+            entries.pop(key, None)
+            while len(entries) >= self.capacity:
+                del entries[next(iter(entries))]
+            entries[key] = (version, body)
+        finally:
+            self._lock.release()
+
+    @staticmethod
+    def etag(generation, id, version, representation):
+        '''Get the ETag of a representation of version of session id'''
+        return 'W/"{:08x}-{}-{}.{}"'.format(generation, id, version, representation)
+
+    @staticmethod
+    def matches(ifNoneMatch, etag):
+        '''Check whether an If-None-Match header matches etag'''
+        if not ifNoneMatch:
+            return False
+        if ifNoneMatch.strip() == '*':
+            return True
+        # weak comparison
+        opaque = etag[2:] if etag.startswith('W/') else etag
+        for tag in ifNoneMatch.split(','):
+            tag = tag.strip()
+            if tag.startswith('W/'):
+                tag = tag[2:]
+            if tag == opaque:
+                return True
+        return False
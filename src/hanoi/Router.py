@@ -0,0 +1,376 @@
+# MIT License
+#
+# Copyright (c) 2020 Christopher Friedt
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+'''The Router Class
+
+The Router Class is a WSGI application that sits in front of several engine
+nodes (backends) and forwards every request to the node that owns it.
+
+Each backend is started with a distinct HANOI_NODE, so the session ids it
+allocates carry its node id (see SessionTable). Requests for an existing
+session, i.e. /v1/sessions/{sessionId}/..., are therefore forwarded to the
+node encoded in sessionId, which never changes when backends are added.
+
+Everything else is placed with consistent hashing (see HashRing). New
+sessions, and batches of new sessions, are spread over the ring, or kept on
+one node per client if the X-Hanoi-Client header is given, and stateless
+requests such as solutions are hashed by their path, so that each backend
+caches a stable subset of them.
+Adding a backend to N backends thus reassigns only about 1 / (N + 1) of those
+keys.
+
+GET /v1/sessions is sent to every backend, and the pages are merged in
+ascending id order. NDJSON listings are merged as they arrive, one session of
+each backend at a time, so that listing every session does not buffer them.
+
+Response bodies are relayed as they arrive rather than being buffered, and so
+are event streams, i.e. /v1/sessions/{sessionId}/events, over a dedicated
+connection to the owner of the session.
+
+Connections to backends are kept alive and reused, one per thread and backend.
+An idle connection that the backend has closed, i.e. one that is readable, is
+replaced before the request is sent. If a backend closes a kept-alive
+connection while the request is sent, the request is sent again over a new
+connection. If it is closed after the request was sent, the request may or
+may not have been served, so only safe requests, and requests with an
+Idempotency-Key, are sent again.
+
+Supported operations are:
+
+r = Router({node: url, ...})
+addBackend(node, url)
+removeBackend(node)
+url = owner(sessionId)
+'''
+
+import heapq
+import http.client
+import itertools
+import json
+import re
+import select
+import threading
+import urllib.parse
+
+from hanoi.HashRing import HashRing
+from hanoi.Serializer import Serializer
+from hanoi.SessionEvents import SessionEvents
+from hanoi.SessionTable import SessionTable
+
+
+class Router(object):
+
+    PREFIX = '/v1'
+    SESSION = re.compile(r'^/v1/sessions/(\d+)(/.*)?$')
+    # request headers that are not forwarded
+    HOP = frozenset(['HTTP_HOST', 'HTTP_CONNECTION', 'HTTP_KEEP_ALIVE',
+                     'HTTP_TRANSFER_ENCODING', 'HTTP_UPGRADE'])
+    # number of sessions per page if no limit is given, as in hanoi.app
+    LIMIT = 1000
+    # number of bytes read from a backend at a time
+    CHUNK = 65536
+    # methods that may be sent again if the backend closed the connection
+    SAFE = frozenset(['GET', 'HEAD', 'OPTIONS'])
+
+    def __init__(self, backends, replicas=100, timeout=10):
+        '''Initialize a Router object
+
+        :param backends: a dict of node id to base url of each backend, e.g.
+                         {0: 'http://localhost:8081'}
+        :param replicas: the number of points per backend on the hash ring
+        :param timeout: the number of seconds to wait for a backend
+        '''
+        self._backends = {}
+        self._ring = HashRing(replicas=replicas)
+        self._timeout = timeout
+        self._local = threading.local()
+        self._creates = itertools.count()
+        for node, url in backends.items():
+            self.addBackend(node, url)
+
+    @staticmethod
+    def parse(spec):
+        '''Parse backends from a string like "0=http://host:8081,1=http://host:8082"'''
+        backends = {}
+        for item in spec.split(','):
+            node, _, url = item.strip().partition('=')
+            if not url:
+                raise ValueError('backend {} is invalid'.format(item))
+            backends[int(node)] = url
+        return backends
+
+    def addBackend(self, node, url):
+        '''Add a backend with node id node, listening at url'''
+        SessionTable._checkNode(node)
+        u = urllib.parse.urlsplit(url)
+        if u.scheme != 'http' or not u.hostname:
+            raise ValueError('url {} is invalid'.format(url))
+        self._ring.add(node)
+        self._backends[node] = (u.hostname, u.port or 80)
+
+    def removeBackend(self, node):
+        '''Stop forwarding new sessions and stateless requests to node'''
+        self._ring.remove(node)
+
+    def owner(self, id):
+        '''Get the node id of the backend that owns session id'''
+        node = SessionTable.node(id)
+        if node not in self._backends:
+            raise KeyError(id)
+        return node
+
+    def _connection(self, node, fresh=False):
+        connections = getattr(self._local, 'connections', None)
+        if connections is None:
+            connections = self._local.connections = {}
+        c = connections.get(node)
+        if c is None or fresh or not Router._idle(c):
+            if c is not None:
+                c.close()
+            host, port = self._backends[node]
+            c = connections[node] = http.client.HTTPConnection(
+                host, port, timeout=self._timeout)
+        return c
+
+    @staticmethod
+    def _idle(c):
+        '''Check that a kept-alive connection can be reused
+
+        Nothing is sent by a backend between responses, so a readable socket
+        is at EOF, i.e. it was closed by the backend, or out of step.
+        '''
+        if c.sock is None:
+            return True
+        if hasattr(select, 'poll'):
+            p = select.poll()
+            p.register(c.sock, select.POLLIN)
+            return not p.poll(0)
+        return not select.select([c.sock], [], [], 0)[0]
+
+    def _forward(self, node, method, path, headers, body):
+        '''Send a request to node, returning (connection, response)
+
+        The response must be read to the end before the connection is used
+        again, or the connection must be closed.
+        '''
+        c = self._connection(node)
+        for attempt in range(2):
+            try:
+                c.request(method, path, body, headers)
+            except (ConnectionResetError, BrokenPipeError):
+                # a kept-alive connection was closed by the backend
+                if attempt:
+                    raise
+                c = self._connection(node, fresh=True)
+                continue
+            try:
+                return c, c.getresponse()
+            except (http.client.RemoteDisconnected, ConnectionResetError):
+                # the request may have been served before the connection closed
+                if attempt or not (method in Router.SAFE or 'Idempotency-Key' in headers):
+                    c.close()
+                    raise
+                c = self._connection(node, fresh=True)
+
+    def _stream(self, node, path, headers, start_response):
+        '''Relay an event stream from node without buffering it'''
+        host, port = self._backends[node]
+        # idle streams carry a keep-alive comment every KEEPALIVE seconds
+        c = http.client.HTTPConnection(
+            host, port, timeout=max(self._timeout, 2 * SessionEvents.KEEPALIVE))
+        try:
+            c.request('GET', path, None, headers)
+            r = c.getresponse()
+            if r.status != 200:
+                return Router._respond(start_response, r.status, r.getheaders(), r.read())
+        except BaseException:
+            c.close()
+            raise
+        start_response('200 OK', Router._hop(r.getheaders()))
+        return Router._relay(c, r, keep=False)
+
+    @staticmethod
+    def _relay(c, r, keep=True):
+        '''Generate the body of r as it arrives
+
+        The connection is closed afterwards, unless keep is True and the body
+        was read to the end.
+        '''
+        try:
+            while True:
+                chunk = r.read1(Router.CHUNK)
+                if not chunk:
+                    return
+                yield chunk
+        finally:
+            if not keep or not r.isclosed():
+                c.close()
+
+    @staticmethod
+    def _hop(headers):
+        '''Remove hop-by-hop response headers'''
+        return [(k, v) for k, v in headers if k.lower() not in (
+            'connection', 'keep-alive', 'transfer-encoding', 'content-length')]
+
+    @staticmethod
+    def _headers(environ):
+        headers = {}
+        for key, value in environ.items():
+            if key.startswith('HTTP_') and key not in Router.HOP:
+                headers[key[5:].replace('_', '-').title()] = value
+        if environ.get('CONTENT_LENGTH') and environ.get('CONTENT_TYPE'):
+            headers['Content-Type'] = environ['CONTENT_TYPE']
+        return headers
+
+    @staticmethod
+    def _respond(start_response, status, headers, body):
+        reason = http.client.responses.get(status, '')
+        headers = Router._hop(headers)
+        headers.append(('Content-Length', '{}'.format(len(body))))
+        start_response('{} {}'.format(status, reason), headers)
+        return [body]
+
+    @staticmethod
+    def _respondStream(start_response, c, r):
+        '''Relay the status, headers and body of a backend response'''
+        headers = Router._hop(r.getheaders())
+        length = r.getheader('Content-Length')
+        if length is not None:
+            headers.append(('Content-Length', length))
+        start_response('{} {}'.format(r.status, r.reason), headers)
+        return Router._relay(c, r)
+
+    @staticmethod
+    def _error(start_response, environ, code, e):
+        mimetype = Serializer.negotiate(environ.get('HTTP_ACCEPT'))
+        body = Serializer.encode(Serializer.error(code, e), mimetype)
+        return Router._respond(
+            start_response, code, [('Content-Type', mimetype)], body)
+
+    def __call__(self, environ, start_response):
+        method = environ['REQUEST_METHOD']
+        path = environ.get('PATH_INFO', '')
+        query = environ.get('QUERY_STRING', '')
+        target = path + ('?' + query if query else '')
+        length = int(environ.get('CONTENT_LENGTH') or 0)
+        body = environ['wsgi.input'].read(length) if length else None
+        headers = Router._headers(environ)
+        try:
+            m = Router.SESSION.match(path)
+            if m:
+                node = self.owner(int(m.group(1)))
+            elif path == Router.PREFIX + '/sessions' and method == 'GET':
+                return self._list(environ, start_response, query, headers)
+            elif path in (Router.PREFIX + '/sessions', Router.PREFIX + '/sessions:batch'):
+                key = environ.get('HTTP_X_HANOI_CLIENT')
+                node = self._ring.lookup(
+                    key if key else next(self._creates))
+            else:
+                node = self._ring.lookup(target)
+        except KeyError as e:
+            return Router._error(start_response, environ, 404,
+                                 'session {} has no backend'.format(e.args[0]))
+        except ValueError as e:
+            return Router._error(start_response, environ, 503, e)
+        try:
+            if m and m.group(2) == '/events' and method == 'GET':
+                return self._stream(node, target, headers, start_response)
+            c, r = self._forward(node, method, target, headers, body)
+        except (OSError, http.client.HTTPException) as e:
+            return Router._error(start_response, environ, 502, e)
+        return Router._respondStream(start_response, c, r)
+
+    def _list(self, environ, start_response, query, headers):
+        '''Merge one page of sessions from every backend'''
+        params = urllib.parse.parse_qs(query)
+        ndjson = 'application/x-ndjson' in headers.get('Accept', '')
+        limit = params.get('limit')
+        limit = int(limit[0]) if limit else (None if ndjson else Router.LIMIT)
+        headers = dict(headers)
+        headers['Accept'] = 'application/x-ndjson' if ndjson else 'application/json'
+        responses = []
+        try:
+            for node in sorted(self._backends):
+                c, r = self._forward(
+                    node, 'GET', Router.PREFIX + '/sessions?' + query, headers, None)
+                responses.append((c, r))
+                if r.status != 200:
+                    body = r.read()
+                    Router._close(responses)
+                    return Router._respond(start_response, r.status,
+                                           [('Content-Type', 'application/json')], body)
+        except (OSError, http.client.HTTPException) as e:
+            Router._close(responses)
+            return Router._error(start_response, environ, 502, e)
+        except BaseException:
+            Router._close(responses)
+            raise
+        if ndjson:
+            start_response('200 OK', [('Content-Type', 'application/x-ndjson')])
+            return Router._merge(responses, limit)
+        try:
+            pages = [json.load(r) for c, r in responses]
+        finally:
+            Router._close(responses)
+        merged = heapq.merge(*pages, key=lambda s: s['sessionId'])
+        sessions = list(itertools.islice(merged, limit))
+        mimetype = Serializer.negotiate(environ.get('HTTP_ACCEPT'))
+        return Router._respond(start_response, 200, [('Content-Type', mimetype)],
+                               Serializer.encode(sessions, mimetype))
+
+    @staticmethod
+    def _close(responses):
+        '''Close the connections of responses that were not read to the end'''
+        for c, r in responses:
+            if not r.isclosed():
+                c.close()
+
+    @staticmethod
+    def _merge(responses, limit):
+        '''Generate the NDJSON listings of responses, merged in ascending id order
+
+        Only one line of each listing is held at a time, and lines are passed
+        on as they are, a buffer at a time.
+        '''
+        def lines(r):
+            for line in r:
+                if line.strip():
+                    if not line.endswith(b'\n'):
+                        line += b'\n'
+                    yield json.loads(line)['sessionId'], line
+
+        try:
+            merged = heapq.merge(*[lines(r) for c, r in responses],
+                                 key=lambda item: item[0])
+            buffer = []
+            size = 0
+            for _, line in itertools.islice(merged, limit):
+                buffer.append(line)
+                size += len(line)
+                if size >= Router.CHUNK:
+                    yield b''.join(buffer)
+                    buffer = []
+                    size = 0
+            if buffer:
+                yield b''.join(buffer)
+        finally:
+            Router._close(responses)
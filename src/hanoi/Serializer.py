@@ -0,0 +1,188 @@
+# MIT License
+#
+# Copyright (c) 2020 Christopher Friedt
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+'''The Serializer Class
+
+The Serializer Class converts game states and errors to plain dicts, and
+encodes any such value to bytes with a single encoder, either as compact JSON
+or as MessagePack (https://msgpack.org).
+
+JSON is the default. MessagePack is used when the client sends
+"Accept: application/msgpack" and is considerably smaller for large games,
+since each tower bitmask is packed as a fixed-width integer of at most 9 bytes
+rather than as up to 20 decimal digits.
+
+The towers of games of more than 64 discs do not fit in a 64-bit integer, so
+they are converted to hexadecimal strings, in either encoding, which is still
+more compact than decimal digits.
+
+Only the types produced by this class are supported by the MessagePack
+encoder: dict, list, tuple, str, int, float, bool and None.
+
+Supported operations are:
+
+d = session(state)
+d = error(code, e)
+mimetype = negotiate(accept)
+b = encode(value, mimetype)
+'''
+
+import json
+import struct
+
+from hanoi.HanoiOracle import HanoiOracle
+
+JSON = 'application/json'
+MSGPACK = 'application/msgpack'
+
+_json = json.JSONEncoder(separators=(',', ':')).encode
+
+
+# (low, high, code, format) of the integers that are not packed in one byte
+_INTS = (
+    (0, 0xff, b'\xcc', '>B'),
+    (0, 0xffff, b'\xcd', '>H'),
+    (0, 0xffffffff, b'\xce', '>I'),
+    (0, 0xffffffffffffffff, b'\xcf', '>Q'),
+    (-0x80, -1, b'\xd0', '>b'),
+    (-0x8000, -1, b'\xd1', '>h'),
+    (-0x80000000, -1, b'\xd2', '>i'),
+    (-0x8000000000000000, -1, b'\xd3', '>q'),
+)
+
+
+def _packInt(x, out):
+    if -0x20 <= x < 0x80:
+        out.append(x & 0xff)
+        return
+    for low, high, code, fmt in _INTS:
+        if low <= x <= high:
+            out += code + struct.pack(fmt, x)
+            return
+    raise ValueError('{} does not fit in 64 bits'.format(x))
+
+
+def _packHeader(n, fix, fixMax, code16, code32, out):
+    '''Pack the header of a str, array or map of length n'''
+    if n <= fixMax:
+        out.append(fix | n)
+    elif n <= 0xffff:
+        out += code16 + struct.pack('>H', n)
+    else:
+        out += code32 + struct.pack('>I', n)
+
+
+def _packStr(value, out):
+    b = value.encode('utf-8')
+    if 31 < len(b) <= 0xff:
+        out += b'\xd9' + struct.pack('>B', len(b))
+    else:
+        _packHeader(len(b), 0xa0, 31, b'\xda', b'\xdb', out)
+    out += b
+
+
+def _packMap(value, out):
+    _packHeader(len(value), 0x80, 15, b'\xde', b'\xdf', out)
+    for k, v in value.items():
+        _pack(k, out)
+        _pack(v, out)
+
+
+def _pack(value, out):
+    if value is None:
+        out.append(0xc0)
+    elif value is True:
+        out.append(0xc3)
+    elif value is False:
+        out.append(0xc2)
+    elif isinstance(value, int):
+        _packInt(value, out)
+    elif isinstance(value, float):
+        out += b'\xcb' + struct.pack('>d', value)
+    elif isinstance(value, str):
+        _packStr(value, out)
+    elif isinstance(value, (list, tuple)):
+        _packHeader(len(value), 0x90, 15, b'\xdc', b'\xdd', out)
+        for v in value:
+            _pack(v, out)
+    elif isinstance(value, dict):
+        _packMap(value, out)
+    else:
+        raise TypeError('cannot pack {}'.format(type(value).__name__))
+
+
+class Serializer(object):
+
+    JSON = JSON
+    MSGPACK = MSGPACK
+
+    @staticmethod
+    def session(state):
+        '''Convert a HanoiState to a dict'''
+        d = {
+            'sessionId': state.id,
+            'numberOfDiscs': state.numberOfDiscs,
+            'fromTower': state.source,
+            'toTower': state.target,
+            'numberOfMoves': state.numberOfMoves,
+            'towers': list(state.tower),
+        }
+        if state.numberOfDiscs > 64:
+            # as hexadecimal strings, which any client can parse
+            d['towers'] = ['{:x}'.format(t) for t in d['towers']]
+        efficiency = HanoiOracle.efficiency(state)
+        if efficiency is not None:
+            d['efficiency'] = efficiency
+        return d
+
+    @staticmethod
+    def count(value):
+        '''Convert a count that may not fit in 64 bits
+
+        Counts of 2^64 or more, e.g. the remaining moves of a game of more than
+        64 discs, are converted to hexadecimal strings like towers are.
+        '''
+        if value >> 64:
+            return '{:x}'.format(value)
+        return value
+
+    @staticmethod
+    def error(code, e):
+        '''Convert an error code and exception (or message) to a dict'''
+        return {'code': code, 'message': '{}'.format(e)}
+
+    @staticmethod
+    def negotiate(accept):
+        '''Choose a mimetype for the value of an Accept header'''
+        if accept and ('application/msgpack' in accept or 'application/x-msgpack' in accept):
+            return MSGPACK
+        return JSON
+
+    @staticmethod
+    def encode(value, mimetype=JSON):
+        '''Encode a value as bytes of the given mimetype'''
+        if mimetype == MSGPACK:
+            out = bytearray()
+            _pack(value, out)
+            return bytes(out)
+        return _json(value).encode('utf-8')
@@ -0,0 +1,173 @@
+# MIT License
+#
+# Copyright (c) 2020 Christopher Friedt
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+'''The SessionEvents Class
+
+The SessionEvents Class pushes the moves of watched sessions to subscribers,
+so that clients can follow a game without polling getSession or isComplete.
+
+Events are formatted as Server-Sent Events (text/event-stream). A subscriber
+first receives the full session as a "session" event, then a compact "move"
+event after every successful move or batch of moves, i.e.
+
+event: move
+id: <numberOfMoves>
+data: {"numberOfMoves":<numberOfMoves>,"moves":[[source,target],...]}
+
+and a "complete" event whenever the session becomes complete, or incomplete
+again. The id of each event is the number of moves made so far.
+
+Each watched session has a single observer, which encodes each event once and
+hands the same bytes to every subscriber of that session, so a move costs
+O(subscribers) appends rather than a poll request per client. Subscribers are
+callables that must not block. A subscriber that returns False, e.g. because
+it has fallen too far behind, is dropped; it is up to the subscriber to close
+its stream, after which the client reconnects and starts over with a fresh
+"session" event.
+
+Moves are only seen by the process that makes them, so with a
+SharedSessionStore, subscribers only receive the moves made by their own
+worker.
+
+Supported operations are:
+
+b = event(name, value, id)
+b = subscribe(h, push)
+unsubscribe(h, push)
+n = subscribers(id)
+n = watched()
+'''
+
+import threading
+
+from hanoi.Serializer import Serializer
+
+
+class SessionEvents(object):
+
+    # the maximum number of undelivered events per subscriber
+    BACKLOG = 1024
+    # the number of seconds between keep-alive comments of idle streams
+    KEEPALIVE = 15
+
+    KEEPALIVE_EVENT = b': keepalive\n\n'
+
+    def __init__(self):
+        '''Initialize a SessionEvents object'''
+        self._lock = threading.Lock()
+        # session id -> tuple of subscribers
+        self._subscribers = {}
+        # session id -> whether the session was complete after its last move
+        self._complete = {}
+        # bound once, so that every session shares the same observer
+        self._observer = self._moved
+
+    @staticmethod
+    def event(name, value, id=None):
+        '''Format a Server-Sent Event with a JSON encoded value'''
+        head = 'event: {}\n'.format(name)
+        if id is not None:
+            head += 'id: {}\n'.format(id)
+        return head.encode('utf-8') + b'data: ' + Serializer.encode(value) + b'\n\n'
+
+    def subscribe(self, h, push, timeout=-1):
+        '''Call push(event) for every event of the session of h
+
+        Returns the initial "session" event. The subscription is made with
+        the session lock held, so that push receives every move made after
+        the returned state, and no move made before it.
+        '''
+        with h.locked(timeout):
+            s = h._state
+            id = s.id
+            self._lock.acquire()
+            try:
+                subscribers = self._subscribers.get(id)
+                if subscribers is None:
+                    subscribers = ()
+                    self._complete[id] = s.tower[s.target] == (1 << s.numberOfDiscs) - 1
+                    h.subscribe(self._observer)
+                self._subscribers[id] = subscribers + (push,)
+            finally:
+                self._lock.release()
+            return SessionEvents.event(
+                'session', Serializer.session(s), s.numberOfMoves)
+
+    def unsubscribe(self, h, push):
+        '''Stop calling push for the events of the session of h'''
+        id = h._state.id
+        self._lock.acquire()
+        try:
+            subscribers = self._subscribers.get(id, ())
+            self._remove(h, id, tuple(p for p in subscribers if p != push))
+        finally:
+            self._lock.release()
+
+    def subscribers(self, id):
+        '''Get the number of subscribers of session id'''
+        return len(self._subscribers.get(id, ()))
+
+    def watched(self):
+        '''Get the number of sessions with at least one subscriber'''
+        return len(self._subscribers)
+
+    def _remove(self, h, id, subscribers):
+        '''Replace the subscribers of session id with the lock held'''
+        if subscribers:
+            self._subscribers[id] = subscribers
+        elif id in self._subscribers:
+            del self._subscribers[id]
+            del self._complete[id]
+            h.unsubscribe(self._observer)
+
+    def _moved(self, h, numberOfMoves, moves):
+        '''Push a move event, and possibly a complete event, to every subscriber
+
+        This never raises, so watching a session can never roll back a move.
+        '''
+        s = h._state
+        id = s.id
+        n = s.numberOfMoves
+        events = [SessionEvents.event(
+            'move', {'numberOfMoves': n, 'moves': moves}, n)]
+        self._lock.acquire()
+        try:
+            complete = s.tower[s.target] == (1 << s.numberOfDiscs) - 1
+            if complete != self._complete.get(id, complete):
+                self._complete[id] = complete
+                events.append(SessionEvents.event(
+                    'complete', {'numberOfMoves': n, 'complete': complete}, n))
+            subscribers = self._subscribers.get(id, ())
+            dropped = []
+            for push in subscribers:
+                try:
+                    for e in events:
+                        if push(e) is False:
+                            dropped.append(push)
+                            break
+                except Exception:
+                    dropped.append(push)
+            if dropped:
+                self._remove(h, id, tuple(
+                    p for p in subscribers if p not in dropped))
+        finally:
+            self._lock.release()
@@ -0,0 +1,247 @@
+# MIT License
+#
+# Copyright (c) 2020 Christopher Friedt
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+'''The SessionIndex Class
+
+The SessionIndex Class maintains secondary indexes of session ids, so that
+sessions can be listed by id, by completion and by number of discs without
+scanning every session.
+
+Each index is a SortedIds set, i.e. a sorted array of unsigned 64-bit ids.
+Since ids are allocated in increasing order, new ids are almost always
+appended. Other ids are staged in a short sorted list, which is merged into the
+array once it has grown to a 64th of it, and removed ids are marked with
+tombstones, which are dropped once they make up a 16th of the array. So ids
+are added and removed in O(log n) amortized time, e.g. when the least-recently
+used sessions are evicted. Completion is indexed both ways, so listing
+incomplete sessions does not have to test every session.
+
+Queries resume from the last id returned (a cursor) rather than from a
+position, so they remain consistent while sessions are added and removed
+concurrently.
+
+Supported operations are:
+
+add(id, numberOfDiscs, complete)
+addMany([(id, numberOfDiscs, complete), ...])
+remove(id, numberOfDiscs)
+setComplete(id, complete)
+for id in query(after, complete, numberOfDiscs): ...
+'''
+
+from array import array
+from bisect import bisect_left, bisect_right
+from threading import Lock
+
+
+class SortedIds(object):
+    '''A set of ids that can be scanned in ascending order'''
+
+    __slots__ = ('_ids', '_staged', '_dead')
+
+    # the minimum number of staged ids, and tombstones, before a merge
+    MERGE = 1024
+
+    def __init__(self):
+        self._ids = array('Q')
+        # ids that were not appended, sorted
+        self._staged = []
+        # ids of _ids that were removed
+        self._dead = set()
+
+    def __len__(self):
+        return len(self._ids) - len(self._dead) + len(self._staged)
+
+    @staticmethod
+    def _find(a, id):
+        i = bisect_left(a, id)
+        return i < len(a) and a[i] == id
+
+    def __contains__(self, id):
+        if SortedIds._find(self._ids, id):
+            return id not in self._dead
+        return SortedIds._find(self._staged, id)
+
+    def add(self, id):
+        ids = self._ids
+        if not ids or id > ids[-1]:
+            ids.append(id)
+        elif SortedIds._find(ids, id):
+            self._dead.discard(id)
+        else:
+            staged = self._staged
+            i = bisect_left(staged, id)
+            if i == len(staged) or staged[i] != id:
+                staged.insert(i, id)
+                if len(staged) > max(SortedIds.MERGE, len(ids) >> 6):
+                    self._merge()
+
+    def remove(self, id):
+        if SortedIds._find(self._ids, id):
+            self._dead.add(id)
+            if len(self._dead) > max(SortedIds.MERGE, len(self._ids) >> 4):
+                self._merge()
+            return
+        i = bisect_left(self._staged, id)
+        if i < len(self._staged) and self._staged[i] == id:
+            del self._staged[i]
+
+    def _merge(self):
+        '''Merge the staged ids into the array and drop the tombstones'''
+        ids = self._ids.tolist()
+        if self._dead:
+            dead = self._dead
+            ids = [id for id in ids if id not in dead]
+        ids.extend(self._staged)
+        # two sorted runs
+        ids.sort()
+        self._ids = array('Q', ids)
+        self._staged = []
+        self._dead = set()
+
+    def scan(self, after, count):
+        '''Get up to count ids greater than after, in ascending order'''
+        ids = self._ids
+        dead = self._dead
+        result = []
+        i = bisect_right(ids, after)
+        while len(result) < count and i < len(ids):
+            chunk = ids[i:i + count - len(result)]
+            i += len(chunk)
+            result.extend([id for id in chunk if id not in dead] if dead else chunk)
+        staged = self._staged
+        if staged:
+            # the staged ids up to the last id taken from the array
+            j = bisect_right(staged, after)
+            k = len(staged) if i >= len(ids) else bisect_right(staged, result[-1])
+            if j < k:
+                result.extend(staged[j:k])
+                result.sort()
+                del result[count:]
+        return result
+
+
+class SessionIndex(object):
+
+    # the number of ids to look at with the lock held
+    CHUNK = 1024
+
+    def __init__(self):
+        '''Initialize an empty SessionIndex object'''
+        self._all = SortedIds()
+        self._complete = SortedIds()
+        self._incomplete = SortedIds()
+        self._byDiscs = {}
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._all)
+
+    def _add(self, id, numberOfDiscs, complete):
+        self._all.add(id)
+        bucket = self._byDiscs.get(numberOfDiscs)
+        if bucket is None:
+            bucket = self._byDiscs[numberOfDiscs] = SortedIds()
+        bucket.add(id)
+        if complete:
+            self._complete.add(id)
+        else:
+            self._incomplete.add(id)
+
+    def add(self, id, numberOfDiscs, complete=False):
+        '''Add a session to the index'''
+        self._lock.acquire()
+        try:
+            self._add(id, numberOfDiscs, complete)
+        finally:
+            self._lock.release()
+
+    def addMany(self, sessions):
+        '''Add a list of (id, numberOfDiscs, complete) sessions to the index'''
+        self._lock.acquire()
+        try:
+            for id, numberOfDiscs, complete in sessions:
+                self._add(id, numberOfDiscs, complete)
+        finally:
+            self._lock.release()
+
+    def remove(self, id, numberOfDiscs):
+        '''Remove a session from the index'''
+        self._lock.acquire()
+        try:
+            self._all.remove(id)
+            self._complete.remove(id)
+            self._incomplete.remove(id)
+            bucket = self._byDiscs.get(numberOfDiscs)
+            if bucket is not None:
+                bucket.remove(id)
+                if not bucket:
+                    del self._byDiscs[numberOfDiscs]
+        finally:
+            self._lock.release()
+
+    def setComplete(self, id, complete):
+        '''Mark a session as complete or incomplete'''
+        self._lock.acquire()
+        try:
+            if complete:
+                self._incomplete.remove(id)
+                self._complete.add(id)
+            else:
+                self._complete.remove(id)
+                self._incomplete.add(id)
+        finally:
+            self._lock.release()
+
+    def query(self, after=-1, complete=None, numberOfDiscs=None):
+        '''Generate ids greater than after in ascending order
+
+        :param after: only ids greater than this are generated
+        :param complete: if not None, only generate ids of sessions that
+                         are (True) or are not (False) complete
+        :param numberOfDiscs: if not None, only generate ids of sessions
+                              with this number of discs
+        '''
+        while True:
+            self._lock.acquire()
+            try:
+                scan = self._all
+                if complete is not None:
+                    scan = self._complete if complete else self._incomplete
+                other = None
+                if numberOfDiscs is not None:
+                    bucket = self._byDiscs.get(numberOfDiscs, ())
+                    # scan the smaller index and test membership in the other
+                    if scan is self._all or len(bucket) < len(scan):
+                        scan, other = bucket, (None if scan is self._all else scan)
+                    else:
+                        other = bucket
+                chunk = scan.scan(after, SessionIndex.CHUNK) if scan else []
+                ids = chunk if other is None else [id for id in chunk if id in other]
+            finally:
+                self._lock.release()
+            for id in ids:
+                yield id
+            if len(chunk) < SessionIndex.CHUNK:
+                return
+            after = chunk[-1]
@@ -0,0 +1,807 @@
+# MIT License
+#
+# Copyright (c) 2020 Christopher Friedt
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+'''The SessionStore Classes
+
+A SessionStore keeps track of all Hanoi sessions by id.
+
+SessionStore keeps sessions in memory only, so all sessions are lost when the
+server is restarted.
+
+FileSessionStore additionally persists sessions to a directory, using an
+append-only write-ahead log (wal) of create and move events, and periodic
+compacted snapshots of every session. On startup, the latest snapshot is loaded
+and only the log written since that snapshot is replayed, so the time to
+recover is bounded by the snapshot interval rather than by the total number of
+moves ever made.
+
+Either store can limit the number of resident sessions. Sessions that have been
+idle for longer than ttl seconds expire, and the least-recently used sessions
+are evicted when there are more than maxSessions. Expired and evicted sessions
+are either dropped or, if a spill file is given, written to it as fixed-width
+SessionTable records and transparently reloaded on their next access. The spill
+file is not persistent storage; it is truncated when the store is created.
+Moves of an evicted Hanoi object raise Hanoi.Evicted, so callers that held on
+to it must look the session up again.
+
+Stores that log moves, or reload spilled sessions, are blocking, i.e. moves
+and lookups may wait for files, which asynchronous servers must take into
+account.
+
+Every store has a random generation, which is part of the ETags of session
+reads, since ids, and numbers of moves, start over when an in-memory store
+is created again. Workers sharing a SharedSessionTable share its generation.
+
+Sessions can also be listed in ascending id order, optionally filtered by
+completion and number of discs. Filters are backed by a SessionIndex, which is
+kept up to date as sessions are created, moved and dropped.
+
+SharedSessionStore keeps sessions in a SharedSessionTable, i.e. a memory-mapped
+file that is shared by several worker processes, so that every worker sees
+every game. Sessions are neither persisted, expired nor evicted, and listing
+them scans the table instead of maintaining an index, since other processes
+create and move sessions as well.
+
+Supported operations are:
+
+h = create(numberOfDiscs, source, target, numberOfTowers)
+[h, ...] = createMany([(numberOfDiscs, source, target, numberOfTowers), ...])
+h = store[id]
+store.blocking
+for h in values(): ...
+for h in query(after, limit, complete, numberOfDiscs): ...
+metrics = metrics()
+expire()
+close()
+'''
+
+import itertools
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict
+
+from hanoi import Hanoi
+from hanoi import HanoiState
+from hanoi.SessionIndex import SessionIndex
+from hanoi.SessionTable import SessionTable
+from hanoi.SharedSessionTable import SharedSessionTable
+
+
+class SpillFile(object):
+
+    # id, meta, numberOfMoves, tower 0, tower 1, tower 2, ...
+    RECORDS = [struct.Struct('<{}Q'.format(SessionTable.TOWER + k))
+               for k in range(SessionTable.MAX_TOWERS + 1)]
+    # id, meta, numberOfMoves of a game of more than 64 discs, followed by
+    # towers of as many little-endian words as it takes
+    HEADER = struct.Struct('<{}Q'.format(SessionTable.TOWER))
+
+    def __init__(self, path):
+        '''Initialize a SpillFile object, truncating path'''
+        self._file = open(path, 'w+b')
+        # id to (file offset, record size)
+        self._index = {}
+        # record size to free file offsets of records of that size
+        self._free = {}
+        self._end = 0
+
+    def __contains__(self, id):
+        return id in self._index
+
+    def __len__(self):
+        return len(self._index)
+
+    def ids(self):
+        '''Get a list of the ids of all spilled sessions'''
+        return list(self._index)
+
+    def put(self, h):
+        '''Write the state of h to the file'''
+        s = h._state
+        k = s.numberOfTowers
+        n = s.numberOfDiscs
+        meta = SessionTable.pack(n, s.source, s.target, k)
+        if n <= SessionTable.WORD_DISCS:
+            record = SpillFile.RECORDS[k].pack(s.id, meta, s.numberOfMoves, *s.tower)
+        else:
+            size = 8 * ((n + 63) >> 6)
+            record = SpillFile.HEADER.pack(s.id, meta, s.numberOfMoves) + b''.join(
+                t.to_bytes(size, 'little') for t in s.tower)
+        free = self._free.get(len(record))
+        if free:
+            offset = free.pop()
+        else:
+            offset = self._end
+            self._end += len(record)
+        self._file.seek(offset)
+        self._file.write(record)
+        self._index[s.id] = (offset, len(record))
+
+    def _read(self, id):
+        '''Read the arguments of Hanoi.restore() of the session with id'''
+        offset, size = self._index[id]
+        self._file.seek(offset)
+        record = self._file.read(size)
+        id, meta, m = SpillFile.HEADER.unpack_from(record)
+        n, s, t = SessionTable.unpack(meta)
+        k = SessionTable.numberOfTowers(meta)
+        if n <= SessionTable.WORD_DISCS:
+            tower = SpillFile.RECORDS[k].unpack(record)[SessionTable.TOWER:]
+        else:
+            w = (size - SpillFile.HEADER.size) // k
+            tower = [int.from_bytes(record[i:i + w], 'little')
+                     for i in range(SpillFile.HEADER.size, size, w)]
+        return id, n, s, t, m, tower, k
+
+    def get(self, id):
+        '''Read the session with id from the file
+
+        The session has a table of its own, so that reading spilled sessions
+        does not take up records of resident ones.
+        '''
+        id, n, s, t, m, tower, k = self._read(id)
+        table = SessionTable(1, towers=k, discs=max(n, SessionTable.WORD_DISCS))
+        return Hanoi.restore(id, n, s, t, m, tower, k, table)
+
+    def pop(self, id):
+        '''Read the session with id from the file and remove it'''
+        h = Hanoi.restore(*self._read(id))
+        offset, size = self._index.pop(id)
+        self._free.setdefault(size, []).append(offset)
+        return h
+
+    def close(self):
+        self._file.close()
+
+
+class SessionStore(object):
+
+    def __init__(self, ttl=None, maxSessions=None, spill=None):
+        '''Initialize an in-memory SessionStore object
+
+        :param ttl: the number of seconds after which idle sessions expire,
+                    or None
+        :param maxSessions: the maximum number of resident sessions, or None
+        :param spill: the path of a file to spill expired and evicted
+                      sessions to, or None to drop them
+        '''
+        if ttl is not None and ttl <= 0:
+            raise ValueError('ttl {} is invalid'.format(ttl))
+        if maxSessions is not None and maxSessions <= 0:
+            raise ValueError('maxSessions {} is invalid'.format(maxSessions))
+        # resident sessions, least-recently used first
+        self._sessions = OrderedDict()
+        # time of last access, if ttl is set
+        self._lastAccess = {}
+        self._ttl = ttl
+        self._maxSessions = maxSessions
+        self._spill = None if spill is None else SpillFile(spill)
+        # whether moves or lookups may wait for files
+        self.blocking = spill is not None
+        self._lock = threading.Lock()
+        self._index = SessionIndex()
+        # bound once, so that every session shares the same observer
+        self._observer = self._moved
+        self.expirations = 0
+        self.evictions = 0
+        self.reloads = 0
+        self.generation = int.from_bytes(os.urandom(4), 'little')
+
+    @staticmethod
+    def _isComplete(s):
+        return s.tower[s.target] == (1 << s.numberOfDiscs) - 1
+
+    def _moved(self, h, numberOfMoves, moves):
+        '''Keep the index up to date after every move'''
+        s = h._state
+        complete = SessionStore._isComplete(s)
+        # a session can only become incomplete by moving a disc off target
+        if complete or any(m[0] == s.target for m in moves):
+            self._index.setComplete(s.id, complete)
+
+    def _track(self, h):
+        '''Add a new session to the index and observe its moves'''
+        s = h._state
+        self._index.add(s.id, s.numberOfDiscs, SessionStore._isComplete(s))
+        h.subscribe(self._observer)
+
+    def _trackMany(self, hs):
+        '''Add new sessions to the index and observe their moves
+
+        New sessions are never complete, since source may not equal target.
+        '''
+        self._index.addMany([(h._state.id, h._state.numberOfDiscs, False)
+                             for h in hs])
+        for h in hs:
+            h.subscribe(self._observer)
+
+    def _insert(self, h):
+        '''Make h resident with the store lock held'''
+        id = h._state.id
+        self._sessions[id] = h
+        if self._ttl is not None:
+            self._lastAccess[id] = time.monotonic()
+        self._evict()
+
+    def _insertMany(self, hs):
+        '''Make sessions resident with the store lock held'''
+        now = time.monotonic()
+        for h in hs:
+            id = h._state.id
+            self._sessions[id] = h
+            if self._ttl is not None:
+                self._lastAccess[id] = now
+        self._evict()
+
+    def _evictOne(self, id):
+        '''Spill or drop a resident session with the store lock held
+
+        Sessions that are busy, or observed by anyone but the store (e.g.
+        watched by SessionEvents), are not evicted. Returns True if the
+        session was evicted.
+        '''
+        h = self._sessions[id]
+        if any(o != self._observer for o in h._observers) or \
+                not h._lock.acquire(blocking=False):
+            self._sessions.move_to_end(id)
+            return False
+        try:
+            if self._spill is not None:
+                self._spill.put(h)
+            else:
+                self._index.remove(id, h._state.numberOfDiscs)
+            del self._sessions[id]
+            self._lastAccess.pop(id, None)
+            # a reload is a new object, so moves of this one would be lost
+            h.evict()
+        finally:
+            h._lock.release()
+        return True
+
+    def _evict(self):
+        '''Expire idle sessions and evict excess sessions'''
+        if self._ttl is not None:
+            now = time.monotonic()
+            for id in list(self._sessions):
+                if now - self._lastAccess[id] < self._ttl:
+                    break
+                if self._evictOne(id):
+                    self.expirations += 1
+        if self._maxSessions is not None:
+            busy = 0
+            while len(self._sessions) > self._maxSessions + busy:
+                if self._evictOne(next(iter(self._sessions))):
+                    self.evictions += 1
+                else:
+                    busy += 1
+
+    def create(self, numberOfDiscs=4, source=0, target=2, numberOfTowers=3):
+        '''Create a new session'''
+        h = Hanoi(numberOfDiscs, source, target, numberOfTowers)
+        self._track(h)
+        self._lock.acquire()
+        try:
+            self._insert(h)
+        finally:
+            self._lock.release()
+        return h
+
+    def createMany(self, games):
+        '''Create a session per game, with consecutive ids
+
+        games is a list of (numberOfDiscs, source, target, numberOfTowers)
+        tuples. The sessions are indexed and made resident in bulk.
+        '''
+        hs = Hanoi.createMany(games)
+        self._trackMany(hs)
+        self._lock.acquire()
+        try:
+            self._insertMany(hs)
+        finally:
+            self._lock.release()
+        return hs
+
+    def __getitem__(self, id):
+        self._lock.acquire()
+        try:
+            h = self._sessions.get(id)
+            if h is not None:
+                self._sessions.move_to_end(id)
+                if self._ttl is not None:
+                    self._lastAccess[id] = time.monotonic()
+            elif self._spill is not None and id in self._spill:
+                h = self._spill.pop(id)
+                self.reloads += 1
+                # spilled sessions remain in the index
+                h.subscribe(self._observer)
+                self._insert(h)
+            else:
+                raise KeyError(id)
+            return h
+        finally:
+            self._lock.release()
+
+    def __contains__(self, id):
+        self._lock.acquire()
+        try:
+            return id in self._sessions or (
+                self._spill is not None and id in self._spill)
+        finally:
+            self._lock.release()
+
+    def __len__(self):
+        return len(self._sessions) + (0 if self._spill is None else len(self._spill))
+
+    def _peek(self, id):
+        '''Get a session without making it resident, or None'''
+        self._lock.acquire()
+        try:
+            h = self._sessions.get(id)
+            if h is None and self._spill is not None and id in self._spill:
+                h = self._spill.get(id)
+            return h
+        finally:
+            self._lock.release()
+
+    def query(self, after=None, limit=None, complete=None, numberOfDiscs=None):
+        '''Generate sessions in ascending id order
+
+        Spilled sessions are read, but do not become resident.
+
+        :param after: only generate sessions with an id greater than this
+        :param limit: the maximum number of sessions to generate, or None
+        :param complete: if not None, only generate sessions that are (True)
+                         or are not (False) complete
+        :param numberOfDiscs: if not None, only generate sessions with this
+                              number of discs
+        '''
+        if limit is not None and limit < 0:
+            raise ValueError('limit {} is invalid'.format(limit))
+        return self._query(-1 if after is None else after,
+                           limit, complete, numberOfDiscs)
+
+    def _query(self, after, limit, complete, numberOfDiscs):
+        n = 0
+        for id in self._index.query(after, complete, numberOfDiscs):
+            if limit is not None and n >= limit:
+                return
+            h = self._peek(id)
+            if h is not None:
+                n += 1
+                yield h
+
+    def values(self):
+        '''Get a list of all sessions in ascending id order'''
+        return list(self.query())
+
+    def expire(self):
+        '''Expire idle sessions
+
+        This happens whenever sessions are created or accessed, but may also
+        be called periodically.
+        '''
+        self._lock.acquire()
+        try:
+            self._evict()
+        finally:
+            self._lock.release()
+
+    def metrics(self):
+        '''Get a dict of session lifecycle counters'''
+        return {
+            'resident': len(self._sessions),
+            'spilled': 0 if self._spill is None else len(self._spill),
+            'expirations': self.expirations,
+            'evictions': self.evictions,
+            'reloads': self.reloads,
+        }
+
+    def close(self):
+        '''Release any resources held by the store'''
+        if self._spill is not None:
+            self._spill.close()
+
+
+class FileSessionStore(SessionStore):
+
+    SNAPSHOT = 'snapshot'
+    WAL = 'wal'
+    # the log being compacted into a snapshot
+    OLD_WAL = 'wal.1'
+
+    def __init__(self, path, snapshotInterval=10000, sync=False, **kwargs):
+        '''Initialize a FileSessionStore object
+
+        Sessions are recovered from path, if it contains any.
+
+        :param path: the directory in which to store sessions
+        :param snapshotInterval: the number of events after which to compact
+                                 the log into a snapshot
+        :param sync: if True, fsync() every event, otherwise events are only
+                     flushed to the operating system
+
+        Other keyword arguments are passed to SessionStore.
+        '''
+        super().__init__(**kwargs)
+        # every move is logged
+        self.blocking = True
+        if snapshotInterval <= 0:
+            raise ValueError(
+                'snapshotInterval {} is invalid'.format(snapshotInterval))
+        self._path = path
+        self._snapshotInterval = snapshotInterval
+        self._sync = sync
+        # serializes appends to the log
+        self._logLock = threading.Lock()
+        # serializes compactions
+        self._compactLock = threading.Lock()
+        self._events = 0
+        self._closed = False
+        self._pending = threading.Event()
+
+        os.makedirs(path, exist_ok=True)
+        replayed = self._recover()
+        self._wal = open(self._file(FileSessionStore.WAL), 'a')
+        now = time.monotonic()
+        for h in self._sessions.values():
+            self._track(h)
+            if self._ttl is not None:
+                self._lastAccess[h._state.id] = now
+        self.expire()
+        if replayed or os.path.exists(self._file(FileSessionStore.OLD_WAL)):
+            self.compact()
+
+        self._compactor = threading.Thread(target=self._compactLoop)
+        self._compactor.daemon = True
+        self._compactor.start()
+
+    def _file(self, name):
+        return os.path.join(self._path, name)
+
+    def _recover(self):
+        '''Load the latest snapshot and replay the log
+
+        Replay is idempotent: a move event is skipped if the session had
+        already made that move when the snapshot was taken.
+
+        Returns the number of events replayed.
+        '''
+        try:
+            with open(self._file(FileSessionStore.SNAPSHOT)) as f:
+                header = f.readline().split()
+                if header[:2] != ['hanoi-snapshot', '1']:
+                    raise ValueError('snapshot header {} is invalid'.format(header))
+                HanoiState.setCounter(int(header[2]))
+                for line in f:
+                    id, n, s, t, m, *tower = [int(x) for x in line.split()]
+                    self._sessions[id] = Hanoi.restore(
+                        id, n, s, t, m, tower, len(tower))
+        except FileNotFoundError:
+            pass
+
+        replayed = 0
+        for name in [FileSessionStore.OLD_WAL, FileSessionStore.WAL]:
+            try:
+                with open(self._file(name)) as f:
+                    for line in f:
+                        if not line.endswith('\n'):
+                            # an event that was only partially written
+                            break
+                        self._replay(line.split())
+                        replayed += 1
+            except FileNotFoundError:
+                pass
+        return replayed
+
+    def _replay(self, event):
+        if event[0] == 'c':
+            # the number of towers is only logged if it is not 3
+            id, n, s, t, *k = [int(x) for x in event[1:]]
+            if id not in self._sessions:
+                self._sessions[id] = Hanoi.restore(
+                    id, n, s, t, numberOfTowers=k[0] if k else 3)
+        elif event[0] == 'm':
+            id, before = int(event[1]), int(event[2])
+            pairs = [int(x) for x in event[3:]]
+            moves = list(zip(pairs[0::2], pairs[1::2]))
+            h = self._sessions[id]
+            m = h._state.numberOfMoves
+            if m == before:
+                h.moves(moves)
+            elif m < before:
+                raise ValueError('session {} is missing moves {} to {}'.format(
+                    id, m, before - 1))
+        else:
+            raise ValueError('event {} is invalid'.format(event))
+
+    def _append(self, line, events=1):
+        '''Append events to the log with the log lock held'''
+        self._wal.write(line)
+        self._wal.flush()
+        if self._sync:
+            os.fsync(self._wal.fileno())
+        self._events += events
+        if self._events >= self._snapshotInterval:
+            self._pending.set()
+
+    def _moved(self, h, numberOfMoves, moves):
+        line = 'm {} {} {}\n'.format(h._state.id, numberOfMoves,
+                                     ' '.join('{} {}'.format(s, t) for s, t in moves))
+        self._logLock.acquire()
+        try:
+            self._append(line)
+        finally:
+            self._logLock.release()
+        super()._moved(h, numberOfMoves, moves)
+
+    def create(self, numberOfDiscs=4, source=0, target=2, numberOfTowers=3):
+        '''Create a new session'''
+        h = Hanoi(numberOfDiscs, source, target, numberOfTowers)
+        s = h._state
+        self._logLock.acquire()
+        try:
+            if numberOfTowers == 3:
+                self._append('c {} {} {} {}\n'.format(
+                    s.id, s.numberOfDiscs, s.source, s.target))
+            else:
+                self._append('c {} {} {} {} {}\n'.format(
+                    s.id, s.numberOfDiscs, s.source, s.target, numberOfTowers))
+            # a logged session must be visible to compact()
+            self._track(h)
+            self._lock.acquire()
+            try:
+                self._insert(h)
+            finally:
+                self._lock.release()
+        finally:
+            self._logLock.release()
+        return h
+
+    def createMany(self, games):
+        '''Create a session per game, with consecutive ids
+
+        The sessions are logged with a single write.
+        '''
+        hs = Hanoi.createMany(games)
+        lines = []
+        for h in hs:
+            s = h._state
+            if s.numberOfTowers == 3:
+                lines.append('c {} {} {} {}\n'.format(
+                    s.id, s.numberOfDiscs, s.source, s.target))
+            else:
+                lines.append('c {} {} {} {} {}\n'.format(
+                    s.id, s.numberOfDiscs, s.source, s.target, s.numberOfTowers))
+        self._logLock.acquire()
+        try:
+            self._append(''.join(lines), len(lines))
+            # logged sessions must be visible to compact()
+            self._trackMany(hs)
+            self._lock.acquire()
+            try:
+                self._insertMany(hs)
+            finally:
+                self._lock.release()
+        finally:
+            self._logLock.release()
+        return hs
+
+    def compact(self):
+        '''Write a snapshot of every session and discard the old log
+
+        The log lock is only held to start a new log and to copy the
+        sessions, and spilled sessions are read after it is released, so
+        that moves are not held up for the duration of the snapshot. States
+        that are read later may include moves of the new log, which are then
+        skipped when it is replayed.
+        '''
+        self._compactLock.acquire()
+        try:
+            wal = self._file(FileSessionStore.WAL)
+            old = self._file(FileSessionStore.OLD_WAL)
+
+            # start a new log; events in it may or may not be in the snapshot
+            self._logLock.acquire()
+            try:
+                self._wal.close()
+                if os.path.exists(old):
+                    # a previous compaction did not complete
+                    with open(old, 'a') as dst, open(wal) as src:
+                        dst.write(src.read())
+                    os.remove(wal)
+                else:
+                    os.replace(wal, old)
+                self._wal = open(wal, 'a')
+                self._events = 0
+                self._pending.clear()
+                counter = HanoiState.getCounter()
+                # every logged session, but moves wait for the log lock, so
+                # states are only read once it is released
+                self._lock.acquire()
+                try:
+                    spilled = [] if self._spill is None else self._spill.ids()
+                    resident = list(self._sessions.values())
+                finally:
+                    self._lock.release()
+            finally:
+                self._logLock.release()
+
+            tmp = self._file(FileSessionStore.SNAPSHOT + '.tmp')
+            with open(tmp, 'w') as f:
+                f.write('hanoi-snapshot 1 {}\n'.format(counter))
+                # least-recently used first, like the store
+                for h in itertools.chain(map(self._peek, spilled), resident):
+                    if h is None:
+                        # dropped since
+                        continue
+                    s = h.getState()
+                    f.write('{} {} {} {} {} {}\n'.format(
+                        s.id, s.numberOfDiscs, s.source, s.target,
+                        s.numberOfMoves, ' '.join(str(t) for t in s.tower)))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self._file(FileSessionStore.SNAPSHOT))
+            os.remove(old)
+        finally:
+            self._compactLock.release()
+
+    def _compactLoop(self):
+        while True:
+            self._pending.wait()
+            if self._closed:
+                return
+            self.compact()
+
+    def close(self):
+        '''Stop compacting and close the log'''
+        self._closed = True
+        self._pending.set()
+        self._compactor.join()
+        self._logLock.acquire()
+        try:
+            self._wal.close()
+        finally:
+            self._logLock.release()
+        super().close()
+
+
+class SharedSessionStore(SessionStore):
+
+    def __init__(self, path, capacity=1 << 20, node=0, towers=3):
+        '''Initialize a SharedSessionStore object
+
+        :param path: the file in which sessions are shared, preferably on a
+                     tmpfs such as /dev/shm
+        :param capacity: the maximum number of sessions, if path is created
+        :param node: the node id of session ids, if path is created
+        :param towers: the maximum number of towers of a game, if path is
+                       created
+
+        See SharedSessionTable.
+        '''
+        super().__init__()
+        self._table = SharedSessionTable(path, capacity, node, towers)
+        self.generation = self._table.generation()
+        # the sessions this process has accessed, so that each record has
+        # exactly one RecordLock per process
+        self._sessions = {}
+
+    def _attach(self, id, slot):
+        '''Get the session with id with the store lock held'''
+        h = self._sessions.get(id)
+        if h is None:
+            h = Hanoi.attach(HanoiState.attach(self._table, slot),
+                             self._table.lock(slot))
+            self._sessions[id] = h
+        return h
+
+    def _slot(self, id):
+        '''Get the slot of a session that has been created and initialized, or None'''
+        if not isinstance(id, int):
+            return None
+        slot = self._table.slot(id)
+        # the meta word is 0 until the record has been initialized
+        if slot is None or not self._table.words[
+                slot * self._table.width + SessionTable.META]:
+            return None
+        return slot
+
+    def create(self, numberOfDiscs=4, source=0, target=2, numberOfTowers=3):
+        '''Create a new session'''
+        s = HanoiState(numberOfDiscs, source, target, self._table, numberOfTowers)
+        slot = s._base // self._table.width
+        self._lock.acquire()
+        try:
+            h = Hanoi.attach(s, self._table.lock(slot))
+            self._sessions[s.id] = h
+        finally:
+            self._lock.release()
+        return h
+
+    def createMany(self, games):
+        '''Create a session per game, with consecutive ids'''
+        states = HanoiState.createMany(games, self._table)
+        self._lock.acquire()
+        try:
+            hs = []
+            for s in states:
+                h = Hanoi.attach(s, self._table.lock(s._base // self._table.width))
+                self._sessions[s.id] = h
+                hs.append(h)
+        finally:
+            self._lock.release()
+        return hs
+
+    def __getitem__(self, id):
+        slot = self._slot(id)
+        if slot is None:
+            raise KeyError(id)
+        self._lock.acquire()
+        try:
+            return self._attach(id, slot)
+        finally:
+            self._lock.release()
+
+    def __contains__(self, id):
+        return self._slot(id) is not None
+
+    def __len__(self):
+        return len(self._table)
+
+    def _query(self, after, limit, complete, numberOfDiscs):
+        n = 0
+        first = max(after + 1, self._table.getCounter() - len(self._table))
+        for id in range(first, self._table.getCounter()):
+            if limit is not None and n >= limit:
+                return
+            if self._slot(id) is None:
+                continue
+            h = self[id]
+            if complete is not None or numberOfDiscs is not None:
+                s = h.getState()
+                if complete is not None and s.isComplete() != complete:
+                    continue
+                if numberOfDiscs is not None and s.numberOfDiscs != numberOfDiscs:
+                    continue
+            n += 1
+            yield h
+
+    def expire(self):
+        '''Shared sessions do not expire'''
+        pass
+
+    def metrics(self):
+        m = super().metrics()
+        m['resident'] = len(self)
+        return m
+
+    def close(self):
+        '''Unmap the shared table'''
+        self._lock.acquire()
+        try:
+            self._sessions.clear()
+        finally:
+            self._lock.release()
+        self._table.close()
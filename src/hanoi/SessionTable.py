@@ -0,0 +1,341 @@
+# MIT License
+#
+# Copyright (c) 2020 Christopher Friedt
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+'''The SessionTable Class
+
+The SessionTable Class stores the state of many games as fixed-width records
+in one contiguous array of unsigned 64-bit words, rather than as one Python
+object (with its own dict, list and ints) per game.
+
+Each record has the following layout.
+
+word 0: session id
+word 1: (numberOfDiscs & 0xff) | source << 8 | (numberOfTowers - 3) << 12
+        | target << 16 | (numberOfDiscs >> 8) << 19 | sequence << 24
+word 2: numberOfMoves
+word 3: tower 0
+word 4: tower 1
+word 5: tower 2
+...
+word 3 + towers - 1: tower towers - 1
+
+I.e. 48 bytes per game for a table of 3 towers, which is the default. A table
+of more towers (up to MAX_TOWERS) holds games of fewer towers as well, and
+their remaining tower words are 0. Records are addressed by slot. Released
+slots are reused before the table grows. The meta word of a free record is 0,
+so a record that has been released already is not released again.
+
+A tower of a game of up to 64 discs fits in one word. A table for games of
+more discs (up to MAX_DISCS) keeps its words in a list of Python ints rather
+than in an array, with the same layout, so that each tower is still a single
+item, but of arbitrary width. Such tables are slower and take more memory, so
+they are only used for games that do not fit in an array.
+
+The sequence number makes the record a seqlock. A writer increments it before
+and after modifying the record, so it is odd while a write is in progress.
+Readers copy the record without locking and retry (or fall back to the
+writer's lock) if the sequence number was odd or has changed in the meantime.
+
+HanoiState instances are thin views over a single record of a SessionTable.
+The table also allocates session ids. Ids are node << 48 | sequence, where
+sequence is allocated locally, so that several engine nodes with distinct node
+ids never allocate the same id, and the node that owns a session can be told
+from its id alone. Node ids are limited to 15 bits, so that session ids remain
+positive 64-bit integers.
+'''
+
+from array import array
+from threading import Lock
+
+
+class SessionTable(object):
+
+    # word offsets within a record
+    ID = 0
+    META = 1
+    MOVES = 2
+    TOWER = 3
+    # the width of a record of 3 towers
+    WIDTH = 6
+
+    MIN_TOWERS = 3
+    MAX_TOWERS = 8
+
+    # the number of discs of a game whose towers fit in one word
+    WORD_DISCS = 64
+    MAX_DISCS = 4096
+
+    # session ids are node << NODE | sequence
+    NODE = 48
+    MAX_NODE = (1 << 15) - 1
+
+    # one increment of the sequence number in the meta word
+    SEQUENCE = 1 << 24
+    WORD = (1 << 64) - 1
+
+    def __init__(self, capacity=1024, node=0, towers=3, discs=WORD_DISCS):
+        '''Initialize a SessionTable object
+
+        :param capacity: the initial number of records
+        :param node: the node id of allocated session ids
+        :param towers: the maximum number of towers of a game
+        :param discs: the maximum number of discs of a game
+        '''
+        if capacity <= 0:
+            raise ValueError('capacity {} is invalid'.format(capacity))
+        SessionTable._checkNode(node)
+        SessionTable.checkTowers(towers)
+        if discs <= 0 or discs > SessionTable.MAX_DISCS:
+            raise ValueError('discs {} is invalid'.format(discs))
+        self.towers = towers
+        self.discs = discs
+        # the number of words per record
+        self.width = SessionTable.TOWER + towers
+        if discs > SessionTable.WORD_DISCS:
+            self.words = [0] * (self.width * capacity)
+        else:
+            self.words = array('Q', bytes(8 * self.width * capacity))
+        # stack of free slots, lowest slot on top
+        self._free = array('Q', range(capacity - 1, -1, -1))
+        self._lock = Lock()
+        # the id of the next session to be created
+        self._counter = node << SessionTable.NODE
+
+    def __len__(self):
+        '''Get the number of allocated records'''
+        return self.capacity() - len(self._free)
+
+    def capacity(self):
+        '''Get the number of records the table can hold without growing'''
+        return len(self.words) // self.width
+
+    @staticmethod
+    def pack(numberOfDiscs, source, target, numberOfTowers=3):
+        '''Pack numberOfDiscs, source, target and numberOfTowers into a meta word'''
+        return ((numberOfDiscs & 0xff) | source << 8 | (numberOfTowers - 3) << 12
+                | target << 16 | (numberOfDiscs >> 8) << 19)
+
+    @staticmethod
+    def unpack(meta):
+        '''Unpack a meta word into (numberOfDiscs, source, target)'''
+        return ((meta & 0xff) | ((meta >> 11) & 0x1f00), (meta >> 8) & 0xf,
+                (meta >> 16) & 0x7)
+
+    @staticmethod
+    def numberOfTowers(meta):
+        '''Get the number of towers of a meta word'''
+        return ((meta >> 12) & 0xf) + 3
+
+    @staticmethod
+    def checkTowers(numberOfTowers):
+        '''Check that a game may have numberOfTowers towers'''
+        if numberOfTowers < SessionTable.MIN_TOWERS or \
+                numberOfTowers > SessionTable.MAX_TOWERS:
+            raise ValueError(
+                'numberOfTowers {} is invalid'.format(numberOfTowers))
+
+    @staticmethod
+    def _checkNode(node):
+        if node < 0 or node > SessionTable.MAX_NODE:
+            raise ValueError('node {} is invalid'.format(node))
+
+    @staticmethod
+    def node(id):
+        '''Get the node id of a session id'''
+        return id >> SessionTable.NODE
+
+    def setNode(self, node):
+        '''Allocate subsequent session ids for node
+
+        The sequence starts over at 0 unless node is the current node.
+        '''
+        SessionTable._checkNode(node)
+        self._lock.acquire()
+        try:
+            if SessionTable.node(self._counter) != node:
+                self._counter = node << SessionTable.NODE
+        finally:
+            self._lock.release()
+
+    def nextId(self):
+        '''Allocate the id of a new session'''
+        self._lock.acquire()
+        try:
+            id = self._counter
+            self._counter += 1
+        finally:
+            self._lock.release()
+        return id
+
+    def nextIds(self, count):
+        '''Allocate the ids of count new sessions, returning the first
+
+        The ids are consecutive, i.e. first to first + count - 1.
+        '''
+        if count <= 0:
+            raise ValueError('count {} is invalid'.format(count))
+        self._lock.acquire()
+        try:
+            id = self._counter
+            self._counter += count
+        finally:
+            self._lock.release()
+        return id
+
+    def getCounter(self):
+        '''Get the id of the next session to be created'''
+        return self._counter
+
+    def setCounter(self, c):
+        '''Advance the id of the next session to be created to at least c'''
+        self._lock.acquire()
+        try:
+            self._counter = max(self._counter, c)
+        finally:
+            self._lock.release()
+
+    def begin(self, base):
+        '''Mark the record at word offset base as being written'''
+        meta = base + SessionTable.META
+        self.words[meta] = (self.words[meta] + SessionTable.SEQUENCE) & SessionTable.WORD
+
+    def end(self, base):
+        '''Mark the record at word offset base as consistent again'''
+        meta = base + SessionTable.META
+        self.words[meta] = (self.words[meta] + SessionTable.SEQUENCE) & SessionTable.WORD
+
+    def read(self, base):
+        '''Copy the record at word offset base without locking
+
+        Returns None if the record is being written, or was written while
+        it was copied.
+        '''
+        w = self.words
+        meta = w[base + SessionTable.META]
+        if meta & SessionTable.SEQUENCE:
+            return None
+        record = w[base:base + self.width]
+        if w[base + SessionTable.META] != meta:
+            return None
+        return record
+
+    def allocate(self, id, numberOfDiscs, source, target, numberOfTowers=3):
+        '''Allocate and initialize a record, returning its slot
+
+        Upon allocation, numberOfDiscs discs are placed on source, other
+        towers are empty, and the number of moves is set to 0.
+        '''
+        if numberOfTowers > self.towers:
+            raise ValueError('numberOfTowers {} is invalid'.format(numberOfTowers))
+        if numberOfDiscs > self.discs:
+            raise ValueError('numberOfDiscs {} is invalid'.format(numberOfDiscs))
+        self._lock.acquire()
+        try:
+            if not self._free:
+                self._grow()
+            slot = self._free.pop()
+        finally:
+            self._lock.release()
+
+        self._initialize(slot, id, numberOfDiscs, source, target, numberOfTowers)
+        return slot
+
+    def allocateMany(self, ids, games):
+        '''Allocate and initialize a record per game, returning their slots
+
+        games is a list of (numberOfDiscs, source, target, numberOfTowers)
+        tuples, and ids the list of their session ids. The lock is only taken
+        once, to take all of the free records.
+        '''
+        for numberOfDiscs, _, _, numberOfTowers in games:
+            if numberOfTowers > self.towers:
+                raise ValueError('numberOfTowers {} is invalid'.format(numberOfTowers))
+            if numberOfDiscs > self.discs:
+                raise ValueError('numberOfDiscs {} is invalid'.format(numberOfDiscs))
+        count = len(games)
+        self._lock.acquire()
+        try:
+            while len(self._free) < count:
+                self._grow()
+            # in the order in which allocate() would have taken them
+            slots = self._free[len(self._free) - count:]
+            slots.reverse()
+            del self._free[len(self._free) - count:]
+        finally:
+            self._lock.release()
+
+        for slot, id, game in zip(slots, ids, games):
+            self._initialize(slot, id, *game)
+        return slots
+
+    def _grow(self):
+        '''Double the capacity with the lock held'''
+        n = self.capacity()
+        if self.discs > SessionTable.WORD_DISCS:
+            self.words.extend([0] * (self.width * n))
+        else:
+            self.words.frombytes(bytes(8 * self.width * n))
+        # records that are still free are taken first
+        self._free = array('Q', range(2 * n - 1, n - 1, -1)) + self._free
+
+    def _initialize(self, slot, id, numberOfDiscs, source, target, numberOfTowers):
+        base = slot * self.width
+        w = self.words
+        w[base + SessionTable.ID] = id
+        w[base + SessionTable.MOVES] = 0
+        for i in range(self.towers):
+            w[base + SessionTable.TOWER + i] = 0
+        w[base + SessionTable.TOWER + source] = (1 << numberOfDiscs) - 1
+        # the meta word is written last, since a record of a shared table
+        # is considered initialized once it is not 0
+        w[base + SessionTable.META] = SessionTable.pack(
+            numberOfDiscs, source, target, numberOfTowers)
+
+    def release(self, slot):
+        '''Release the record at slot for reuse
+
+        Returns False if the record had been released already.
+        '''
+        meta = slot * self.width + SessionTable.META
+        self._lock.acquire()
+        try:
+            if not self.words[meta]:
+                return False
+            self.words[meta] = 0
+            self._free.append(slot)
+        finally:
+            self._lock.release()
+        return True
+
+    def detach(self, slot):
+        '''Release the record at slot, and get a table of one record holding a copy of it
+
+        Returns None if the record had been released already.
+        '''
+        base = slot * self.width
+        copy = SessionTable(1, towers=self.towers, discs=self.discs)
+        copy.words[:self.width] = self.words[base:base + self.width]
+        copy._free.pop()
+        if not self.release(slot):
+            return None
+        return copy
@@ -0,0 +1,239 @@
+# MIT License
+#
+# Copyright (c) 2020 Christopher Friedt
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+'''The SharedIdempotencyCache Class
+
+The SharedIdempotencyCache Class is an IdempotencyCache whose outcomes live in
+a memory-mapped file, e.g. under /dev/shm, so that a retried request is
+recognized by whichever worker process it reaches.
+
+Keys and fingerprints are stored as 64-bit hashes, and outcomes as JSON, so
+outcomes must be JSON-serializable and are read back with lists in place of
+tuples. Records are grouped into buckets of WAYS records, and a key is kept in
+the bucket selected by its hash. When that bucket is full, its oldest record
+is dropped. An outcome that does not fit into a record is not recorded, i.e.
+the request is executed again if it is retried.
+
+The file is locked as a whole with a RecordLock, see SharedSessionTable.
+
+header word 0: magic
+header word 1: capacity, in records
+header word 2: record size, in bytes
+header word 3: the stamp of the next record
+
+record word 0: the hash of the key, or 0 if the record is free
+record word 1: the stamp of the record, i.e. the order in which keys were begun
+record word 2: the fingerprint of the request
+record word 3: the length of the outcome, or PENDING_LENGTH while it is pending
+followed by the outcome as JSON
+
+Supported operations are:
+
+c = SharedIdempotencyCache(path, capacity, size)
+outcome = begin(key, fingerprint)
+end(key, outcome)
+abort(key)
+close()
+'''
+
+import fcntl
+import hashlib
+import json
+import mmap
+import os
+import struct
+
+from hanoi.IdempotencyCache import IdempotencyCache
+from hanoi.SharedSessionTable import RecordLock
+
+
+class SharedIdempotencyCache(object):
+
+    # 'hanoi' 2
+    MAGIC = 0x68616e6f69000002
+    HEADER = 64
+    # header word offsets
+    CAPACITY = 1
+    SIZE = 2
+    STAMP = 3
+    # the number of records per bucket
+    WAYS = 8
+    # key hash, stamp, fingerprint, outcome length
+    RECORD = struct.Struct('<4Q')
+    # the outcome length of a pending record
+    PENDING_LENGTH = (1 << 64) - 1
+
+    def __init__(self, path, capacity=65536, size=1024):
+        '''Initialize a SharedIdempotencyCache object
+
+        The file at path is created with room for capacity outcomes of up to
+        size bytes each, rounded up to whole buckets, if it does not exist
+        yet. Otherwise, its existing outcomes are shared and capacity and
+        size are ignored. A capacity of 0 disables the cache, without
+        creating a file.
+        '''
+        if capacity < 0:
+            raise ValueError('capacity {} is invalid'.format(capacity))
+        if size <= SharedIdempotencyCache.RECORD.size:
+            raise ValueError('size {} is invalid'.format(size))
+        self.capacity = capacity
+        self._fd = None
+        self._mmap = None
+        if not capacity:
+            return
+        capacity = -(-capacity // SharedIdempotencyCache.WAYS) * SharedIdempotencyCache.WAYS
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            # serialize initialization with other processes
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, SharedIdempotencyCache.HEADER, 0)
+            try:
+                length = os.fstat(self._fd).st_size
+                if length == 0:
+                    length = SharedIdempotencyCache.HEADER + capacity * size
+                    os.ftruncate(self._fd, length)
+                self._mmap = mmap.mmap(self._fd, length)
+                header = struct.unpack_from('<4Q', self._mmap)
+                if header[0] == 0:
+                    struct.pack_into('<4Q', self._mmap, 0,
+                                     SharedIdempotencyCache.MAGIC, capacity, size, 1)
+                elif header[0] != SharedIdempotencyCache.MAGIC:
+                    raise ValueError('{} is not an idempotency cache'.format(path))
+                else:
+                    capacity, size = header[SharedIdempotencyCache.CAPACITY:
+                                            SharedIdempotencyCache.STAMP]
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, SharedIdempotencyCache.HEADER, 0)
+        except BaseException:
+            self.close()
+            raise
+        self.capacity = capacity
+        self._size = size
+        self._buckets = capacity // SharedIdempotencyCache.WAYS
+        self._lock = RecordLock(self._fd, 0, SharedIdempotencyCache.HEADER)
+
+    @staticmethod
+    def _hash(value):
+        '''Hash a key or fingerprint to a non-zero 64-bit integer'''
+        digest = hashlib.blake2b(repr(value).encode('utf-8'), digest_size=8).digest()
+        return int.from_bytes(digest, 'little') or 1
+
+    def _bucket(self, h):
+        '''Get the file offsets of the records of the bucket of hash h'''
+        first = SharedIdempotencyCache.HEADER + \
+            (h % self._buckets) * SharedIdempotencyCache.WAYS * self._size
+        return range(first, first + SharedIdempotencyCache.WAYS * self._size, self._size)
+
+    def _find(self, h):
+        '''Get the file offset of the record of hash h, or None'''
+        for offset in self._bucket(h):
+            if SharedIdempotencyCache.RECORD.unpack_from(self._mmap, offset)[0] == h:
+                return offset
+        return None
+
+    def __len__(self):
+        if not self.capacity:
+            return 0
+        self._lock.acquire()
+        try:
+            return sum(1 for offset in range(
+                SharedIdempotencyCache.HEADER, len(self._mmap), self._size)
+                if SharedIdempotencyCache.RECORD.unpack_from(self._mmap, offset)[0])
+        finally:
+            self._lock.release()
+
+    def begin(self, key, fingerprint=None):
+        '''Get the outcome of key, or reserve key and get None if it is new'''
+        if not self.capacity:
+            return None
+        h = SharedIdempotencyCache._hash(key)
+        f = SharedIdempotencyCache._hash(fingerprint)
+        record = SharedIdempotencyCache.RECORD
+        self._lock.acquire()
+        try:
+            offset = self._find(h)
+            if offset is not None:
+                _, _, fingerprint, length = record.unpack_from(self._mmap, offset)
+                if fingerprint != f:
+                    return IdempotencyCache.MISMATCH
+                if length == SharedIdempotencyCache.PENDING_LENGTH:
+                    return IdempotencyCache.PENDING
+                start = offset + record.size
+                return json.loads(self._mmap[start:start + length])
+
+            # a free record, or else the oldest one
+            def age(offset):
+                used, stamp = record.unpack_from(self._mmap, offset)[:2]
+                return (used != 0, stamp)
+
+            offset = min(self._bucket(h), key=age)
+            stamp = struct.unpack_from('<Q', self._mmap, 8 * SharedIdempotencyCache.STAMP)[0]
+            struct.pack_into('<Q', self._mmap, 8 * SharedIdempotencyCache.STAMP, stamp + 1)
+            record.pack_into(self._mmap, offset, h, stamp, f,
+                             SharedIdempotencyCache.PENDING_LENGTH)
+            return None
+        finally:
+            self._lock.release()
+
+    def end(self, key, outcome):
+        '''Record the outcome of key, reserved by begin()'''
+        if not self.capacity:
+            return
+        data = json.dumps(outcome, separators=(',', ':')).encode('utf-8')
+        h = SharedIdempotencyCache._hash(key)
+        record = SharedIdempotencyCache.RECORD
+        self._lock.acquire()
+        try:
+            # unless it has been dropped in the meantime
+            offset = self._find(h)
+            if offset is None:
+                return
+            if len(data) > self._size - record.size:
+                # too large to be replayed, so it may be executed again
+                record.pack_into(self._mmap, offset, 0, 0, 0, 0)
+                return
+            start = offset + record.size
+            self._mmap[start:start + len(data)] = data
+            _, stamp, f, _ = record.unpack_from(self._mmap, offset)
+            record.pack_into(self._mmap, offset, h, stamp, f, len(data))
+        finally:
+            self._lock.release()
+
+    def abort(self, key):
+        '''Release key, reserved by begin(), without recording an outcome'''
+        if not self.capacity:
+            return
+        h = SharedIdempotencyCache._hash(key)
+        self._lock.acquire()
+        try:
+            offset = self._find(h)
+            if offset is not None:
+                SharedIdempotencyCache.RECORD.pack_into(self._mmap, offset, 0, 0, 0, 0)
+        finally:
+            self._lock.release()
+
+    def close(self):
+        '''Unmap and close the file'''
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
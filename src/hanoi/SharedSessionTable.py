@@ -0,0 +1,289 @@
+# MIT License
+#
+# Copyright (c) 2020 Christopher Friedt
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+'''The SharedSessionTable Class
+
+The SharedSessionTable Class is a SessionTable whose records live in a
+memory-mapped file, e.g. under /dev/shm, so that several worker processes can
+read and modify the same games.
+
+The file starts with a header record, followed by capacity records with the
+same layout as those of a SessionTable.
+
+header word 0: magic
+header word 1: capacity
+header word 2: the number of sessions created
+header word 3: the node id of session ids
+header word 4: the maximum number of towers of a game, or 0 for 3
+header word 5: a random generation of the file, which tells it apart from
+               other files that allocate the same ids
+
+Unlike a SessionTable, the table does not grow and slots are never reused.
+Instead, the session with sequence number i (see SessionTable) is stored at
+slot i, so that any process can find a session by its id alone.
+
+Session ids are allocated atomically across processes, and records are locked
+across processes with fcntl() byte-range locks. Since those locks are held by
+a process rather than by a thread, a RecordLock also takes a threading.Lock,
+and each process must use a single RecordLock per record.
+
+Supported operations are:
+
+t = SharedSessionTable(path, capacity, node, towers)
+id = nextId()
+generation = generation()
+slot = allocate(id, numberOfDiscs, source, target, numberOfTowers)
+lock = lock(slot)
+close()
+'''
+
+import fcntl
+import mmap
+import os
+import threading
+import time
+
+from hanoi.SessionTable import SessionTable
+
+
+class RecordLock(object):
+    '''A lock on one record of a SharedSessionTable
+
+    RecordLock provides the acquire(), release() and locked() methods of
+    threading.Lock.
+    '''
+
+    __slots__ = ('_fd', '_start', '_length', '_lock')
+
+    # seconds between attempts to take a contended fcntl() lock
+    POLL = 0.0001
+
+    def __init__(self, fd, start, length):
+        self._fd = fd
+        self._start = start
+        self._length = length
+        self._lock = threading.Lock()
+
+    def acquire(self, blocking=True, timeout=-1):
+        start = time.monotonic()
+        if not self._lock.acquire(blocking, timeout):
+            return False
+        length = self._length
+        try:
+            if blocking and timeout < 0:
+                fcntl.lockf(self._fd, fcntl.LOCK_EX, length, self._start)
+                return True
+            while True:
+                try:
+                    fcntl.lockf(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB,
+                                length, self._start)
+                    return True
+                except OSError:
+                    if not blocking or time.monotonic() - start >= timeout:
+                        self._lock.release()
+                        return False
+                time.sleep(RecordLock.POLL)
+        except BaseException:
+            if self._lock.locked():
+                self._lock.release()
+            raise
+
+    def release(self):
+        fcntl.lockf(self._fd, fcntl.LOCK_UN, self._length, self._start)
+        self._lock.release()
+
+    def locked(self):
+        return self._lock.locked()
+
+
+class SharedSessionTable(SessionTable):
+
+    # 'hanoi' 1
+    MAGIC = 0x68616e6f69000001
+    # header word offsets
+    CAPACITY = 1
+    COUNTER = 2
+    NODE = 3
+    TOWERS = 4
+    GENERATION = 5
+    HEADER = 8 * SessionTable.WIDTH
+
+    def __init__(self, path, capacity=1 << 20, node=0, towers=3):
+        '''Initialize a SharedSessionTable object
+
+        The file at path is created with room for capacity records if it
+        does not exist yet. Otherwise, its existing records are shared and
+        capacity, node and towers are ignored.
+
+        :param path: the file to map, preferably on a tmpfs
+        :param capacity: the maximum number of records
+        :param node: the node id of allocated session ids
+        :param towers: the maximum number of towers of a game
+        '''
+        if capacity <= 0:
+            raise ValueError('capacity {} is invalid'.format(capacity))
+        SessionTable._checkNode(node)
+        SessionTable.checkTowers(towers)
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        self._lock = threading.Lock()
+        try:
+            # serialize initialization with other processes
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, SharedSessionTable.HEADER, 0)
+            try:
+                size = os.fstat(self._fd).st_size
+                if size == 0:
+                    size = SharedSessionTable.HEADER + \
+                        8 * (SessionTable.TOWER + towers) * capacity
+                    os.ftruncate(self._fd, size)
+                self._mmap = mmap.mmap(self._fd, size)
+                self._view = memoryview(self._mmap)
+                self._header = self._view[:SharedSessionTable.HEADER].cast('Q')
+                self.words = self._view[SharedSessionTable.HEADER:].cast('Q')
+                if self._header[0] == 0:
+                    self._header[SharedSessionTable.CAPACITY] = capacity
+                    self._header[SharedSessionTable.NODE] = node
+                    self._header[SharedSessionTable.TOWERS] = towers
+                    self._header[SharedSessionTable.GENERATION] = \
+                        int.from_bytes(os.urandom(4), 'little')
+                    self._header[0] = SharedSessionTable.MAGIC
+                elif self._header[0] != SharedSessionTable.MAGIC:
+                    raise ValueError('{} is not a session table'.format(path))
+                self.towers = self._header[SharedSessionTable.TOWERS] or 3
+                self.width = SessionTable.TOWER + self.towers
+                self.discs = SessionTable.WORD_DISCS
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, SharedSessionTable.HEADER, 0)
+        except BaseException:
+            self.close()
+            raise
+
+    def __len__(self):
+        '''Get the number of allocated records'''
+        return self._header[SharedSessionTable.COUNTER]
+
+    def capacity(self):
+        '''Get the number of records the table can hold'''
+        return self._header[SharedSessionTable.CAPACITY]
+
+    def nextId(self):
+        '''Allocate the id of a new session, atomically across processes'''
+        return self.nextIds(1)
+
+    def nextIds(self, count):
+        '''Allocate count consecutive ids, atomically across processes'''
+        if count <= 0:
+            raise ValueError('count {} is invalid'.format(count))
+        self._lock.acquire()
+        try:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, SharedSessionTable.HEADER, 0)
+            try:
+                slot = self._header[SharedSessionTable.COUNTER]
+                if slot + count > self.capacity():
+                    raise ValueError('session table is full')
+                self._header[SharedSessionTable.COUNTER] = slot + count
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, SharedSessionTable.HEADER, 0)
+        finally:
+            self._lock.release()
+        return self._base() | slot
+
+    def generation(self):
+        '''Get the generation of the file, see SessionStore'''
+        return self._header[SharedSessionTable.GENERATION]
+
+    def _base(self):
+        return self._header[SharedSessionTable.NODE] << SessionTable.NODE
+
+    def getCounter(self):
+        '''Get the id of the next session to be created'''
+        return self._base() | self._header[SharedSessionTable.COUNTER]
+
+    def setCounter(self, c):
+        raise ValueError('session ids of a shared table cannot be changed')
+
+    def setNode(self, node):
+        raise ValueError('session ids of a shared table cannot be changed')
+
+    def slot(self, id):
+        '''Get the slot of the session with id, or None if it was not allocated'''
+        slot = id - self._base()
+        if slot < 0 or slot >= self._header[SharedSessionTable.COUNTER]:
+            return None
+        return slot
+
+    def read(self, base):
+        '''Copy the record at word offset base without locking
+
+        See SessionTable.read().
+        '''
+        w = self.words
+        meta = w[base + SessionTable.META]
+        if meta & SessionTable.SEQUENCE:
+            return None
+        # a memoryview slice is not a copy
+        record = w[base:base + self.width].tolist()
+        if w[base + SessionTable.META] != meta:
+            return None
+        return record
+
+    def allocate(self, id, numberOfDiscs, source, target, numberOfTowers=3):
+        '''Initialize the record of session id, returning its slot'''
+        if numberOfTowers > self.towers:
+            raise ValueError('numberOfTowers {} is invalid'.format(numberOfTowers))
+        if numberOfDiscs > self.discs:
+            raise ValueError('numberOfDiscs {} is invalid'.format(numberOfDiscs))
+        slot = self.slot(id)
+        if slot is None:
+            raise ValueError('id {} has not been allocated'.format(id))
+        self._initialize(slot, id, numberOfDiscs, source, target, numberOfTowers)
+        return slot
+
+    def allocateMany(self, ids, games):
+        '''Initialize the records of sessions ids, returning their slots'''
+        return [self.allocate(id, *game) for id, game in zip(ids, games)]
+
+    def release(self, slot):
+        '''Records are never reused'''
+        return False
+
+    def detach(self, slot):
+        '''Records are never reused, so there is nothing to detach'''
+        return None
+
+    def lock(self, slot):
+        '''Get a new RecordLock for the record at slot'''
+        return RecordLock(
+            self._fd, SharedSessionTable.HEADER + 8 * self.width * slot, 8 * self.width)
+
+    def close(self):
+        '''Unmap and close the file'''
+        if getattr(self, '_mmap', None) is not None:
+            for view in (getattr(self, 'words', None),
+                         getattr(self, '_header', None),
+                         getattr(self, '_view', None)):
+                if view is not None:
+                    view.release()
+            self._mmap.close()
+            self._mmap = None
+        if getattr(self, '_fd', None) is not None:
+            os.close(self._fd)
+            self._fd = None
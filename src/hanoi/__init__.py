@@ -20,6 +20,46 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
-from .app import app
+from .Serializer import Serializer
+from .Metrics import Metrics
+from .SessionTable import SessionTable
+from .SharedSessionTable import SharedSessionTable
+from .HanoiSnapshot import HanoiSnapshot
 from .HanoiState import HanoiState
+from .FrameStewart import FrameStewart
+from .HanoiSolver import HanoiSolver
+from .HanoiOracle import HanoiOracle
+from .HanoiHistory import HanoiHistory
 from .Hanoi import Hanoi
+from .SessionStore import SessionStore, FileSessionStore, SharedSessionStore
+from .SessionEvents import SessionEvents
+from .ResponseCache import ResponseCache
+from .IdempotencyCache import IdempotencyCache
+from .SharedIdempotencyCache import SharedIdempotencyCache
+from .HashRing import HashRing
+from .Router import Router
+
+__all__ = [
+    'Serializer', 'Metrics', 'SessionTable', 'SharedSessionTable',
+    'HanoiSnapshot', 'HanoiState', 'FrameStewart', 'HanoiSolver',
+    'HanoiOracle', 'HanoiHistory', 'Hanoi', 'SessionStore',
+    'FileSessionStore', 'SharedSessionStore', 'SessionEvents',
+    'ResponseCache', 'IdempotencyCache', 'SharedIdempotencyCache',
+    'HashRing', 'Router', 'app',
+]
+
+
+def __getattr__(name):
+    '''Load the web app on first use of hanoi.app
+
+    The engine does not depend on connexion or Flask, so importing hanoi
+    does not import them, nor parse hanoi.yaml. hanoi.app is the connexion
+    App object rather than the module of the same name, which is
+    sys.modules['hanoi.app'].
+    '''
+    if name == 'app':
+        from .app import app
+        globals()['app'] = app
+        return app
+    raise AttributeError(
+        'module {!r} has no attribute {!r}'.format(__name__, name))
@@ -0,0 +1,374 @@
+# MIT License
+#
+# Copyright (c) 2020 Christopher Friedt
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+'''The asyncio entry point
+
+This serves the same hanoi.yaml operations as hanoi.app, with the same
+sessions, but on an aiohttp server running an asyncio event loop rather than
+on a WSGI server with one thread per request. Idle and slow connections then
+only cost a socket, and keep-alive and pipelined requests are handled by the
+event loop.
+
+Constant-time engine calls, i.e. move, undo, redo and watching a session, are
+first made on the event loop without waiting for the session lock (timeout=0).
+Only if the lock is busy is the call handed to the default executor, where it
+may wait. Everything whose cost grows with the game or the request, i.e.
+moves, history, hints, distances, listings, batches and the serialization of
+sessions, always runs in the default executor, and so does every streamed
+response body, since generating it may take a while or wait for session locks.
+If the store is blocking, i.e. it logs moves or reloads spilled sessions from
+disk, engine calls, session lookups and creation all run in the executor too.
+
+python3 -m hanoi.aio
+'''
+
+import asyncio
+import functools
+import importlib
+import os
+
+import connexion
+from aiohttp import web
+from connexion.resolver import Resolver
+
+import hanoi
+from hanoi.Metrics import Metrics
+from hanoi.Serializer import Serializer
+
+# hanoi.app is also the name of the WSGI app object in the hanoi package,
+# which importing the module of the same name replaces, see hanoi/__init__.py
+wsgi = importlib.import_module('hanoi.app')
+hanoi.app = wsgi.app
+timed = Metrics.default.timed
+# number of bytes of a streamed response body per executor call
+bufferSize = 1 << 16
+
+
+async def engine(call, *args, timeout=-1):
+    '''Call a constant-time engine method without blocking the event loop
+
+    If the session is busy, or the store is blocking, the call is handed to
+    a thread, where it waits for up to timeout seconds.
+    '''
+    if not wsgi.sessions.blocking:
+        try:
+            return call(*args, timeout=0)
+        except TimeoutError:
+            pass
+    return await offload(call, *args, timeout=timeout)
+
+
+async def offload(call, *args, **kwargs):
+    '''Call a function that may take a while in the default executor'''
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, functools.partial(call, *args, **kwargs))
+
+
+async def lookup(sessionId):
+    '''Get a session in the default executor, which may reload it from disk'''
+    return await offload(wsgi.sessions.__getitem__, sessionId)
+
+
+def respond(request, value, status=200):
+    '''Encode value as JSON or MessagePack, depending on the Accept header'''
+    mimetype = Serializer.negotiate(request.headers.get('Accept'))
+    return web.Response(body=Serializer.encode(value, mimetype), status=status,
+                        content_type=mimetype)
+
+
+def error(request, code, e):
+    Metrics.default.error(e)
+    code, value, headers = wsgi.errorResponse(code, e)
+    response = respond(request, value, code)
+    response.headers.update(headers)
+    return response
+
+
+async def idempotent(request, sessionId, operation, *args, expectedMoves=None):
+    '''Call operation of a session once per Idempotency-Key, and respond
+
+    See hanoi.app.idempotent().
+    '''
+    key = request.headers.get('Idempotency-Key')
+    outcome = wsgi.replay(sessionId, key,
+                          wsgi.fingerprint(operation, *args, expectedMoves=expectedMoves))
+    if outcome is None:
+        try:
+            run = offload if operation == 'moves' else engine
+            await run(functools.partial(wsgi.call, sessionId, operation,
+                                        expectedMoves=expectedMoves), *args,
+                      timeout=wsgi.lockTimeout(operation))
+            outcome = (200, None, {})
+        except Exception as e:
+            Metrics.default.error(e)
+            outcome = wsgi.errorResponse(201, e)
+        wsgi.record(sessionId, key, outcome)
+    status, value, headers = outcome
+    if value is None:
+        return web.Response(status=status, headers=headers)
+    response = respond(request, value, status)
+    response.headers.update(headers)
+    return response
+
+
+def take(chunks, size):
+    '''Join byte strings of an iterator until there are at least size bytes
+
+    Returns b'' at the end of the iterator.
+    '''
+    data = []
+    n = 0
+    for chunk in chunks:
+        data.append(chunk)
+        n += len(chunk)
+        if n >= size:
+            break
+    return b''.join(data)
+
+
+async def stream(request, chunks, mimetype, headers=None):
+    '''Write an iterable of byte strings as a chunked response
+
+    The iterable is consumed in the default executor, a buffer at a time.
+    '''
+    chunks = iter(chunks)
+    response = web.StreamResponse(headers={'Content-Type': mimetype})
+    if headers:
+        response.headers.update(headers)
+    response.enable_chunked_encoding()
+    await response.prepare(request)
+    while True:
+        data = await offload(take, chunks, bufferSize)
+        if not data:
+            break
+        await response.write(data)
+    await response.write_eof()
+    return response
+
+
+def encodeSessions(query, mimetype, timeout=-1):
+    return Serializer.encode([Serializer.session(h.getState(timeout)) for h in query],
+                             mimetype)
+
+
+@timed('getSessions')
+async def getSessions(request, limit=None, after=None, complete=None, numberOfDiscs=None):
+    try:
+        if 'application/x-ndjson' in request.headers.get('Accept', ''):
+            query = wsgi.sessions.query(after, limit, complete, numberOfDiscs)
+            return await stream(
+                request, wsgi.streamSessions(query, wsgi.lockTimeout('getSessions')),
+                'application/x-ndjson')
+        if limit is None:
+            limit = wsgi.defaultLimit
+        query = wsgi.sessions.query(after, limit, complete, numberOfDiscs)
+        mimetype = Serializer.negotiate(request.headers.get('Accept'))
+        body = await offload(encodeSessions, query, mimetype,
+                             wsgi.lockTimeout('getSessions'))
+        return web.Response(body=body, content_type=mimetype)
+    except Exception as e:
+        return error(request, 201, e)
+
+
+@timed('createSession')
+async def createSession(request, numberOfDiscs=4, fromTower=0, toTower=2, numberOfTowers=3):
+    try:
+        h = await offload(wsgi.sessions.create, numberOfDiscs, fromTower, toTower,
+                          numberOfTowers)
+        return respond(request, h._state.id)
+    except Exception as e:
+        return error(request, 201, e)
+
+
+@timed('createSessions')
+async def createSessions(request, count=None, numberOfDiscs=4, fromTower=0, toTower=2,
+                         numberOfTowers=3, body=None):
+    try:
+        hs = await offload(wsgi.sessions.createMany, wsgi.games(
+            count, numberOfDiscs, fromTower, toTower, numberOfTowers, body))
+        return respond(request, {'firstSessionId': hs[0]._state.id,
+                                 'numberOfSessions': len(hs)})
+    except Exception as e:
+        return error(request, 201, e)
+
+
+async def respondCached(request, h, name, convert, timeout=-1):
+    '''Respond with convert(snapshot) of h, or 304 Not Modified'''
+    mimetype = Serializer.negotiate(request.headers.get('Accept'))
+    body, etag = await offload(wsgi.cached, h, name, convert,
+                               request.headers.get('If-None-Match'), mimetype,
+                               timeout=timeout)
+    headers = {'ETag': etag, 'Vary': 'Accept'}
+    if body is None:
+        return web.Response(status=304, headers=headers)
+    return web.Response(body=body, content_type=mimetype, headers=headers)
+
+
+@timed('getSession')
+async def getSession(request, sessionId):
+    try:
+        return await respondCached(request, await lookup(sessionId), 'session',
+                                   Serializer.session, wsgi.lockTimeout('getSession'))
+    except Exception as e:
+        return error(request, 201, e)
+
+
+@timed('move')
+async def move(request, sessionId, fromTower, toTower, expectedMoves=None):
+    return await idempotent(request, sessionId, 'move', fromTower, toTower,
+                            expectedMoves=expectedMoves)
+
+
+@timed('moves')
+async def moves(request, sessionId, body, expectedMoves=None):
+    return await idempotent(request, sessionId, 'moves', body, expectedMoves=expectedMoves)
+
+
+@timed('undo')
+async def undo(request, sessionId, expectedMoves=None):
+    return await idempotent(request, sessionId, 'undo', expectedMoves=expectedMoves)
+
+
+@timed('redo')
+async def redo(request, sessionId, expectedMoves=None):
+    return await idempotent(request, sessionId, 'redo', expectedMoves=expectedMoves)
+
+
+async def history(request, sessionId):
+    try:
+        first, packed = await offload(wsgi.call, sessionId, 'history',
+                                      timeout=wsgi.lockTimeout('history'))
+        return await stream(request, wsgi.streamHistory(packed), 'application/octet-stream',
+                            {'History-Start': str(first)})
+    except Exception as e:
+        return error(request, 201, e)
+
+
+@timed('isComplete')
+async def isComplete(request, sessionId):
+    try:
+        return await respondCached(request, await lookup(sessionId), 'complete',
+                                   hanoi.HanoiSnapshot.isComplete,
+                                   wsgi.lockTimeout('isComplete'))
+    except Exception as e:
+        return error(request, 201, e)
+
+
+async def watch(request, sessionId):
+    '''Stream the events of a session
+
+    Moves are made on other threads, so events are handed to the event loop
+    with call_soon_threadsafe, and the backlog is bounded by the subscriber.
+    '''
+    loop = asyncio.get_running_loop()
+    q = asyncio.Queue()
+
+    def push(event):
+        if q.qsize() >= wsgi.events.BACKLOG:
+            loop.call_soon_threadsafe(q.put_nowait, None)
+            return False
+        loop.call_soon_threadsafe(q.put_nowait, event)
+        return True
+
+    try:
+        h = await lookup(sessionId)
+        first = await engine(functools.partial(wsgi.events.subscribe, h), push,
+                             timeout=wsgi.lockTimeout('watch'))
+    except Exception as e:
+        return error(request, 201, e)
+    try:
+        response = web.StreamResponse(headers={
+            'Content-Type': 'text/event-stream',
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no',
+        })
+        await response.prepare(request)
+        event = first
+        # None if the subscriber fell behind and was dropped
+        while event is not None:
+            await response.write(event)
+            try:
+                event = await asyncio.wait_for(q.get(), wsgi.events.KEEPALIVE)
+            except asyncio.TimeoutError:
+                event = wsgi.events.KEEPALIVE_EVENT
+        await response.write_eof()
+        return response
+    finally:
+        wsgi.events.unsubscribe(h, push)
+
+
+@timed('hint')
+async def hint(request, sessionId, count=1):
+    try:
+        distance, moves = await offload(wsgi.call, sessionId, 'hint', count,
+                                        timeout=wsgi.lockTimeout('hint'))
+        return respond(request, {
+            'sessionId': sessionId,
+            'numberOfMovesRemaining': Serializer.count(distance),
+            'moves': [{'fromTower': s, 'toTower': t} for s, t in moves],
+        })
+    except Exception as e:
+        return error(request, 201, e)
+
+
+@timed('distance')
+async def distance(request, sessionId, towers=None, count=0):
+    try:
+        d, moves = await offload(wsgi.call, sessionId, 'distance', towers, count,
+                                 timeout=wsgi.lockTimeout('distance'))
+        return respond(request, {
+            'sessionId': sessionId,
+            'numberOfMoves': d,
+            'moves': [{'fromTower': s, 'toTower': t} for s, t in moves],
+        })
+    except Exception as e:
+        return error(request, 201, e)
+
+
+async def getSolution(request, numberOfDiscs, fromTower=0, toTower=2, numberOfTowers=3,
+                      offset=0, limit=None):
+    try:
+        moves = hanoi.HanoiSolver.solution(
+            numberOfDiscs, fromTower, toTower, offset, limit, numberOfTowers)
+    except Exception as e:
+        return error(request, 201, e)
+    return await stream(request, (s.encode('utf-8') for s in wsgi.streamSolution(moves)),
+                        'application/json')
+
+
+async def metrics(request):
+    return web.Response(text=wsgi.metrics(), content_type='text/plain')
+
+
+def resolve(operationId):
+    '''Resolve hanoi.app operations of hanoi.yaml to the handlers above'''
+    return globals()[operationId.rpartition('.')[2]]
+
+
+app = connexion.AioHttpApp(__name__, specification_dir=os.path.dirname(wsgi.__file__))
+app.add_api(wsgi.specification(), resolver=Resolver(resolve), pass_context_arg_name='request')
+# the aiohttp application, e.g. for gunicorn:
+# gunicorn hanoi.aio:application --worker-class aiohttp.GunicornWebWorker
+application = app.app
+
+if __name__ == '__main__':
+    app.run(port=int(os.environ.get('HANOI_PORT', '8080')))
@@ -20,66 +20,517 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+import hashlib
+import json
 import logging
-from threading import Lock
+import os
+import queue
 import connexion
+import yaml
 from connexion import NoContent
+from flask import Response
 
 import hanoi
+from hanoi.Metrics import Metrics
+from hanoi.Serializer import Serializer
 
-sessions = {}
+
+def makeSessionStore():
+    '''Make a SessionStore configured by the environment
+
+    HANOI_STORE: persist sessions to this directory
+    HANOI_SESSION_TTL: expire sessions idle for this many seconds
+    HANOI_MAX_SESSIONS: evict least-recently used sessions beyond this many
+    HANOI_SPILL: spill expired and evicted sessions to this file
+    HANOI_SHARED: share sessions with other worker processes in this file
+    HANOI_SHARED_TOWERS: the maximum number of towers of shared sessions
+    HANOI_NODE: the node id of this engine, if there are several
+    '''
+    node = int(os.environ.get('HANOI_NODE') or 0)
+    if os.environ.get('HANOI_SHARED'):
+        return hanoi.SharedSessionStore(
+            os.environ['HANOI_SHARED'], node=node,
+            towers=int(os.environ.get('HANOI_SHARED_TOWERS') or 3))
+    hanoi.HanoiState.setNode(node)
+    kwargs = {}
+    if os.environ.get('HANOI_SESSION_TTL'):
+        kwargs['ttl'] = float(os.environ['HANOI_SESSION_TTL'])
+    if os.environ.get('HANOI_MAX_SESSIONS'):
+        kwargs['maxSessions'] = int(os.environ['HANOI_MAX_SESSIONS'])
+    if os.environ.get('HANOI_SPILL'):
+        kwargs['spill'] = os.environ['HANOI_SPILL']
+    path = os.environ.get('HANOI_STORE')
+    if path:
+        return hanoi.FileSessionStore(path, **kwargs)
+    return hanoi.SessionStore(**kwargs)
+
+
+sessions = makeSessionStore()
+events = hanoi.SessionEvents()
+# encoded bodies of session reads, see hanoi.ResponseCache
+responses = hanoi.ResponseCache(int(os.environ.get('HANOI_RESPONSE_CACHE') or 4096))
+
+
+def makeIdempotencyCache():
+    '''Make a cache of the outcomes of requests by Idempotency-Key
+
+    HANOI_IDEMPOTENCY_KEYS: the number of outcomes to keep, or 0 for none
+    HANOI_SHARED: share outcomes with other worker processes in this file,
+                  with a suffix of .keys, as well as sessions
+    '''
+    capacity = int(os.environ.get('HANOI_IDEMPOTENCY_KEYS') or 65536)
+    if os.environ.get('HANOI_SHARED'):
+        # a retry may reach any worker process
+        return hanoi.SharedIdempotencyCache(os.environ['HANOI_SHARED'] + '.keys', capacity)
+    return hanoi.IdempotencyCache(capacity)
+
+
+# outcomes of requests by Idempotency-Key, see hanoi.IdempotencyCache
+outcomes = makeIdempotencyCache()
+
+timed = Metrics.default.timed
+
+
+def lockTimeouts(value):
+    '''Parse the seconds to wait for a session lock, by operation
+
+    value is a comma-separated list of operation=seconds pairs, e.g.
+    "moves=5,history=0.5", and an operation of '*' applies to all others.
+    '''
+    timeouts = {'*': 1.0}
+    for pair in filter(None, value.split(',')):
+        operation, _, seconds = pair.partition('=')
+        timeouts[operation.strip()] = float(seconds)
+    return timeouts
+
+
+# HANOI_LOCK_TIMEOUT: seconds to wait for a busy session, for every operation
+# HANOI_LOCK_TIMEOUTS: seconds to wait by operation, e.g. moves=5,history=0.5
+# HANOI_MAX_PENDING: requests waiting for a busy session, before answering 429
+timeouts = lockTimeouts('*={},{}'.format(os.environ.get('HANOI_LOCK_TIMEOUT') or 1,
+                                         os.environ.get('HANOI_LOCK_TIMEOUTS') or ''))
+hanoi.Hanoi.setMaxPending(int(os.environ.get('HANOI_MAX_PENDING') or 8))
+# HANOI_HISTORY_LIMIT: moves kept per session for undo and history, or 0 for none,
+# if not every move is to be kept
+if os.environ.get('HANOI_HISTORY_LIMIT'):
+    hanoi.HanoiHistory.setLimit(int(os.environ['HANOI_HISTORY_LIMIT']))
+# seconds after which clients should retry a busy session
+retryAfter = 1
+
+
+def lockTimeout(operation):
+    '''Get the seconds that operation waits for a session lock'''
+    return timeouts.get(operation, timeouts['*'])
+
+
+# number of moves per chunk of a streamed solution or history
+chunkSize = 4096
+# number of sessions per page if no limit is given
+defaultLimit = 1000
+
+
+def respond(value, status=200):
+    '''Encode value as JSON or MessagePack, depending on the Accept header'''
+    mimetype = Serializer.negotiate(connexion.request.headers.get('Accept'))
+    return Response(Serializer.encode(value, mimetype), status, mimetype=mimetype)
+
+
+def errorResponse(code, e):
+    '''Get the (status, value, headers) of the response to exception e
+
+    Requests that were not served because a session was busy are answered
+    with 429 Too Many Requests, if too many others were waiting for it, or
+    503 Service Unavailable, if the wait timed out, and may be retried.
+    Moves that were not made because the session had not made expectedMoves
+    moves are answered with 409 Conflict and the current session.
+    '''
+    headers = {}
+    if isinstance(e, hanoi.Hanoi.Conflict):
+        value = Serializer.error(409, e)
+        value['session'] = Serializer.session(e.state)
+        return 409, value, headers
+    if isinstance(e, TimeoutError):
+        code = 429 if isinstance(e, hanoi.Hanoi.Busy) else 503
+        headers['Retry-After'] = str(retryAfter)
+    return code, Serializer.error(code, e), headers
 
 
 def error(code, e):
-    message = '{}'.format(e)
-    s = ''
-    s += '{'
-    s += '"code": {}'.format(code) + ', '
-    s += '"message": "{}"'.format(message)
-    s += '}'
-    return s
+    Metrics.default.error(e)
+    code, value, headers = errorResponse(code, e)
+    response = respond(value, code)
+    response.headers.update(headers)
+    return response
+
+
+def fingerprint(operation, *args, expectedMoves=None):
+    '''Hash an operation and its parameters, see hanoi.IdempotencyCache'''
+    value = repr((operation, args, expectedMoves)).encode('utf-8')
+    return int.from_bytes(hashlib.blake2b(value, digest_size=8).digest(), 'little')
+
+
+def replay(sessionId, key, fingerprint=None):
+    '''Get the (status, value, headers) of an earlier request with key, or None
+
+    If None is returned, the caller must record() the outcome of its request.
+    A key that was used for a different request, i.e. with a different
+    fingerprint, is answered with 422 Unprocessable Entity.
+    '''
+    if not key:
+        return None
+    outcome = outcomes.begin((sessionId, key), fingerprint)
+    if outcome is hanoi.IdempotencyCache.MISMATCH:
+        return 422, Serializer.error(
+            422, 'Idempotency-Key {} was used for a different request'.format(key)), {}
+    if outcome is hanoi.IdempotencyCache.PENDING:
+        return 409, Serializer.error(
+            409, 'request {} is in progress'.format(key)), {'Retry-After': str(retryAfter)}
+    if outcome is not None:
+        status, value, headers = outcome
+        return status, value, dict(headers, **{'Idempotent-Replayed': 'true'})
+    return None
+
+
+def record(sessionId, key, outcome):
+    '''Record the (status, value, headers) of a request with key
+
+    Requests that were not served because the session was busy are executed
+    again if they are retried.
+    '''
+    if not key:
+        return
+    if outcome[0] in (429, 503):
+        outcomes.abort((sessionId, key))
+    else:
+        outcomes.end((sessionId, key), outcome)
+
+
+def call(sessionId, operation, *args, **kwargs):
+    '''Call operation of a session, looking it up again if it was evicted'''
+    while True:
+        try:
+            return getattr(sessions[sessionId], operation)(*args, **kwargs)
+        except hanoi.Hanoi.Evicted:
+            pass
+
 
+def idempotent(sessionId, operation, *args, expectedMoves=None):
+    '''Call operation of a session once per Idempotency-Key, and respond
 
-def getSessions():
+    A request without an Idempotency-Key header is always executed.
+    '''
+    key = connexion.request.headers.get('Idempotency-Key')
+    outcome = replay(sessionId, key,
+                     fingerprint(operation, *args, expectedMoves=expectedMoves))
+    if outcome is None:
+        try:
+            call(sessionId, operation, *args, timeout=lockTimeout(operation),
+                 expectedMoves=expectedMoves)
+            outcome = (200, None, {})
+        except Exception as e:
+            Metrics.default.error(e)
+            outcome = errorResponse(201, e)
+        record(sessionId, key, outcome)
+    status, value, headers = outcome
+    if value is None:
+        return NoContent, status, headers
+    response = respond(value, status)
+    response.headers.update(headers)
+    return response
+
+
+def streamSessions(query, timeout=-1):
+    for h in query:
+        yield Serializer.encode(Serializer.session(h.getState(timeout))) + b'\n'
+
+
+@timed('getSessions')
+def getSessions(limit=None, after=None, complete=None, numberOfDiscs=None):
     try:
-        return [i.getState().to_json() for i in sessions.values()]
+        if 'application/x-ndjson' in connexion.request.headers.get('Accept', ''):
+            # stream every matching session unless limit is given
+            query = sessions.query(after, limit, complete, numberOfDiscs)
+            return Response(streamSessions(query, lockTimeout('getSessions')),
+                            mimetype='application/x-ndjson')
+        if limit is None:
+            limit = defaultLimit
+        query = sessions.query(after, limit, complete, numberOfDiscs)
+        timeout = lockTimeout('getSessions')
+        return respond([Serializer.session(h.getState(timeout)) for h in query])
     except Exception as e:
-        return error(201, e), 201
+        return error(201, e)
 
 
-def createSession(numberOfDiscs=4, fromTower=0, toTower=2):
+@timed('createSession')
+def createSession(numberOfDiscs=4, fromTower=0, toTower=2, numberOfTowers=3):
     try:
-        h = hanoi.Hanoi(numberOfDiscs, fromTower, toTower)
-        sessions[h._state.id] = h
-        return h._state.id
+        h = sessions.create(numberOfDiscs, fromTower, toTower, numberOfTowers)
+        return respond(h._state.id)
     except Exception as e:
-        return error(201, e), 201
+        return error(201, e)
+
+
+def games(count, numberOfDiscs, fromTower, toTower, numberOfTowers, body):
+    '''Get the (numberOfDiscs, source, target, numberOfTowers) tuples of a batch'''
+    # a missing body is an empty string with aiohttp
+    if not body:
+        if count is None:
+            raise ValueError('count is required without a body')
+        return [(numberOfDiscs, fromTower, toTower, numberOfTowers)] * count
+    if count is not None and count != len(body):
+        raise ValueError('count {} does not match {} games'.format(count, len(body)))
+    return [(g.get('numberOfDiscs', numberOfDiscs), g.get('fromTower', fromTower),
+             g.get('toTower', toTower), g.get('numberOfTowers', numberOfTowers))
+            for g in body]
+
+
+@timed('createSessions')
+def createSessions(count=None, numberOfDiscs=4, fromTower=0, toTower=2, numberOfTowers=3,
+                   body=None):
+    try:
+        hs = sessions.createMany(
+            games(count, numberOfDiscs, fromTower, toTower, numberOfTowers, body))
+        return respond({'firstSessionId': hs[0]._state.id, 'numberOfSessions': len(hs)})
+    except Exception as e:
+        return error(201, e)
+
 
+def cached(h, name, convert, ifNoneMatch, mimetype, timeout=-1):
+    '''Get the (body, etag) of convert(snapshot) of h, from the cache if possible
 
+    The body is None if the client already has the current version, according
+    to its If-None-Match header. Only if nothing is cached is a snapshot taken,
+    waiting for up to timeout seconds if a move is in progress.
+    '''
+    id = h._state.id
+    version = h._state.numberOfMoves
+    # e.g. session.json, or complete.msgpack
+    representation = '{}.{}'.format(name, mimetype.rpartition('/')[2])
+    etag = hanoi.ResponseCache.etag(sessions.generation, id, version, representation)
+    if hanoi.ResponseCache.matches(ifNoneMatch, etag):
+        return None, etag
+    key = (id, name, mimetype)
+    body = responses.get(key, version)
+    if body is None:
+        s = h.getState(timeout)
+        # the session may have been moved since version was read
+        etag = hanoi.ResponseCache.etag(sessions.generation, id, s.numberOfMoves,
+                                        representation)
+        body = Serializer.encode(convert(s), mimetype)
+        responses.put(key, s.numberOfMoves, body)
+    return body, etag
+
+
+def respondCached(h, name, convert, timeout=-1):
+    '''Respond with convert(state) of h, or 304 Not Modified'''
+    mimetype = Serializer.negotiate(connexion.request.headers.get('Accept'))
+    body, etag = cached(h, name, convert, connexion.request.headers.get('If-None-Match'),
+                        mimetype, timeout)
+    headers = {'ETag': etag, 'Vary': 'Accept'}
+    if body is None:
+        return Response(status=304, headers=headers)
+    return Response(body, 200, mimetype=mimetype, headers=headers)
+
+
+@timed('getSession')
 def getSession(sessionId):
     try:
-        return sessions[sessionId].getState().to_json()
+        return respondCached(sessions[sessionId], 'session', Serializer.session,
+                             lockTimeout('getSession'))
     except Exception as e:
-        return error(201, e), 201
+        return error(201, e)
+
+
+@timed('move')
+def move(sessionId, fromTower, toTower, expectedMoves=None):
+    return idempotent(sessionId, 'move', fromTower, toTower, expectedMoves=expectedMoves)
+
+
+@timed('moves')
+def moves(sessionId, body, expectedMoves=None):
+    return idempotent(sessionId, 'moves', body, expectedMoves=expectedMoves)
+
+
+@timed('undo')
+def undo(sessionId, expectedMoves=None):
+    return idempotent(sessionId, 'undo', expectedMoves=expectedMoves)
+
+
+@timed('redo')
+def redo(sessionId, expectedMoves=None):
+    return idempotent(sessionId, 'redo', expectedMoves=expectedMoves)
 
 
-def move(sessionId, fromTower, toTower):
+def streamHistory(packed):
+    view = memoryview(packed)
+    for i in range(0, len(view), chunkSize):
+        yield bytes(view[i:i + chunkSize])
+
+
+def history(sessionId):
     try:
-        sessions[sessionId].move(fromTower, toTower)
-        return NoContent, 200
+        first, packed = sessions[sessionId].history(timeout=lockTimeout('history'))
+        return Response(streamHistory(packed), mimetype='application/octet-stream',
+                        headers={'History-Start': str(first)})
     except Exception as e:
-        return error(201, e), 201
+        return error(201, e)
 
 
+@timed('isComplete')
 def isComplete(sessionId):
     try:
-        return sessions[sessionId].isComplete()
+        return respondCached(sessions[sessionId], 'complete', hanoi.HanoiSnapshot.isComplete,
+                             lockTimeout('isComplete'))
     except Exception as e:
-        return error(201, e), 201
+        return error(201, e)
+
+
+def streamEvents(first, q):
+    yield first
+    while True:
+        try:
+            event = q.get(timeout=events.KEEPALIVE)
+        except queue.Empty:
+            event = events.KEEPALIVE_EVENT
+        if event is None:
+            # the subscriber fell behind and was dropped
+            return
+        yield event
+
+
+def subscribe(h):
+    '''Subscribe a queue to the events of h
+
+    Returns the initial event, the queue and its subscriber. The queue ends
+    with None if it holds more than SessionEvents.BACKLOG events.
+    '''
+    q = queue.Queue()
+
+    def push(event):
+        if q.qsize() >= events.BACKLOG:
+            q.put(None)
+            return False
+        q.put(event)
+        return True
+
+    return events.subscribe(h, push, lockTimeout('watch')), q, push
+
+
+def watch(sessionId):
+    try:
+        h = sessions[sessionId]
+        first, q, push = subscribe(h)
+    except Exception as e:
+        return error(201, e)
+    response = Response(streamEvents(first, q), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    response.call_on_close(lambda: events.unsubscribe(h, push))
+    return response
+
+
+@timed('hint')
+def hint(sessionId, count=1):
+    try:
+        distance, moves = sessions[sessionId].hint(count, lockTimeout('hint'))
+        return respond({
+            'sessionId': sessionId,
+            'numberOfMovesRemaining': Serializer.count(distance),
+            'moves': [{'fromTower': s, 'toTower': t} for s, t in moves],
+        })
+    except Exception as e:
+        return error(201, e)
+
+
+@timed('distance')
+def distance(sessionId, towers=None, count=0):
+    try:
+        d, moves = sessions[sessionId].distance(towers, count, lockTimeout('distance'))
+        return respond({
+            'sessionId': sessionId,
+            'numberOfMoves': d,
+            'moves': [{'fromTower': s, 'toTower': t} for s, t in moves],
+        })
+    except Exception as e:
+        return error(201, e)
+
+
+def streamSolution(moves):
+    yield '['
+    sep = ''
+    chunk = []
+    for s, t in moves:
+        chunk.append('[{},{}]'.format(s, t))
+        if len(chunk) == chunkSize:
+            yield sep + ','.join(chunk)
+            sep = ','
+            chunk = []
+    if chunk:
+        yield sep + ','.join(chunk)
+    yield ']'
+
+
+def getSolution(numberOfDiscs, fromTower=0, toTower=2, numberOfTowers=3, offset=0,
+                limit=None):
+    try:
+        moves = hanoi.HanoiSolver.solution(
+            numberOfDiscs, fromTower, toTower, offset, limit, numberOfTowers)
+        return Response(streamSolution(moves), mimetype='application/json')
+    except Exception as e:
+        return error(201, e)
+
+
+def metrics():
+    m = sessions.metrics()
+    s = ''
+    s += '# TYPE hanoi_sessions_resident gauge\n'
+    s += 'hanoi_sessions_resident {}\n'.format(m['resident'])
+    s += '# TYPE hanoi_sessions_spilled gauge\n'
+    s += 'hanoi_sessions_spilled {}\n'.format(m['spilled'])
+    s += '# TYPE hanoi_session_expirations_total counter\n'
+    s += 'hanoi_session_expirations_total {}\n'.format(m['expirations'])
+    s += '# TYPE hanoi_session_evictions_total counter\n'
+    s += 'hanoi_session_evictions_total {}\n'.format(m['evictions'])
+    s += '# TYPE hanoi_session_reloads_total counter\n'
+    s += 'hanoi_session_reloads_total {}\n'.format(m['reloads'])
+    s += '# TYPE hanoi_sessions_watched gauge\n'
+    s += 'hanoi_sessions_watched {}\n'.format(events.watched())
+    return s + Metrics.default.render()
+
+
+def specification(path=os.path.join(os.path.dirname(__file__), 'hanoi.yaml')):
+    '''Load the OpenAPI specification at path
+
+    Parsing YAML takes longer than everything else connexion does to add an
+    API, so the parsed specification is cached as JSON in __pycache__, much
+    like bytecode, and reused for as long as the size and modification time
+    of path match. A cache that cannot be written is not an error.
+    '''
+    st = os.stat(path)
+    source = [st.st_mtime_ns, st.st_size]
+    cache = os.path.join(os.path.dirname(path), '__pycache__',
+                         os.path.basename(path) + '.json')
+    try:
+        with open(cache) as f:
+            cached = json.load(f)
+        if cached['source'] == source:
+            return cached['specification']
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    with open(path, 'rb') as f:
+        spec = yaml.load(f, Loader=getattr(yaml, 'CSafeLoader', yaml.SafeLoader))
+    try:
+        os.makedirs(os.path.dirname(cache), exist_ok=True)
+        temp = '{}.{}'.format(cache, os.getpid())
+        with open(temp, 'w') as f:
+            json.dump({'source': source, 'specification': spec}, f)
+        os.replace(temp, cache)
+    except OSError as e:
+        logging.debug('cannot cache {}: {}'.format(path, e))
+    return spec
 
 
 app = connexion.App(__name__)
-app.add_api('hanoi.yaml')
+app.add_api(specification())
 # set the WSGI application callable to allow using uWSGI:
 # uwsgi --http :$PORT -w hanoi.app
 application = app.app
@@ -0,0 +1,127 @@
+# MIT License
+#
+# Copyright (c) 2020 Christopher Friedt
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import itertools
+
+from hanoi import FrameStewart
+from hanoi import Hanoi
+
+
+def play(tower, moves):
+    '''Apply moves to a copy of tower, checking that each is legal'''
+    tower = list(tower)
+    for s, t in moves:
+        Hanoi.kernel(tower, s, t)
+    return tower
+
+
+def bfs(n, k, target):
+    '''Reference distance of every legal configuration to target'''
+    goal = [0] * k
+    goal[target] = (1 << n) - 1
+    goal = tuple(goal)
+    distance = {goal: 0}
+    frontier = [goal]
+    for t in frontier:
+        for m in Hanoi.legal(t):
+            u = tuple(play(t, [m]))
+            if u not in distance:
+                distance[u] = distance[t] + 1
+                frontier.append(u)
+    return distance
+
+
+def test_moves():
+    # https://oeis.org/A007664
+    assert [FrameStewart.moves(n, 4) for n in range(1, 11)] == [
+        1, 3, 5, 9, 13, 17, 25, 33, 41, 49]
+    for n in range(65):
+        assert FrameStewart.moves(n, 3) == (1 << n) - 1
+    for k in range(4, 9):
+        assert FrameStewart.moves(64, k) < FrameStewart.moves(64, k - 1)
+
+
+def test_split():
+    n = 10
+    i = FrameStewart.split(n, 4)
+    assert 2 * FrameStewart.moves(i, 4) + FrameStewart.moves(n - i, 3) == \
+        FrameStewart.moves(n, 4)
+
+
+def test_solution():
+    for k in range(3, 9):
+        for n in range(1, 9):
+            for source, target in [(0, k - 1), (k - 1, 1)]:
+                tower = [0] * k
+                tower[source] = (1 << n) - 1
+                moves = list(FrameStewart.solution(n, k, source, target))
+                assert len(moves) == FrameStewart.moves(n, k)
+                assert play(tower, moves)[target] == (1 << n) - 1
+                for i, m in enumerate(moves):
+                    assert FrameStewart.moveAt(n, k, source, target, i) == m
+                assert list(FrameStewart.solution(n, k, source, target, 5)) == moves[5:]
+
+
+def test_solution_optimal():
+    # Frame-Stewart is optimal for 4 towers
+    for n in range(1, 7):
+        tower = (0b111111 >> (6 - n), 0, 0, 0)
+        assert bfs(n, 4, 3)[tower] == FrameStewart.moves(n, 4)
+
+
+def test_position():
+    n, k = 7, 5
+    tower = [0b1111111, 0, 0, 0, 0]
+    for i, m in enumerate(FrameStewart.solution(n, k, 0, 4)):
+        assert FrameStewart.position(n, 0, 4, tower) == i
+        tower = play(tower, [m])
+    assert FrameStewart.position(n, 0, 4, tower) == FrameStewart.moves(n, k)
+    # the smallest disc is on the wrong tower
+    assert FrameStewart.position(n, 0, 4, [0b1111110, 0, 0, 0b1, 0]) is None
+
+
+def test_plan_3_towers_is_optimal():
+    n = 5
+    for target, distance in bfs(n, 3, 2).items():
+        d, moves = FrameStewart.plan(n, 0, 2, target)
+        assert d == distance
+        assert len(list(moves)) == d
+
+
+def test_plan_legal():
+    for k, n in [(4, 4), (5, 3)]:
+        for tower, distance in bfs(n, k, 1).items():
+            d, moves = FrameStewart.plan(n, 0, 1, tower)
+            moves = list(moves)
+            assert d >= distance
+            assert len(moves) == d
+            assert play(tower, moves)[1] == (1 << n) - 1
+
+
+def test_plan_follows_solution():
+    tower = [0] * 8
+    tower[0] = (1 << 64) - 1
+    moves = list(itertools.islice(FrameStewart.solution(64, 8, 0, 7), 100))
+    tower = play(tower, moves)
+    d, hint = FrameStewart.plan(64, 0, 7, tower)
+    assert d == FrameStewart.moves(64, 8) - 100
+    assert next(hint) == FrameStewart.moveAt(64, 8, 0, 7, 100)
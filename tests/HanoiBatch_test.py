@@ -0,0 +1,116 @@
+# MIT License
+#
+# Copyright (c) 2020 Christopher Friedt
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import random
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from hanoi import Hanoi  # noqa: E402
+from hanoi import HanoiSolver  # noqa: E402
+from hanoi.HanoiBatch import HanoiBatch  # noqa: E402
+
+
+def test_init():
+    b = HanoiBatch(3, 4, 1, 2)
+    assert len(b) == 3
+    assert b.tower.tolist() == [[0, 15, 0]] * 3
+    assert b.numberOfMoves.tolist() == [0, 0, 0]
+    assert b.isComplete().tolist() == [False, False, False]
+    assert [b[i].getState().id for i in range(3)] == [0, 1, 2]
+
+
+def test_init_invalid():
+    with pytest.raises(ValueError, match=r'numberOfSessions 0 is invalid'):
+        HanoiBatch(0)
+    with pytest.raises(ValueError, match=r'source may not equal target'):
+        HanoiBatch(1, 4, 2, 2)
+    # towers must fit in one word
+    with pytest.raises(ValueError, match=r'numberOfDiscs 65 is invalid'):
+        HanoiBatch(1, 65)
+
+
+def test_solution():
+    b = HanoiBatch(1000, 5)
+    for s, t in HanoiSolver.solution(5, 0, 2):
+        assert not b.isComplete().any()
+        codes = b.move(np.full(1000, s), np.full(1000, t))
+        assert (codes == HanoiBatch.OK).all()
+    assert b.isComplete().all()
+    assert (b.numberOfMoves == 31).all()
+    assert b[999].getState().isComplete()
+
+
+def test_codes():
+    b = HanoiBatch(6, 2)
+    codes = b.move([0, 1, 0, 3, -1, 0], [1, 2, 0, 0, 2, 2])
+    assert codes.tolist() == [HanoiBatch.OK, HanoiBatch.EMPTY, HanoiBatch.INVALID,
+                              HanoiBatch.INVALID, HanoiBatch.INVALID, HanoiBatch.OK]
+    # only legal moves were applied
+    assert b.tower.tolist() == [[2, 1, 0], [3, 0, 0], [3, 0, 0], [3, 0, 0], [3, 0, 0], [2, 0, 1]]
+    assert b.numberOfMoves.tolist() == [1, 0, 0, 0, 0, 1]
+    codes = b.move([0] * 6, [1] * 6)
+    assert codes[0] == HanoiBatch.LARGER
+    assert codes[5] == HanoiBatch.OK
+
+
+def test_move_invalid():
+    b = HanoiBatch(2)
+    with pytest.raises(ValueError, match=r'expected 2 sources and targets but got 1 and 2'):
+        b.move([0], [1, 1])
+
+
+def test_random_vs_scalar():
+    # every lane follows the scalar path, including illegal moves
+    random.seed(17)
+    b = HanoiBatch(64, 6, 0, 2, numberOfTowers=4)
+    scalar = [Hanoi(6, 0, 2, 4) for _ in range(64)]
+    for _ in range(200):
+        sources = [random.randrange(4) for _ in range(64)]
+        targets = [random.randrange(4) for _ in range(64)]
+        codes = b.move(sources, targets)
+        for i, h in enumerate(scalar):
+            try:
+                h.move(sources[i], targets[i])
+                assert codes[i] == HanoiBatch.OK
+            except ValueError:
+                assert codes[i] != HanoiBatch.OK
+    assert b.tower.tolist() == [list(h.getState().tower) for h in scalar]
+    assert b.numberOfMoves.tolist() == [h.getState().numberOfMoves for h in scalar]
+
+
+def test_views():
+    # lanes are ordinary sessions, and share the lock of the batch
+    b = HanoiBatch(2, 64)
+    b[1].move(0, 1)
+    assert b.tower[1].tolist() == [(1 << 64) - 2, 1, 0]
+    b.move([0, 0], [2, 2])
+    s = b[1].getState()
+    assert s.numberOfMoves == 2
+    assert list(s.tower) == [(1 << 64) - 4, 1, 2]
+    assert b[0].hint(1) == ((1 << 64) - 1, [(2, 1)])
+    b._lock.acquire()
+    with pytest.raises(TimeoutError):
+        b.move([0, 0], [1, 1], 0)
+    with pytest.raises(TimeoutError):
+        b[0].move(0, 1, 0)
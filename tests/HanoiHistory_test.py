@@ -0,0 +1,142 @@
+# MIT License
+#
+# Copyright (c) 2020 Christopher Friedt
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import pytest
+
+from hanoi import HanoiHistory
+
+
+def test_push():
+    h = HanoiHistory()
+    assert len(h) == 0
+    h.push(0, 1)
+    h.push(7, 5)
+    assert len(h) == 2
+    assert list(h) == [(0, 1), (7, 5)]
+    assert h.packed() == b'\x01\x75'
+
+
+def test_undo_redo():
+    h = HanoiHistory()
+    with pytest.raises(ValueError, match=r'there is no move to undo'):
+        h.undo()
+    h.push(0, 1)
+    h.push(0, 2)
+    assert h.undo() == (0, 2)
+    # the move is only removed once it was reversed
+    assert len(h) == 2
+    h.undone()
+    assert h.undo() == (0, 1)
+    assert list(h) == [(0, 1)]
+    assert h.redo() == (0, 2)
+    h.redone()
+    assert list(h) == [(0, 1), (0, 2)]
+    with pytest.raises(ValueError, match=r'there is no move to redo'):
+        h.redo()
+
+
+def test_push_discards_redo():
+    h = HanoiHistory()
+    h.push(0, 1)
+    h.push(0, 2)
+    h.undone()
+    h.push(1, 2)
+    assert h.packed() == b'\x01\x12'
+    with pytest.raises(ValueError, match=r'there is no move to redo'):
+        h.redo()
+
+
+def test_memory():
+    # about 1 byte per move
+    limit = HanoiHistory.limit
+    HanoiHistory.setLimit(None)
+    try:
+        h = HanoiHistory()
+        for _ in range(1 << 20):
+            h.push(0, 1)
+    finally:
+        HanoiHistory.setLimit(limit)
+    assert len(h.moves) == 1 << 20
+    assert h.moves.__sizeof__() < 1.25 * (1 << 20)
+
+
+def test_limit():
+    limit = HanoiHistory.limit
+    HanoiHistory.setLimit(16)
+    try:
+        h = HanoiHistory()
+        for i in range(1000):
+            h.push(i % 3, (i + 1) % 3)
+            # older moves are dropped in batches
+            assert len(h.moves) <= 16 + 2
+        assert len(h) >= 16
+        # the history begins after the moves that were dropped
+        assert h.first == 1000 - len(h)
+        # the last moves are kept
+        assert list(h)[-3:] == [(i % 3, (i + 1) % 3) for i in range(997, 1000)]
+        for _ in range(len(h)):
+            h.undone()
+        with pytest.raises(ValueError, match=r'there is no move to undo'):
+            h.undo()
+        with pytest.raises(ValueError, match=r'count -1 is invalid'):
+            HanoiHistory.setLimit(-1)
+    finally:
+        HanoiHistory.setLimit(limit)
+
+
+def test_number():
+    h = HanoiHistory(3)
+    h.push(0, 1, 4)
+    h.push(0, 2, 5)
+    # an undo is move 6, and the redo move 7
+    h.undone()
+    h.redone(7)
+    h.push(1, 2, 8)
+    assert [h.number(i) for i in range(3)] == [4, 7, 8]
+    # moves 10 and 11 undo moves 8 and 7
+    h.undone()
+    h.undone()
+    h.push(1, 2, 12)
+    assert [h.number(i) for i in range(2)] == [4, 12]
+
+
+def test_limit_first():
+    limit = HanoiHistory.limit
+    HanoiHistory.setLimit(8)
+    try:
+        h = HanoiHistory()
+        number = 0
+        for i in range(100):
+            number += 1
+            h.push(0, 1, number)
+            if i % 7 == 0:
+                # undo and redo the move
+                h.undone()
+                h.redone(number + 2)
+                number += 2
+        assert len(h) <= 9
+        assert h.number(len(h) - 1) == number
+        # the first move kept was made in the state after first moves
+        assert h.number(0) in (h.first + 1, h.first + 3)
+    finally:
+        HanoiHistory.setLimit(limit)
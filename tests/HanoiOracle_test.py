@@ -0,0 +1,168 @@
+# MIT License
+#
+# Copyright (c) 2020 Christopher Friedt
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import itertools
+import random
+import pytest
+
+from hanoi import HanoiOracle
+from hanoi import HanoiSolver
+from hanoi import HanoiState
+
+
+def all_towers(n):
+    '''Generate every legal configuration of n discs'''
+    for pegs in itertools.product(range(3), repeat=n):
+        tower = [0, 0, 0]
+        for disc, peg in enumerate(pegs):
+            tower[peg] |= 1 << disc
+        yield tuple(tower)
+
+
+def bfs_distances(start):
+    '''Reference distances from start to every configuration'''
+    seen = {start: 0}
+    frontier = [start]
+    while frontier:
+        nxt = []
+        for t in frontier:
+            for s in range(3):
+                if not t[s]:
+                    continue
+                bit = t[s] & -t[s]
+                for u in range(3):
+                    if u == s or (t[u] and (t[u] & -t[u]) < bit):
+                        continue
+                    v = list(t)
+                    v[s] &= ~bit
+                    v[u] |= bit
+                    v = tuple(v)
+                    if v not in seen:
+                        seen[v] = seen[t] + 1
+                        nxt.append(v)
+        frontier = nxt
+    return seen
+
+
+def apply(tower, moves):
+    tower = list(tower)
+    for s, t in moves:
+        assert tower[s]
+        bit = tower[s] & -tower[s]
+        assert not tower[t] or (tower[t] & -tower[t]) > bit
+        tower[s] &= ~bit
+        tower[t] |= bit
+    return tuple(tower)
+
+
+def test_distance_bfs():
+    for n in range(1, 5):
+        towers = list(all_towers(n))
+        for a in towers:
+            expected = bfs_distances(a)
+            for b in towers:
+                assert HanoiOracle.distance(n, a, b) == expected[b]
+
+
+def test_path_bfs():
+    for n in range(1, 5):
+        towers = list(all_towers(n))
+        for a in towers:
+            for b in towers:
+                moves = list(HanoiOracle.path(n, a, b))
+                assert len(moves) == HanoiOracle.distance(n, a, b)
+                assert apply(a, moves) == b
+
+
+def test_distance_detour():
+    # disc 2 moves twice, since the smaller discs trade places with it
+    a = (0b100, 0b011, 0)
+    b = (0b011, 0b100, 0)
+    assert HanoiOracle.distance(3, a, b) == 5
+    assert list(HanoiOracle.path(3, a, b)) == [
+        (0, 2), (1, 2), (1, 0), (2, 0), (2, 1)]
+
+
+def test_distance_symmetric():
+    random.seed(16)
+    for _ in range(100):
+        n = random.randint(1, 64)
+        a = [0, 0, 0]
+        b = [0, 0, 0]
+        for k in range(n):
+            a[random.randrange(3)] |= 1 << k
+            b[random.randrange(3)] |= 1 << k
+        assert HanoiOracle.distance(n, a, b) == HanoiOracle.distance(n, b, a)
+
+
+def test_distance_goal():
+    # to a complete tower, this is the distance of HanoiSolver
+    random.seed(16)
+    for _ in range(300):
+        n = random.randint(1, 64)
+        h = HanoiState(n, 0, random.randrange(3) or 2)
+        h.tower = [0, 0, 0]
+        for k in range(n):
+            h.tower[random.randrange(3)] |= 1 << k
+        goal = [0, 0, 0]
+        goal[h.target] = (1 << n) - 1
+        assert HanoiOracle.distance(n, h.tower, goal) == HanoiSolver.distance(h)
+        for t in range(3):
+            assert HanoiOracle._stacked(n, h.tower, t) == HanoiSolver._solve(n, h.tower, t)[0]
+
+
+def test_path_64():
+    a = ((1 << 64) - 1, 0, 0)
+    b = (1 << 63, 0, (1 << 63) - 1)
+    assert HanoiOracle.distance(64, a, b) == (1 << 63) - 1
+    # the path is generated lazily
+    moves = HanoiOracle.path(64, a, b)
+    assert list(itertools.islice(moves, 3)) == [(0, 2), (0, 1), (2, 1)]
+
+
+def test_distance_equal():
+    assert HanoiOracle.distance(4, (0b1111, 0, 0), (0b1111, 0, 0)) == 0
+    assert list(HanoiOracle.path(4, (0b1111, 0, 0), (0b1111, 0, 0))) == []
+
+
+def test_distance_invalid():
+    with pytest.raises(ValueError, match=r'numberOfDiscs 0 is invalid'):
+        HanoiOracle.distance(0, (0, 0, 0), (0, 0, 0))
+    with pytest.raises(ValueError, match=r'only supported for 3 towers'):
+        HanoiOracle.distance(1, (1, 0, 0, 0), (1, 0, 0))
+    with pytest.raises(ValueError, match=r'not a legal configuration'):
+        HanoiOracle.path(2, (3, 0, 0), (1, 1, 0))
+
+
+def test_efficiency():
+    h = HanoiState(3, 0, 2)
+    assert HanoiOracle.efficiency(h) == 1.0
+    for s, t in HanoiSolver.solution(3, 0, 2):
+        h.tower = list(apply(h.tower, [(s, t)]))
+        h.numberOfMoves += 1
+        assert HanoiOracle.efficiency(h) == 1.0
+    # one wasted pair of moves
+    h.tower = list(apply(h.tower, [(2, 1), (1, 2)]))
+    h.numberOfMoves += 2
+    assert HanoiOracle.efficiency(h) == 7 / 9
+    assert HanoiOracle.efficiency(HanoiState(3, 0, 2, numberOfTowers=4)) is None
@@ -0,0 +1,49 @@
+# MIT License
+#
+# Copyright (c) 2020 Christopher Friedt
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import json
+
+from hanoi import HanoiSnapshot
+from hanoi import HanoiState
+from hanoi import SessionTable
+
+
+def test_fromRecord():
+    s = HanoiSnapshot.fromRecord(
+        [7, SessionTable.pack(4, 1, 2) | 2 * SessionTable.SEQUENCE, 3, 0b1000, 0b0110, 0b0001])
+    assert s.id == 7
+    assert s.numberOfDiscs == 4
+    assert s.source == 1
+    assert s.target == 2
+    assert s.numberOfMoves == 3
+    assert s.tower == (0b1000, 0b0110, 0b0001)
+
+
+def test_isComplete():
+    assert not HanoiSnapshot(0, 2, 0, 2, 0, (3, 0, 0)).isComplete()
+    assert HanoiSnapshot(0, 2, 0, 2, 3, (0, 0, 3)).isComplete()
+
+
+def test_snapshot_of_state():
+    h = HanoiState(4, 0, 2)
+    s = h.snapshot()
+    assert s == (h.id, 4, 0, 2, 0, (0b1111, 0, 0))
+    assert json.loads(s.to_json()) == json.loads(h.to_json())
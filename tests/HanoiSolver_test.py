@@ -0,0 +1,227 @@
+# MIT License
+#
+# Copyright (c) 2020 Christopher Friedt
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import itertools
+import pytest
+
+from hanoi import HanoiSolver
+from hanoi import HanoiState
+
+
+def all_states(n, target=2):
+    '''Generate every legal HanoiState with n discs'''
+    for pegs in itertools.product(range(3), repeat=n):
+        h = HanoiState(n, 0, target)
+        h.tower = [0, 0, 0]
+        for disc, peg in enumerate(pegs):
+            h.tower[peg] |= 1 << disc
+        yield h
+
+
+def bfs_distance(h):
+    '''Reference distance by breadth-first search'''
+    goal = (1 << h.numberOfDiscs) - 1
+    start = tuple(h.tower)
+    seen = {start}
+    frontier = [start]
+    d = 0
+    while frontier:
+        nxt = []
+        for t in frontier:
+            if t[h.target] == goal:
+                return d
+            for s in range(3):
+                if not t[s]:
+                    continue
+                bit = t[s] & -t[s]
+                for u in range(3):
+                    if u == s or (t[u] and (t[u] & -t[u]) < bit):
+                        continue
+                    v = list(t)
+                    v[s] &= ~bit
+                    v[u] |= bit
+                    v = tuple(v)
+                    if v not in seen:
+                        seen.add(v)
+                        nxt.append(v)
+        frontier = nxt
+        d += 1
+
+
+def test_distance_initial():
+    for n in range(1, 65):
+        assert HanoiSolver.distance(HanoiState(n, 0, 2)) == (1 << n) - 1
+
+
+def test_distance_complete():
+    h = HanoiState(4, 0, 2)
+    h.tower = [0, 0, 0b1111]
+    assert HanoiSolver.distance(h) == 0
+    assert HanoiSolver.nextMove(h) is None
+    assert HanoiSolver.nextMoves(h, 10) == []
+
+
+def test_distance_bfs():
+    for n in range(1, 6):
+        for h in all_states(n):
+            assert HanoiSolver.distance(h) == bfs_distance(h)
+
+
+def test_nextMove_optimal():
+    for n in range(1, 6):
+        for h in all_states(n, 1):
+            d = HanoiSolver.distance(h)
+            m = HanoiSolver.nextMove(h)
+            if d == 0:
+                assert m is None
+                continue
+            s, t = m
+            bit = h.tower[s] & -h.tower[s]
+            h.tower[s] &= ~bit
+            h.tower[t] |= bit
+            assert HanoiSolver.distance(h) == d - 1
+
+
+def test_nextMoves_initial():
+    h = HanoiState(3, 0, 2)
+    assert HanoiSolver.nextMoves(h, 10) == [
+        (0, 2), (0, 1), (2, 1), (0, 2), (1, 0), (1, 2), (0, 2)]
+    # the state itself is not modified
+    assert h.tower == [0b111, 0, 0]
+
+
+def test_nextMoves_count():
+    h = HanoiState(64, 0, 2)
+    assert len(HanoiSolver.nextMoves(h, 5)) == 5
+    assert HanoiSolver.nextMoves(h, 0) == []
+
+
+def test_nextMoves_matches_nextMove():
+    for n in range(1, 7):
+        for target in (1, 2):
+            for h in all_states(n, target):
+                moves = HanoiSolver.nextMoves(h, 1 << n)
+                assert len(moves) == HanoiSolver.distance(h)
+                for m in moves:
+                    assert HanoiSolver.nextMove(h) == m
+                    s, t = m
+                    bit = h.tower[s] & -h.tower[s]
+                    h.tower[s] &= ~bit
+                    h.tower[t] |= bit
+                assert HanoiSolver.nextMove(h) is None
+
+
+def test_nextMoves_4096():
+    h = HanoiState(4096, 0, 2)
+    h.tower = [(1 << 4096) - 1 - 0b101, 0b001, 0b100]
+    moves = HanoiSolver.nextMoves(h, 1024)
+    assert len(moves) == 1024
+    assert moves[0] == HanoiSolver.nextMove(h)
+
+
+def test_nextMoves_count_n1():
+    h = HanoiState(4, 0, 2)
+    with pytest.raises(ValueError, match=r'count -1 is invalid'):
+        HanoiSolver.nextMoves(h, -1)
+
+
+def test_illegal_configuration():
+    h = HanoiState(4, 0, 2)
+    h.tower = [0b1111, 0b0001, 0]
+    with pytest.raises(ValueError, match=r'not a legal configuration'):
+        HanoiSolver.distance(h)
+    h.tower = [0b0111, 0, 0]
+    with pytest.raises(ValueError, match=r'not a legal configuration'):
+        HanoiSolver.nextMove(h)
+
+
+def test_moveAt_matches_nextMoves():
+    for n in range(1, 7):
+        for s in range(3):
+            for t in range(3):
+                if s == t:
+                    continue
+                expected = HanoiSolver.nextMoves(HanoiState(n, s, t), 1 << n)
+                assert [HanoiSolver.moveAt(n, s, t, k)
+                        for k in range(len(expected))] == expected
+                assert list(HanoiSolver.solution(n, s, t)) == expected
+
+
+def test_moveAt_64():
+    # the last move of a 64-disc game moves disc 1 onto the target
+    assert HanoiSolver.moveAt(64, 0, 2, (1 << 64) - 2) == (1, 2)
+    # the middle move moves disc 64
+    assert HanoiSolver.moveAt(64, 0, 2, (1 << 63) - 1) == (0, 2)
+
+
+def test_moveAt_invalid():
+    with pytest.raises(ValueError, match=r'move 15 is invalid'):
+        HanoiSolver.moveAt(4, 0, 2, 15)
+    with pytest.raises(ValueError, match=r'move -1 is invalid'):
+        HanoiSolver.moveAt(4, 0, 2, -1)
+    with pytest.raises(ValueError, match=r'numberOfDiscs 65 is invalid'):
+        HanoiSolver.moveAt(65, 0, 2, 0)
+    with pytest.raises(ValueError, match=r'source may not equal target'):
+        HanoiSolver.moveAt(4, 1, 1, 0)
+
+
+def test_solution_offset_limit():
+    expected = list(HanoiSolver.solution(5, 2, 0))
+    assert list(HanoiSolver.solution(5, 2, 0, 7, 9)) == expected[7:16]
+    assert list(HanoiSolver.solution(5, 2, 0, 30, 9)) == expected[30:]
+    assert list(HanoiSolver.solution(5, 2, 0, 31)) == []
+    # the tail of a solution is the same for any number of discs of the same parity
+    g = HanoiSolver.solution(64, 0, 2, (1 << 64) - 3, 10)
+    assert list(g) == list(HanoiSolver.solution(4, 0, 2, 13))
+
+
+def test_solution_invalid():
+    with pytest.raises(ValueError, match=r'offset 16 is invalid'):
+        HanoiSolver.solution(4, 0, 2, 16)
+    with pytest.raises(ValueError, match=r'limit -1 is invalid'):
+        HanoiSolver.solution(4, 0, 2, 0, -1)
+
+
+def test_towers():
+    h = HanoiState(6, 0, 3, numberOfTowers=4)
+    assert HanoiSolver.distance(h) == 17
+    assert HanoiSolver.nextMove(h) == HanoiSolver.moveAt(6, 0, 3, 0, 4)
+    assert HanoiSolver.nextMoves(h, 3) == list(HanoiSolver.solution(6, 0, 3, 0, 3, 4))
+    h.tower = [0, 0, 0, 0b111111]
+    assert HanoiSolver.distance(h) == 0
+    assert HanoiSolver.nextMove(h) is None
+
+
+def test_towers_solution():
+    moves = list(HanoiSolver.solution(20, 1, 0, numberOfTowers=6))
+    assert len(moves) == 89
+    assert list(HanoiSolver.solution(20, 1, 0, 60, 5, 6)) == moves[60:65]
+    assert HanoiSolver.moveAt(20, 1, 0, 88, 6) == moves[88]
+    with pytest.raises(ValueError, match=r'move 89 is invalid'):
+        HanoiSolver.moveAt(20, 1, 0, 89, 6)
+    with pytest.raises(ValueError, match=r'offset 90 is invalid'):
+        HanoiSolver.solution(20, 1, 0, 90, None, 6)
+    with pytest.raises(ValueError, match=r'target 6 is invalid'):
+        HanoiSolver.solution(20, 1, 6, numberOfTowers=6)
+    with pytest.raises(ValueError, match=r'numberOfTowers 9 is invalid'):
+        HanoiSolver.solution(20, 1, 0, numberOfTowers=9)
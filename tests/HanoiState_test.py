@@ -24,6 +24,7 @@ import json
 import pytest
 
 from hanoi import HanoiState
+from hanoi import SessionTable
 
 
 def test_init_happy_path():
@@ -42,9 +43,22 @@ def test_init_numberOfDiscs_n1():
         h = HanoiState(-1, 0, 2)
 
 
+def test_init_numberOfDiscs_gt4096():
+    with pytest.raises(ValueError, match=r"numberOfDiscs 4097 is invalid"):
+        HanoiState(4097, 0, 2)
+
+
 def test_init_numberOfDiscs_gt64():
-    with pytest.raises(ValueError, match=r"numberOfDiscs 65 is invalid"):
-        h = HanoiState(65, 0, 2)
+    h = HanoiState(4096, 0, 2)
+    assert h._table is HanoiState.bigTable
+    assert (h.numberOfDiscs, h.source, h.target) == (4096, 0, 2)
+    assert h.tower == [(1 << 4096) - 1, 0, 0]
+    assert h.numberOfMoves == 0
+
+
+def test_init_numberOfDiscs_gt64_towers():
+    with pytest.raises(ValueError, match=r"games of more than 64 discs must have 3 towers"):
+        HanoiState(65, 0, 2, numberOfTowers=4)
 
 
 def test_init_source_n1():
@@ -81,3 +95,122 @@ def test_to_json():
     assert j['toTower'] == 2
     assert j['numberOfMoves'] == 0
     assert j['towers'] == [15, 0, 0]
+
+
+def test_slots():
+    h = HanoiState(4, 0, 2)
+    assert not hasattr(h, '__dict__')
+    with pytest.raises(AttributeError):
+        h.foo = 42
+
+
+def test_tower_view():
+    h = HanoiState(4, 1, 2)
+    assert len(h.tower) == 3
+    assert list(h.tower) == [0, 15, 0]
+    assert '{}'.format(h.tower) == '[0, 15, 0]'
+    h.tower[2] = 1
+    assert h.tower == [0, 15, 1]
+    h.tower = [1, 2, 12]
+    assert h.tower == [1, 2, 12]
+    with pytest.raises(IndexError, match=r'tower 3 is invalid'):
+        h.tower[3]
+
+
+def test_table_record():
+    h = HanoiState(4, 0, 2)
+    h.numberOfMoves = 3
+    base = h._base
+    w = HanoiState.table.words
+    assert w[base + SessionTable.ID] == h.id
+    assert w[base + SessionTable.MOVES] == 3
+    assert w[base + SessionTable.TOWER] == 15
+
+
+def test_release():
+    n = len(HanoiState.table)
+    h = HanoiState(4, 0, 2)
+    h.numberOfMoves = 3
+    id = h.id
+    assert len(HanoiState.table) == n + 1
+    d = h.detach()
+    assert len(HanoiState.table) == n
+    # the detached state reads a copy of the record
+    assert (d.id, d.numberOfMoves, d.tower) == (id, 3, [15, 0, 0])
+    assert d._table is not HanoiState.table
+    # the record is not released twice
+    assert h.detach() is None
+    assert len(HanoiState.table) == n
+    # nor when the state is garbage collected
+    h = HanoiState(4, 0, 2)
+    del h
+    assert len(HanoiState.table) == n + 1
+
+
+def test_restore_counter():
+    id = HanoiState.getCounter() + 10
+    h = HanoiState.restore(id, 4, 1, 0, 2, [0b1100, 0b0011, 0])
+    assert h.id == id
+    assert (h.numberOfDiscs, h.source, h.target) == (4, 1, 0)
+    assert h.numberOfMoves == 2
+    assert h.tower == [0b1100, 0b0011, 0]
+    assert HanoiState(4, 0, 2).id == id + 1
+    HanoiState.setCounter(0)
+    assert HanoiState.getCounter() == id + 2
+
+
+def test_restore_invalid():
+    with pytest.raises(ValueError, match=r'numberOfDiscs 4097 is invalid'):
+        HanoiState.restore(0, 4097, 0, 2)
+
+
+def test_createMany():
+    first = HanoiState.getCounter()
+    hs = HanoiState.createMany([(4, 0, 2, 3), (5, 3, 0, 4), (100, 1, 2, 3), (2, 2, 1, 3)])
+    assert [h.id for h in hs] == list(range(first, first + 4))
+    assert HanoiState.getCounter() == first + 4
+    assert [h._table for h in hs] == [HanoiState.table, HanoiState.wideTable,
+                                      HanoiState.bigTable, HanoiState.table]
+    assert hs[1].tower == [0, 0, 0, 0b11111]
+    assert hs[2].tower == [0, (1 << 100) - 1, 0]
+    assert (hs[3].numberOfDiscs, hs[3].source, hs[3].target) == (2, 2, 1)
+    # nothing is allocated unless every game is valid
+    with pytest.raises(ValueError, match=r'source may not equal target'):
+        HanoiState.createMany([(4, 0, 2, 3), (4, 1, 1, 3)])
+    with pytest.raises(ValueError, match=r'count 0 is invalid'):
+        HanoiState.createMany([])
+    assert HanoiState.getCounter() == first + 4
+
+
+def test_init_towers():
+    h = HanoiState(5, 3, 0, numberOfTowers=4)
+    assert h.numberOfTowers == 4
+    assert (h.numberOfDiscs, h.source, h.target) == (5, 3, 0)
+    assert h.tower == [0, 0, 0, 0b11111]
+    assert len(h.tower) == 4
+    assert h._table is HanoiState.wideTable
+    # ids are allocated by HanoiState.table either way
+    assert HanoiState(4, 0, 2).id == h.id + 1
+    s = h.snapshot()
+    assert s.numberOfTowers == 4
+    assert s.tower == (0, 0, 0, 0b11111)
+    assert json.loads(h.to_json())['towers'] == [0, 0, 0, 31]
+
+
+def test_init_towers_invalid():
+    with pytest.raises(ValueError, match=r'numberOfTowers 9 is invalid'):
+        HanoiState(4, 0, 2, numberOfTowers=9)
+    with pytest.raises(ValueError, match=r'target 4 is invalid'):
+        HanoiState(4, 0, 4, numberOfTowers=4)
+    with pytest.raises(ValueError, match=r'numberOfTowers 4 is invalid'):
+        HanoiState(4, 0, 2, SessionTable(), 4)
+    h = HanoiState(4, 0, 2, numberOfTowers=4)
+    with pytest.raises(ValueError, match=r'expected 4 towers but got 3'):
+        h.tower = [0, 0, 15]
+
+
+def test_restore_towers():
+    id = HanoiState.getCounter() + 10
+    h = HanoiState.restore(id, 4, 1, 0, 2, [0b1100, 0b0001, 0, 0b0010, 0], 5)
+    assert h.numberOfTowers == 5
+    assert h.tower == [0b1100, 0b0001, 0, 0b0010, 0]
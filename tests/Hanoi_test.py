@@ -20,9 +20,18 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+import re
+import threading
+import time
+
 import pytest
 
 from hanoi import Hanoi
+from hanoi import HanoiHistory
+from hanoi import HanoiState
+from hanoi import HanoiSolver
+from hanoi import Metrics
+from hanoi import SessionTable
 
 
 def test_popcount():
@@ -49,9 +58,49 @@ def test_getState_happy_path():
     assert h.getState()
 
 
+def test_getState_snapshot():
+    h = Hanoi(4, 0, 2)
+    s = h.getState()
+    h.move(0, 1)
+    # the snapshot does not change with the game
+    assert s.numberOfMoves == 0
+    assert s.tower == (0b1111, 0, 0)
+    assert h.getState().numberOfMoves == 1
+    assert h.getState().tower == (0b1110, 0b0001, 0)
+    with pytest.raises(AttributeError):
+        s.numberOfMoves = 2
+
+
+def test_getState_consistent():
+    h = Hanoi(10, 0, 2)
+    moves = list(HanoiSolver.solution(10, 0, 2))
+    done = threading.Event()
+
+    def play():
+        for s, t in moves:
+            h.move(s, t)
+        done.set()
+
+    writer = threading.Thread(target=play)
+    writer.start()
+    snapshots = []
+    while not done.is_set():
+        snapshots.append(h.getState())
+    writer.join()
+    # every snapshot must be the state after exactly numberOfMoves moves
+    for s in snapshots:
+        t = [0b1111111111, 0, 0]
+        for source, target in moves[:s.numberOfMoves]:
+            Hanoi.kernel(t, source, target)
+        assert list(s.tower) == t
+
+
 def test_getState_locked():
     h = Hanoi(4, 0, 2)
+    # readers do not wait for the lock unless a move is in progress
     h._lock.acquire()
+    h.getState(0)
+    h._state._table.begin(h._state._base)
     with pytest.raises(TimeoutError):
         h.getState(0)
 
@@ -87,6 +136,84 @@ def test_move_locked():
         h.move(0, 2, 0)
 
 
+def test_move_illegal_unlocks():
+    h = Hanoi(4, 0, 2)
+    with pytest.raises(ValueError, match='source 1 is empty'):
+        h.move(1, 2)
+    h.move(0, 1)
+    with pytest.raises(ValueError, match='cannot put disc 2 on top of disc 1'):
+        h.move(0, 1)
+    with pytest.raises(ValueError, match='move 1'):
+        h.moves([(0, 2), (0, 2)])
+    assert not h._lock.locked()
+    h.move(0, 2, 0)
+
+
+def test_expectedMoves():
+    h = Hanoi(4, 0, 2)
+    id = h._state.id
+    h.move(0, 1, expectedMoves=0)
+    # e.g. a retried request
+    with pytest.raises(Hanoi.Conflict,
+                       match='expected 0 moves but session {} has made 1'.format(id)) as e:
+        h.move(0, 1, expectedMoves=0)
+    assert e.value.state.numberOfMoves == 1
+    assert e.value.state.tower == (0b1110, 0b0001, 0)
+    h.move(0, 2, expectedMoves=1)
+    with pytest.raises(Hanoi.Conflict):
+        h.moves([(1, 2)], expectedMoves=1)
+    h.moves([(1, 2)], expectedMoves=2)
+    with pytest.raises(Hanoi.Conflict):
+        h.undo(expectedMoves=2)
+    h.undo(expectedMoves=3)
+    with pytest.raises(Hanoi.Conflict):
+        h.redo(expectedMoves=3)
+    h.redo(expectedMoves=4)
+    assert h.getState().numberOfMoves == 5
+    assert h.getState().tower == (0b1100, 0, 0b0011)
+    assert not h._lock.locked()
+
+
+def test_locked():
+    h = Hanoi(4, 0, 2)
+    with h.locked(0) as held:
+        assert held is h
+        with pytest.raises(TimeoutError, match='session {} is locked'.format(h._state.id)):
+            h.move(0, 2, 0)
+        with pytest.raises(TimeoutError, match='timed out waiting'):
+            h.move(0, 2, 0.01)
+    with pytest.raises(ValueError):
+        with h.locked():
+            h._move(1, 2)
+    assert not h._lock.locked()
+    h.move(0, 2, 0)
+
+
+def test_maxPending():
+    h = Hanoi(4, 0, 2)
+    id = h._state.id
+    with pytest.raises(ValueError, match='count -1 is invalid'):
+        Hanoi.setMaxPending(-1)
+    Hanoi.setMaxPending(1)
+    try:
+        with h.locked():
+            t = threading.Thread(target=h.move, args=(0, 2, 5))
+            t.start()
+            while Hanoi._pending.get(id) != 1:
+                pass
+            # one caller is already waiting, so another one is turned away
+            with pytest.raises(Hanoi.Busy, match='session {} is busy'.format(id)):
+                h.move(0, 1, 5)
+            # callers that do not wait are not counted
+            with pytest.raises(TimeoutError):
+                h.move(0, 1, 0)
+        t.join()
+        assert id not in Hanoi._pending
+        assert h._state.tower == [0b1110, 0, 0b0001]
+    finally:
+        Hanoi.setMaxPending(None)
+
+
 def test_move_source_n1():
     h = Hanoi(4, 0, 2)
     with pytest.raises(ValueError, match=r'source -1 is invalid'):
@@ -135,8 +262,404 @@ def test_isComplete_happy_path():
     assert not h.isComplete()
 
 
+def test_move_error_releases_lock():
+    h = Hanoi(4, 0, 2)
+    with pytest.raises(ValueError):
+        h.move(1, 0)
+    assert not h._lock.locked()
+    assert h._state.snapshot() is not None
+
+
 def test_isComplete_locked():
     h = Hanoi(4, 0, 2)
+    # readers do not wait for the lock unless a move is in progress
     h._lock.acquire()
+    h.isComplete(0)
+    h._state._table.begin(h._state._base)
     with pytest.raises(TimeoutError):
         h.isComplete(0)
+
+
+def test_hint_happy_path():
+    h = Hanoi(4, 0, 2)
+    # an off-optimal first move
+    h.move(0, 2)
+    distance, moves = h.hint(3)
+    assert distance == 15
+    assert moves == [(2, 1), (0, 2), (1, 2)]
+    assert not h._lock.locked()
+
+
+def test_hint_locked():
+    h = Hanoi(4, 0, 2)
+    # readers do not wait for the lock unless a move is in progress
+    h._lock.acquire()
+    h.hint(1, 0)
+    h._state._table.begin(h._state._base)
+    with pytest.raises(TimeoutError):
+        h.hint(1, 0)
+
+
+def test_distance():
+    h = Hanoi(4, 0, 2)
+    h.moves([(0, 2), (2, 1)])
+    assert h.distance(count=2) == (1, [(1, 0)])
+    assert h.distance([0, 0, 0b1111]) == (14, [])
+    assert h.distance([0, 0b0001, 0b1110], 1) == (13, [(0, 2)])
+    assert not h._lock.locked()
+
+
+def test_distance_towers():
+    h = Hanoi(4, 0, 3, numberOfTowers=4)
+    with pytest.raises(ValueError, match=r'only supported for 3 towers'):
+        h.distance()
+
+
+def test_undo_redo():
+    h = Hanoi(3, 0, 2)
+    h.move(0, 2)
+    h.moves([(0, 1), (2, 1)])
+    assert h.history()[1] == b'\x02\x01\x21'
+    h.undo()
+    h.undo()
+    assert h._state.tower == [0b110, 0, 0b001]
+    # undoing counts as a move
+    assert h._state.numberOfMoves == 5
+    assert h.history()[1] == b'\x02'
+    h.redo()
+    assert h._state.tower == [0b100, 0b010, 0b001]
+    assert h.history()[1] == b'\x02\x01'
+    # a new move discards the moves that were undone
+    h.move(2, 0)
+    with pytest.raises(ValueError, match=r'there is no move to redo'):
+        h.redo()
+    assert h.history() == (0, b'\x02\x01\x20')
+    assert not h._lock.locked()
+
+
+def test_undo_empty():
+    h = Hanoi(3, 0, 2)
+    assert h.history() == (0, b'')
+    with pytest.raises(ValueError, match=r'there is no move to undo'):
+        h.undo()
+    with pytest.raises(ValueError, match=r'there is no move to redo'):
+        h.redo()
+    assert h._state.numberOfMoves == 0
+    assert not h._lock.locked()
+
+
+def test_undo_observed():
+    h = Hanoi(3, 0, 2)
+    h.move(0, 2)
+    seen = []
+    h.subscribe(lambda h, n, moves: seen.append((n, moves)))
+    h.undo()
+    h.redo()
+    assert seen == [(1, [(2, 0)]), (2, [(0, 2)])]
+
+    def fail(h, n, moves):
+        raise RuntimeError('no')
+    h.subscribe(fail)
+    with pytest.raises(RuntimeError):
+        h.undo()
+    # a rolled back undo can be retried
+    assert h._state.tower == [0b110, 0, 0b001]
+    assert h._state.numberOfMoves == 3
+    assert h.history()[1] == b'\x02'
+
+
+def test_history_restored():
+    h = Hanoi.restore(1 << 40, 3, 0, 2, 1, [0b110, 0, 0b001])
+    assert h.history() == (1, b'')
+    h.moves([(0, 1), (2, 1)])
+    h.undo()
+    assert h.history() == (1, b'\x01')
+
+
+def test_release():
+    h = Hanoi(3, 0, 2)
+    h.move(0, 2)
+    n = len(HanoiState.table)
+    h.release()
+    assert len(HanoiState.table) == n - 1
+    # the last state is still read
+    assert h.getState().tower == (0b110, 0, 0b001)
+    h.release()
+    assert len(HanoiState.table) == n - 1
+    assert not h._lock.locked()
+
+
+def test_evict_waiting_move():
+    h = Hanoi(3, 0, 2)
+    base = h._state._base
+    errors = []
+
+    def move():
+        try:
+            h.move(0, 2)
+        except Hanoi.Evicted as e:
+            errors.append(e)
+
+    h._lock.acquire()
+    t = threading.Thread(target=move)
+    t.start()
+    while h._state.id not in Hanoi._pending:
+        time.sleep(0.001)
+    h.evict()
+    # the record is reused by another game
+    other = Hanoi(3, 1, 2)
+    assert other._state._base == base
+    meta = HanoiState.table.words[base + SessionTable.META]
+    h._lock.release()
+    t.join()
+    assert len(errors) == 1
+    # not even the sequence number of the other game was touched
+    assert HanoiState.table.words[base + SessionTable.META] == meta
+    assert other.getState().tower == (0, 0b111, 0)
+    assert other.getState().numberOfMoves == 0
+
+
+def test_history_attached():
+    h = Hanoi.attach(HanoiState(3, 0, 2), threading.Lock())
+    h.move(0, 2)
+    with pytest.raises(ValueError, match=r'history of session \d+ is not available'):
+        h.undo()
+    with pytest.raises(ValueError, match=r'history of session \d+ is not available'):
+        h.history()
+
+
+def test_history_limit():
+    limit = HanoiHistory.limit
+    HanoiHistory.setLimit(8)
+    try:
+        h = Hanoi(3, 0, 2)
+        for _ in range(50):
+            h.move(0, 1)
+            h.move(1, 0)
+        # only the last moves are kept
+        first, packed = h.history()
+        assert 8 <= len(packed) <= 9
+        assert packed.endswith(b'\x01\x10')
+        # the history begins after the moves that were dropped
+        assert first + len(packed) == 100
+        HanoiHistory.setLimit(0)
+        h = Hanoi(3, 0, 2)
+        h.moves([(0, 2)])
+        with pytest.raises(ValueError, match=r'history of session \d+ is not available'):
+            h.undo()
+        assert h._history is False
+    finally:
+        HanoiHistory.setLimit(limit)
+
+
+def test_moves_happy_path():
+    h = Hanoi(4, 0, 2)
+    h.moves([(0, 1), (0, 2), (1, 2)])
+    assert h._state.tower == [0b1100, 0b0000, 0b0011]
+    assert h._state.numberOfMoves == 3
+    assert not h._lock.locked()
+
+
+def test_moves_rollback():
+    h = Hanoi(4, 0, 2)
+    h.move(0, 1)
+    with pytest.raises(ValueError, match=r'move 2: cannot put disc 3 on top of disc 1'):
+        h.moves([(1, 2), (0, 1), (0, 2)])
+    assert h._state.tower == [0b1110, 0b0001, 0b0000]
+    assert h._state.numberOfMoves == 1
+    assert not h._lock.locked()
+
+
+def test_moves_invalid():
+    h = Hanoi(4, 0, 2)
+    with pytest.raises(ValueError, match=r'move 1: target 3 is invalid'):
+        h.moves([(0, 1), (0, 3)])
+    with pytest.raises(ValueError, match=r'move 0: expected \(source, target\)'):
+        h.moves([(0, 1, 2)])
+    assert h._state.numberOfMoves == 0
+
+
+def test_moves_malformed():
+    h = Hanoi(3, 0, 2)
+    events = []
+    h.subscribe(lambda h, n, moves: events.append(moves))
+    for moves in ([(0, 2), 5], [(0, 2), ('a', 2)], [(0, 2), None], [(0, 2), (0.5, 1)]):
+        with pytest.raises(ValueError, match=r'move 1: expected \(source, target\)'):
+            h.moves(moves)
+        assert h._state.tower == [0b111, 0, 0]
+        assert h._state.numberOfMoves == 0
+    assert events == []
+    assert not h._lock.locked()
+
+
+def test_moves_locked():
+    h = Hanoi(4, 0, 2)
+    h._lock.acquire()
+    with pytest.raises(TimeoutError):
+        h.moves([(0, 1)], 0)
+
+
+def test_popcount_64():
+    assert 64 == Hanoi.popcount((1 << 64) - 1)
+
+
+def test_fls_64():
+    assert 63 == Hanoi.fls(1 << 63)
+
+
+def test_kernel_happy_path():
+    tower = [0b1110, 0b0001, 0b0000]
+    assert 0b0010 == Hanoi.kernel(tower, 0, 2)
+    assert tower == [0b1100, 0b0001, 0b0010]
+
+
+def test_kernel_empty_source():
+    tower = [0b1111, 0b0000, 0b0000]
+    with pytest.raises(ValueError, match=r'source 1 is empty'):
+        Hanoi.kernel(tower, 1, 2)
+
+
+def test_kernel_bigger_disc():
+    tower = [1 << 63, (1 << 63) - 1, 0]
+    with pytest.raises(ValueError, match=r'cannot put disc 64 on top of disc 1'):
+        Hanoi.kernel(tower, 0, 1)
+    assert tower == [1 << 63, (1 << 63) - 1, 0]
+
+
+def test_legalMoves_happy_path():
+    h = Hanoi(4, 0, 2)
+    assert h.legalMoves() == [(0, 1), (0, 2)]
+    h.move(0, 1)
+    assert h.legalMoves() == [(0, 2), (1, 0), (1, 2)]
+    h.move(0, 2)
+    assert h.legalMoves() == [(1, 0), (1, 2), (2, 0)]
+
+
+def test_legalMoves_locked():
+    h = Hanoi(4, 0, 2)
+    # readers do not wait for the lock unless a move is in progress
+    h._lock.acquire()
+    h.legalMoves(0)
+    h._state._table.begin(h._state._base)
+    with pytest.raises(TimeoutError):
+        h.legalMoves(0)
+
+
+def test_restore_happy_path():
+    h = Hanoi.restore(1000000, 4, 0, 2, 3, [0b1100, 0, 0b0011])
+    assert h._state.id == 1000000
+    assert h._state.numberOfMoves == 3
+    assert h._state.tower == [0b1100, 0, 0b0011]
+    h.move(0, 1)
+    assert h._state.numberOfMoves == 4
+
+
+def test_subscribe_happy_path():
+    h = Hanoi(4, 0, 2)
+    events = []
+
+    def observer(hanoi, numberOfMoves, moves):
+        assert hanoi._lock.locked()
+        events.append((numberOfMoves, moves))
+    h.subscribe(observer)
+    h.move(0, 1)
+    h.moves([(0, 2), (1, 2)])
+    with pytest.raises(ValueError):
+        h.moves([(0, 1), (0, 1)])
+    h.unsubscribe(observer)
+    h.move(0, 1)
+    assert events == [(0, [(0, 1)]), (1, [(0, 2), (1, 2)])]
+
+
+def test_subscribe_rollback():
+    h = Hanoi(4, 0, 2)
+
+    def observer(hanoi, numberOfMoves, moves):
+        raise OSError('disk full')
+    h.subscribe(observer)
+    with pytest.raises(OSError, match=r'disk full'):
+        h.move(0, 1)
+    with pytest.raises(OSError, match=r'disk full'):
+        h.moves([(0, 1), (0, 2)])
+    assert h._state.tower == [0b1111, 0, 0]
+    assert h._state.numberOfMoves == 0
+    assert not h._lock.locked()
+
+
+def test_towers_happy_path():
+    h = Hanoi(3, 0, 3, 4)
+    assert h.legalMoves() == [(0, 1), (0, 2), (0, 3)]
+    h.move(0, 1)
+    h.move(0, 2)
+    h.moves([(0, 3), (2, 3), (1, 3)])
+    assert h.isComplete()
+    assert h.getState().numberOfMoves == 5
+    with pytest.raises(ValueError, match=r'target 4 is invalid'):
+        h.move(3, 4)
+    with pytest.raises(ValueError, match=r'move 0: target 4 is invalid'):
+        h.moves([(3, 4)])
+
+
+def test_towers_hint():
+    h = Hanoi(10, 0, 3, 4)
+    distance, moves = h.hint(3)
+    assert distance == 49
+    for s, t in moves:
+        h.move(s, t)
+    assert h.hint()[0] == 46
+
+
+def test_discs_happy_path():
+    h = Hanoi(4096, 0, 2)
+    h.moves([(0, 1), (0, 2), (1, 2)])
+    with pytest.raises(ValueError, match=r'cannot put disc 3 on top of disc 1'):
+        h.move(0, 2)
+    s = h.getState()
+    assert s.numberOfDiscs == 4096
+    assert s.tower == ((1 << 4096) - 4, 0, 3)
+    assert s.numberOfMoves == 3
+    assert h.hint(1) == ((1 << 4096) - 4, [(0, 1)])
+    h.undo()
+    assert h.getState().tower == ((1 << 4096) - 4, 1, 2)
+
+
+def test_move_lock_wait():
+    contended = threading.Event()
+
+    class Lock(object):
+        '''A lock that signals when a caller has to wait for it'''
+
+        def __init__(self):
+            self._lock = threading.Lock()
+
+        def acquire(self, blocking=True, timeout=-1):
+            if self._lock.acquire(False):
+                return True
+            contended.set()
+            return blocking and self._lock.acquire(timeout=timeout)
+
+        def release(self):
+            self._lock.release()
+
+        def locked(self):
+            return self._lock.locked()
+
+    def waits():
+        m = re.search(r'^hanoi_lock_wait_seconds_count (\d+)$',
+                      Metrics.default.render(), re.M)
+        return int(m.group(1)) if m else 0
+
+    h = Hanoi(4, 0, 2)
+    h._lock = Lock()
+    before = waits()
+    # an uncontended move does not wait
+    h.move(0, 1)
+    assert waits() == before
+    h._lock.acquire()
+    t = threading.Thread(target=h.move, args=(0, 2))
+    t.start()
+    contended.wait()
+    h._lock.release()
+    t.join()
+    assert waits() == before + 1
+    assert h.getState().numberOfMoves == 2
@@ -0,0 +1,86 @@
+# MIT License
+#
+# Copyright (c) 2020 Christopher Friedt
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import pytest
+
+from hanoi import HashRing
+
+keys = range(10000)
+
+
+def test_lookup_happy_path():
+    r = HashRing([0, 1, 2])
+    assert len(r) == 3
+    assert r.nodes() == [0, 1, 2]
+    assert r.lookup('foo') in (0, 1, 2)
+    # lookups are stable
+    assert r.lookup('foo') == HashRing([2, 1, 0]).lookup('foo')
+
+
+def test_lookup_empty():
+    with pytest.raises(ValueError, match=r'the ring is empty'):
+        HashRing().lookup(42)
+
+
+def test_replicas_zero():
+    with pytest.raises(ValueError, match=r'replicas 0 is invalid'):
+        HashRing(replicas=0)
+
+
+def test_add_twice():
+    r = HashRing([0])
+    with pytest.raises(ValueError, match=r'node 0 is already in the ring'):
+        r.add(0)
+
+
+def test_remove_missing():
+    r = HashRing([0])
+    with pytest.raises(ValueError, match=r'node 1 is not in the ring'):
+        r.remove(1)
+
+
+def test_balance():
+    r = HashRing(range(4))
+    counts = [0] * 4
+    for k in keys:
+        counts[r.lookup(k)] += 1
+    for c in counts:
+        assert 0.15 * len(keys) < c < 0.35 * len(keys)
+
+
+def test_add_moves_1_over_n():
+    r = HashRing(range(4))
+    before = [r.lookup(k) for k in keys]
+    r.add(4)
+    after = [r.lookup(k) for k in keys]
+    moved = [(b, a) for b, a in zip(before, after) if b != a]
+    # keys only ever move to the new node
+    assert all(a == 4 for _, a in moved)
+    assert 0.1 * len(keys) < len(moved) < 0.3 * len(keys)
+
+
+def test_remove_moves_only_its_keys():
+    r = HashRing(range(5))
+    before = [r.lookup(k) for k in keys]
+    r.remove(2)
+    after = [r.lookup(k) for k in keys]
+    assert 2 not in after
+    assert all(b == a for b, a in zip(before, after) if b != 2)
@@ -0,0 +1,85 @@
+# MIT License
+#
+# Copyright (c) 2020 Christopher Friedt
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import pytest
+
+from hanoi import IdempotencyCache
+
+
+def test_begin_end():
+    c = IdempotencyCache(4)
+    assert c.begin((1, 'a')) is None
+    # the request is still being executed
+    assert c.begin((1, 'a')) is IdempotencyCache.PENDING
+    c.end((1, 'a'), (200, None, {}))
+    assert c.begin((1, 'a')) == (200, None, {})
+    # keys of other sessions are distinct
+    assert c.begin((2, 'a')) is None
+    assert len(c) == 2
+
+
+def test_abort():
+    c = IdempotencyCache(4)
+    assert c.begin('a') is None
+    c.abort('a')
+    # e.g. a retry after a timeout is executed again
+    assert c.begin('a') is None
+    assert len(c) == 1
+
+
+def test_full():
+    c = IdempotencyCache(2)
+    for key in 'abc':
+        assert c.begin(key) is None
+        c.end(key, key)
+    # the oldest outcome is dropped
+    assert c.begin('b') == 'b'
+    assert c.begin('c') == 'c'
+    assert len(c) == 2
+    # an outcome that was dropped while pending is not recorded
+    c = IdempotencyCache(1)
+    c.begin('a')
+    c.begin('b')
+    c.end('a', 'a')
+    assert c.begin('b') is IdempotencyCache.PENDING
+    assert len(c) == 1
+
+
+def test_fingerprint():
+    c = IdempotencyCache(4)
+    assert c.begin('a', 1) is None
+    # the key was used for a different request
+    assert c.begin('a', 2) is IdempotencyCache.MISMATCH
+    assert c.begin('a', 1) is IdempotencyCache.PENDING
+    c.end('a', 'a')
+    assert c.begin('a', 1) == 'a'
+    assert c.begin('a', 2) is IdempotencyCache.MISMATCH
+
+
+def test_disabled():
+    c = IdempotencyCache(0)
+    assert c.begin('a') is None
+    c.end('a', 'a')
+    assert c.begin('a') is None
+    assert len(c) == 0
+    with pytest.raises(ValueError, match=r'capacity -1 is invalid'):
+        IdempotencyCache(-1)
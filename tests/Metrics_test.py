@@ -0,0 +1,140 @@
+# MIT License
+#
+# Copyright (c) 2020 Christopher Friedt
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import asyncio
+import threading
+import time
+
+from hanoi import Hanoi
+from hanoi import Metrics
+
+
+def test_count():
+    m = Metrics()
+    m.count('hanoi_things_total')
+    m.count('hanoi_things_total')
+    m.count('hanoi_stuff_total', 'kind="a"')
+    assert m.render() == (
+        '# TYPE hanoi_stuff_total counter\n'
+        'hanoi_stuff_total{kind="a"} 1\n'
+        '# TYPE hanoi_things_total counter\n'
+        'hanoi_things_total 2\n')
+
+
+def test_observe():
+    m = Metrics()
+    m.observe('hanoi_wait_seconds', 0.0)
+    m.observe('hanoi_wait_seconds', 0.003)
+    m.observe('hanoi_wait_seconds', 20.0)
+    lines = m.render().split('\n')
+    assert lines[0] == '# TYPE hanoi_wait_seconds histogram'
+    assert 'hanoi_wait_seconds_bucket{le="1e-05"} 1' in lines
+    assert 'hanoi_wait_seconds_bucket{le="0.0025"} 1' in lines
+    assert 'hanoi_wait_seconds_bucket{le="0.005"} 2' in lines
+    assert 'hanoi_wait_seconds_bucket{le="10.0"} 2' in lines
+    assert 'hanoi_wait_seconds_bucket{le="+Inf"} 3' in lines
+    assert 'hanoi_wait_seconds_sum 20.003' in lines
+    assert 'hanoi_wait_seconds_count 3' in lines
+    assert len(lines) == len(Metrics.BUCKETS) + 5
+
+
+def test_timed():
+    m = Metrics()
+
+    @m.timed('add')
+    def add(a, b):
+        '''Add a and b'''
+        return a + b
+
+    @m.timed('fail')
+    def fail():
+        raise ValueError('oops')
+
+    @m.timed('sleep')
+    async def sleep(seconds):
+        await asyncio.sleep(seconds)
+        return seconds
+
+    assert add(1, b=2) == 3
+    assert add.__doc__ == 'Add a and b'
+    try:
+        fail()
+    except ValueError:
+        pass
+    assert asyncio.run(sleep(0.01)) == 0.01
+    s = m.render()
+    assert 'hanoi_request_seconds_count{operation="add"} 1\n' in s
+    assert 'hanoi_request_seconds_count{operation="fail"} 1\n' in s
+    assert 'hanoi_request_seconds_bucket{operation="sleep",le="0.005"} 0\n' in s
+    assert 'hanoi_request_seconds_bucket{operation="sleep",le="0.025"} 1\n' in s
+
+
+def test_error():
+    m = Metrics()
+    m.error(ValueError('source 1 is empty'))
+    m.error(ValueError('source 2 is empty'))
+    m.error(KeyError(42))
+    m.error('a "quoted"\nmessage')
+    s = m.render()
+    assert 'hanoi_errors_total{error="ValueError: source N is empty"} 2\n' in s
+    assert 'hanoi_errors_total{error="KeyError: N"} 1\n' in s
+    assert 'hanoi_errors_total{error="a \\"quoted\\"\\nmessage"} 1\n' in s
+    for i in range(Metrics.MAX_CLASSES):
+        m.error(ValueError('error {}'.format('x' * i)))
+    # 3 classes were seen before
+    assert 'hanoi_errors_total{error="other"} 3\n' in m.render()
+
+
+def test_threads():
+    m = Metrics()
+
+    def count():
+        for _ in range(1000):
+            m.count('hanoi_things_total')
+
+    # more threads than shards are kept for, one after another
+    for _ in range(4):
+        threads = [threading.Thread(target=count) for _ in range(50)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    assert 'hanoi_things_total 200000\n' in m.render()
+    # exited threads have been folded
+    assert m._shards == []
+
+
+def test_lock_wait():
+    h = Hanoi(4, 0, 2)
+    before = Metrics.default._total().histograms.get((Metrics.LOCK_WAIT, ''))
+    before = list(before) if before else [0] * (len(Metrics.BUCKETS) + 2)
+    h._lock.acquire()
+    t = threading.Thread(target=h.move, args=(0, 1))
+    t.start()
+    time.sleep(0.05)
+    h._lock.release()
+    t.join()
+    h.move(1, 2)
+    after = Metrics.default._total().histograms[(Metrics.LOCK_WAIT, '')]
+    # one move waited for about 50 ms, the other did not wait
+    assert sum(after[:-1]) - sum(before[:-1]) == 1
+    assert sum(after[11:-1]) - sum(before[11:-1]) == 1
@@ -0,0 +1,73 @@
+# MIT License
+#
+# Copyright (c) 2020 Christopher Friedt
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import pytest
+
+from hanoi import ResponseCache
+
+
+def test_get_put():
+    c = ResponseCache(4)
+    assert c.get((1, 'session', 'application/json'), 0) is None
+    c.put((1, 'session', 'application/json'), 0, b'{}')
+    assert c.get((1, 'session', 'application/json'), 0) == b'{}'
+    # another version, e.g. after a move
+    assert c.get((1, 'session', 'application/json'), 1) is None
+    c.put((1, 'session', 'application/json'), 1, b'{"numberOfMoves":1}')
+    assert c.get((1, 'session', 'application/json'), 0) is None
+    assert c.get((1, 'session', 'application/json'), 1) == b'{"numberOfMoves":1}'
+    assert len(c) == 1
+
+
+def test_put_full():
+    c = ResponseCache(2)
+    c.put(1, 0, b'1')
+    c.put(2, 0, b'2')
+    c.put(1, 1, b'1')
+    c.put(3, 0, b'3')
+    # the oldest entry is dropped
+    assert c.get(2, 0) is None
+    assert c.get(1, 1) == b'1'
+    assert c.get(3, 0) == b'3'
+    assert len(c) == 2
+
+
+def test_disabled():
+    c = ResponseCache(0)
+    c.put(1, 0, b'1')
+    assert c.get(1, 0) is None
+    with pytest.raises(ValueError, match=r'capacity -1 is invalid'):
+        ResponseCache(-1)
+
+
+def test_etag_matches():
+    etag = ResponseCache.etag(0xabc, 42, 7, 'session.json')
+    assert etag == 'W/"00000abc-42-7.session.json"'
+    assert ResponseCache.matches('W/"00000abc-42-7.session.json"', etag)
+    assert ResponseCache.matches('"00000abc-42-7.session.json"', etag)
+    assert ResponseCache.matches('"1-0", W/"00000abc-42-7.session.json"', etag)
+    assert ResponseCache.matches('*', etag)
+    assert not ResponseCache.matches('W/"00000abc-42-6.session.json"', etag)
+    assert not ResponseCache.matches('W/"00000abc-42-7.session.msgpack"', etag)
+    assert not ResponseCache.matches('W/"00000abd-42-7.session.json"', etag)
+    assert not ResponseCache.matches(None, etag)
+    assert not ResponseCache.matches('', etag)
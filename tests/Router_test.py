@@ -0,0 +1,284 @@
+# MIT License
+#
+# Copyright (c) 2020 Christopher Friedt
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import http.client
+import importlib
+import json
+import socket
+import socketserver
+import threading
+import time
+from multiprocessing import Process
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+import pytest
+import requests
+
+from hanoi import HanoiState
+from hanoi import Router
+from hanoi import SessionStore
+from hanoi import SessionTable
+
+host = 'localhost'
+# router port, followed by one port per backend
+port = 5100
+nodes = [1, 2]
+timeout = 3
+backends = []
+router = None
+
+
+class ThreadingServer(socketserver.ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_request(self, *args):
+        pass
+
+
+def serve(node, port):
+    # hanoi.app is also the name of the WSGI app object in the hanoi package
+    app = importlib.import_module('hanoi.app')
+    HanoiState.setNode(node)
+    app.sessions = SessionStore()
+    app.app.run(port=port)
+
+
+def wait(port):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection((host, port), timeout=timeout).close()
+            return
+        except OSError:
+            time.sleep(0.01)
+
+
+def url(path):
+    return 'http://{}:{}/v1{}'.format(host, port, path)
+
+
+def setup_module(module):
+    global router
+    for i, node in enumerate(nodes):
+        p = Process(target=serve, args=(node, port + 1 + i))
+        p.start()
+        backends.append(p)
+    for i in range(len(nodes)):
+        wait(port + 1 + i)
+    r = Router({node: 'http://{}:{}'.format(host, port + 1 + i)
+                for i, node in enumerate(nodes)})
+    router = make_server(host, port, r, server_class=ThreadingServer,
+                         handler_class=QuietHandler)
+    threading.Thread(target=router.serve_forever, daemon=True).start()
+
+
+def teardown_module(module):
+    router.shutdown()
+    router.server_close()
+    for p in backends:
+        p.terminate()
+        p.join()
+
+
+def test_parse():
+    assert Router.parse('0=http://a:1, 7=http://b:2') == {
+        0: 'http://a:1', 7: 'http://b:2'}
+    with pytest.raises(ValueError, match=r'backend 0 is invalid'):
+        Router.parse('0')
+
+
+def test_addBackend_invalid():
+    with pytest.raises(ValueError, match=r'url ftp://a is invalid'):
+        Router({0: 'ftp://a'})
+
+
+def test_owner():
+    r = Router({1: 'http://a:1'})
+    assert r.owner(1 << SessionTable.NODE | 42) == 1
+    with pytest.raises(KeyError):
+        r.owner(2 << SessionTable.NODE)
+
+
+def test_sessions_are_spread_and_routed():
+    ids = []
+    for i in range(8):
+        r = requests.post(url('/sessions'), params={'numberOfDiscs': 3},
+                          timeout=timeout)
+        assert r.status_code == 200
+        ids.append(r.json())
+    # both backends own sessions
+    assert set(SessionTable.node(id) for id in ids) == set(nodes)
+    for id in ids:
+        r = requests.put(url('/sessions/{}/move'.format(id)),
+                         params={'fromTower': 0, 'toTower': 2}, timeout=timeout)
+        assert r.status_code == 200
+        r = requests.get(url('/sessions/{}'.format(id)), timeout=timeout)
+        assert r.json()['sessionId'] == id
+        assert r.json()['numberOfMoves'] == 1
+    r = requests.get(url('/sessions'), params={'limit': 5}, timeout=timeout)
+    assert [s['sessionId'] for s in r.json()] == sorted(ids)[:5]
+    r = requests.get(url('/sessions'), headers={'Accept': 'application/x-ndjson'},
+                     timeout=timeout)
+    assert len(r.text.splitlines()) >= len(ids)
+
+
+def test_client_affinity():
+    ids = []
+    for i in range(4):
+        r = requests.post(url('/sessions'), headers={'X-Hanoi-Client': 'alice'},
+                          timeout=timeout)
+        ids.append(r.json())
+    assert len(set(SessionTable.node(id) for id in ids)) == 1
+
+
+def test_unknown_node():
+    r = requests.get(url('/sessions/{}'.format(9 << SessionTable.NODE)),
+                     timeout=timeout)
+    assert r.status_code == 404
+    assert 'has no backend' in r.json()['message']
+
+
+def test_stateless():
+    r = requests.get(url('/solutions/3'), timeout=timeout)
+    assert r.status_code == 200
+    assert len(r.json()) == 7
+
+
+def test_events_are_relayed():
+    r = requests.post(url('/sessions'), params={'numberOfDiscs': 1}, timeout=timeout)
+    id = r.json()
+    stream = requests.get(url('/sessions/{}/events'.format(id)), stream=True,
+                          timeout=timeout)
+    assert stream.status_code == 200
+    assert stream.headers['Content-Type'].startswith('text/event-stream')
+    # the router is an HTTP/1.0 server, so the stream is not chunked
+    lines = stream.iter_lines(chunk_size=1)
+    assert next(lines) == b'event: session'
+    requests.put(url('/sessions/{}/move'.format(id)),
+                 params={'fromTower': 0, 'toTower': 2}, timeout=timeout)
+    # the rest of the session event, then the move
+    assert b'event: move' in [next(lines) for _ in range(4)]
+    stream.close()
+    r = requests.get(url('/sessions/{}/events'.format(id + 1000)), timeout=timeout)
+    assert r.status_code == 201
+
+
+def test_sessions_ndjson_merged():
+    ids = []
+    for i in range(6):
+        r = requests.post(url('/sessions'), timeout=timeout)
+        ids.append(r.json())
+    assert set(SessionTable.node(id) for id in ids) == set(nodes)
+    after = min(ids) - 1
+    r = requests.get(url('/sessions'), params={'after': after},
+                     headers={'Accept': 'application/x-ndjson'}, timeout=timeout)
+    assert r.status_code == 200
+    listed = [json.loads(line)['sessionId'] for line in r.content.splitlines()]
+    assert listed == sorted(listed)
+    assert set(ids) <= set(listed)
+    r = requests.get(url('/sessions'), params={'after': after, 'limit': 4},
+                     headers={'Accept': 'application/x-ndjson'}, timeout=timeout)
+    assert [json.loads(line)['sessionId'] for line in r.content.splitlines()] == listed[:4]
+
+
+def test_solution_relayed():
+    r = requests.get(url('/solutions/16'), timeout=timeout)
+    assert r.status_code == 200
+    assert len(r.json()) == (1 << 16) - 1
+
+
+def test_forward_retry():
+    # a backend that closes every connection without responding
+    requests_ = []
+    server = socket.socket()
+    server.bind((host, 0))
+    server.listen()
+
+    def accept():
+        while True:
+            try:
+                c, _ = server.accept()
+            except OSError:
+                return
+            data = b''
+            while b'\r\n\r\n' not in data:
+                data += c.recv(4096)
+            requests_.append(data.split(b' ', 1)[0])
+            c.close()
+
+    threading.Thread(target=accept, daemon=True).start()
+    r = Router({3: 'http://{}:{}'.format(host, server.getsockname()[1])})
+    try:
+        # the request may have been served, so it is not sent again
+        with pytest.raises(http.client.RemoteDisconnected):
+            r._forward(3, 'POST', '/v1/sessions', {}, None)
+        assert requests_ == [b'POST']
+        del requests_[:]
+        with pytest.raises(http.client.RemoteDisconnected):
+            r._forward(3, 'PUT', '/v1/sessions/1/move', {'Idempotency-Key': 'a'}, None)
+        assert requests_ == [b'PUT', b'PUT']
+        del requests_[:]
+        with pytest.raises(http.client.RemoteDisconnected):
+            r._forward(3, 'GET', '/v1/sessions', {}, None)
+        assert requests_ == [b'GET', b'GET']
+    finally:
+        server.close()
+
+
+def test_forward_idle_closed():
+    # a backend that closes each connection after one response
+    requests_ = []
+    closed = threading.Event()
+    server = socket.socket()
+    server.bind((host, 0))
+    server.listen()
+
+    def accept():
+        while True:
+            try:
+                c, _ = server.accept()
+            except OSError:
+                return
+            data = b''
+            while b'\r\n\r\n' not in data:
+                data += c.recv(4096)
+            requests_.append(data.split(b' ', 1)[0])
+            c.sendall(b'HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\n{}')
+            c.close()
+            closed.set()
+
+    threading.Thread(target=accept, daemon=True).start()
+    r = Router({3: 'http://{}:{}'.format(host, server.getsockname()[1])})
+    try:
+        c, response = r._forward(3, 'GET', '/v1/sessions', {}, None)
+        assert response.read() == b'{}'
+        # wait for the backend to close the idle connection
+        assert closed.wait(timeout)
+        time.sleep(0.1)
+        # the POST is not sent over the closed connection
+        c, response = r._forward(3, 'POST', '/v1/sessions', {}, None)
+        assert response.status == 200
+        assert response.read() == b'{}'
+        assert requests_ == [b'GET', b'POST']
+    finally:
+        server.close()
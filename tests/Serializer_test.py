@@ -0,0 +1,125 @@
+# MIT License
+#
+# Copyright (c) 2020 Christopher Friedt
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import json
+import pytest
+
+from hanoi import HanoiState
+from hanoi import Serializer
+
+
+def test_session():
+    h = HanoiState(64, 1, 0)
+    d = Serializer.session(h)
+    assert d == {'sessionId': h.id, 'numberOfDiscs': 64, 'fromTower': 1,
+                 'toTower': 0, 'numberOfMoves': 0, 'towers': [0, (1 << 64) - 1, 0],
+                 'efficiency': 1.0}
+
+
+def test_session_efficiency():
+    h = HanoiState(2, 0, 2)
+    # 0 -> 1 and back is a wasted pair of moves
+    h.tower = [0b11, 0, 0]
+    h.numberOfMoves = 2
+    assert Serializer.session(h)['efficiency'] == 0.0
+    # 0 -> 2, 2 -> 1, 0 -> 2, where 0 -> 1, 0 -> 2 would have done
+    h.tower = [0, 0b01, 0b10]
+    h.numberOfMoves = 3
+    assert Serializer.session(h)['efficiency'] == 2 / 3
+    h = HanoiState(2, 0, 3, numberOfTowers=4)
+    assert 'efficiency' not in Serializer.session(h)
+
+
+def test_session_discs():
+    h = HanoiState(128, 0, 2)
+    h.tower = [(1 << 128) - 2, 0, 1]
+    h.numberOfMoves = 1
+    d = Serializer.session(h)
+    assert d['towers'] == ['f' * 31 + 'e', '0', '1']
+    assert d['numberOfDiscs'] == 128
+    assert d['efficiency'] == 1.0
+
+
+def test_error():
+    assert Serializer.error(201, ValueError('source 1 is empty')) == {
+        'code': 201, 'message': 'source 1 is empty'}
+
+
+def test_error_quotes():
+    # messages are escaped properly
+    b = Serializer.encode(Serializer.error(201, 'a "quoted" message'))
+    assert json.loads(b.decode()) == {'code': 201, 'message': 'a "quoted" message'}
+
+
+def test_negotiate():
+    assert Serializer.negotiate(None) == Serializer.JSON
+    assert Serializer.negotiate('*/*') == Serializer.JSON
+    assert Serializer.negotiate('application/json') == Serializer.JSON
+    assert Serializer.negotiate('application/msgpack') == Serializer.MSGPACK
+    assert Serializer.negotiate(
+        'application/x-msgpack, application/json;q=0.5') == Serializer.MSGPACK
+
+
+def test_encode_json():
+    assert Serializer.encode({'towers': [15, 0, 0], 'complete': False}) == \
+        b'{"towers":[15,0,0],"complete":false}'
+
+
+def test_encode_msgpack_scalars():
+    def p(v):
+        return Serializer.encode(v, Serializer.MSGPACK)
+    assert p(None) == b'\xc0'
+    assert p(True) == b'\xc3'
+    assert p(False) == b'\xc2'
+    assert p(0) == b'\x00'
+    assert p(127) == b'\x7f'
+    assert p(128) == b'\xcc\x80'
+    assert p(256) == b'\xcd\x01\x00'
+    assert p(1 << 16) == b'\xce\x00\x01\x00\x00'
+    assert p((1 << 64) - 1) == b'\xcf' + b'\xff' * 8
+    assert p(-1) == b'\xff'
+    assert p(-32) == b'\xe0'
+    assert p(-33) == b'\xd0\xdf'
+    assert p(-129) == b'\xd1\xff\x7f'
+    assert p(-(1 << 63)) == b'\xd3\x80' + b'\x00' * 7
+    assert p(1.0) == b'\xcb\x3f\xf0' + b'\x00' * 6
+    assert p('abc') == b'\xa3abc'
+    assert p('x' * 32) == b'\xd9\x20' + b'x' * 32
+    assert p('x' * 256) == b'\xda\x01\x00' + b'x' * 256
+
+
+def test_encode_msgpack_containers():
+    def p(v):
+        return Serializer.encode(v, Serializer.MSGPACK)
+    assert p([1, 2]) == b'\x92\x01\x02'
+    assert p((1, 2)) == b'\x92\x01\x02'
+    assert p(list(range(16))) == b'\xdc\x00\x10' + bytes(range(16))
+    assert p({'a': [None]}) == b'\x81\xa1a\x91\xc0'
+    assert p({str(i): 0 for i in range(16)})[:3] == b'\xde\x00\x10'
+
+
+def test_encode_msgpack_invalid():
+    with pytest.raises(ValueError, match=r'does not fit in 64 bits'):
+        Serializer.encode(1 << 64, Serializer.MSGPACK)
+    with pytest.raises(TypeError, match=r'cannot pack bytes'):
+        Serializer.encode(b'1.5', Serializer.MSGPACK)
@@ -0,0 +1,134 @@
+# MIT License
+#
+# Copyright (c) 2020 Christopher Friedt
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import json
+
+from hanoi import Hanoi
+from hanoi import SessionEvents
+from hanoi import SessionStore
+
+
+def parse(event):
+    '''Parse a Server-Sent Event into (name, id, value)'''
+    fields = dict(line.split(': ', 1)
+                  for line in event.decode('utf-8').strip().split('\n'))
+    return fields['event'], int(fields['id']), json.loads(fields['data'])
+
+
+def test_event():
+    assert SessionEvents.event('move', {'numberOfMoves': 1}, 1) == \
+        b'event: move\nid: 1\ndata: {"numberOfMoves":1}\n\n'
+
+
+def test_subscribe():
+    events = SessionEvents()
+    h = Hanoi(3, 0, 2)
+    h.move(0, 2)
+    received = []
+    name, id, value = parse(events.subscribe(h, received.append))
+    assert name == 'session'
+    assert id == 1
+    assert value['towers'] == [6, 0, 1]
+    assert events.subscribers(h._state.id) == 1
+    h.move(0, 1)
+    h.moves([(2, 1), (0, 2)])
+    assert [parse(e) for e in received] == [
+        ('move', 2, {'numberOfMoves': 2, 'moves': [[0, 1]]}),
+        ('move', 4, {'numberOfMoves': 4, 'moves': [[2, 1], [0, 2]]}),
+    ]
+
+
+def test_complete():
+    events = SessionEvents()
+    h = Hanoi(1, 0, 2)
+    received = []
+    events.subscribe(h, received.append)
+    h.move(0, 2)
+    h.move(2, 1)
+    assert [parse(e)[0] for e in received] == [
+        'move', 'complete', 'move', 'complete']
+    assert parse(received[1])[2] == {'numberOfMoves': 1, 'complete': True}
+    assert parse(received[3])[2] == {'numberOfMoves': 2, 'complete': False}
+
+
+def test_fan_out():
+    events = SessionEvents()
+    h = Hanoi(3, 0, 2)
+    received = [[] for _ in range(3)]
+    for r in received:
+        events.subscribe(h, r.append)
+    # a single observer serves every subscriber
+    assert len(h._observers) == 1
+    h.move(0, 2)
+    assert received[0] == received[1] == received[2]
+    assert received[0][0] is received[1][0]
+
+
+def test_unsubscribe():
+    events = SessionEvents()
+    h = Hanoi(3, 0, 2)
+    a = []
+    b = []
+    events.subscribe(h, a.append)
+    events.subscribe(h, b.append)
+    events.unsubscribe(h, a.append)
+    assert events.subscribers(h._state.id) == 1
+    h.move(0, 2)
+    assert len(a) == 0
+    assert len(b) == 1
+    events.unsubscribe(h, b.append)
+    assert events.subscribers(h._state.id) == 0
+    assert h._observers == ()
+
+
+def test_drop():
+    events = SessionEvents()
+    h = Hanoi(3, 0, 2)
+    received = []
+
+    def slow(event):
+        return False
+
+    def broken(event):
+        raise RuntimeError()
+
+    events.subscribe(h, slow)
+    events.subscribe(h, broken)
+    events.subscribe(h, received.append)
+    # subscribers never roll back a move
+    h.move(0, 2)
+    assert h.getState().numberOfMoves == 1
+    assert len(received) == 1
+    assert events.subscribers(h._state.id) == 1
+
+
+def test_watched_sessions_are_not_evicted():
+    events = SessionEvents()
+    store = SessionStore(maxSessions=1)
+    h = store.create(3, 0, 2)
+    received = []
+    events.subscribe(h, received.append)
+    store.create(3, 0, 2)
+    assert h._state.id in store._sessions
+    events.unsubscribe(h, received.append)
+    store.create(3, 0, 2)
+    assert h._state.id not in store._sessions
@@ -0,0 +1,155 @@
+# MIT License
+#
+# Copyright (c) 2020 Christopher Friedt
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import random
+
+from hanoi.SessionIndex import SessionIndex
+from hanoi.SessionIndex import SortedIds
+
+
+def make_index():
+    x = SessionIndex()
+    for id in range(10):
+        x.add(id, 3 + id % 2, id % 3 == 0)
+    return x
+
+
+def test_query_all():
+    x = make_index()
+    assert len(x) == 10
+    assert list(x.query()) == list(range(10))
+    assert list(x.query(6)) == [7, 8, 9]
+
+
+def test_addMany():
+    x = SessionIndex()
+    x.addMany([(id, 3 + id % 2, id % 3 == 0) for id in range(10)])
+    assert list(x.query()) == list(make_index().query())
+    assert list(x.query(complete=True)) == [0, 3, 6, 9]
+    assert list(x.query(numberOfDiscs=4)) == [1, 3, 5, 7, 9]
+
+
+def test_query_complete():
+    x = make_index()
+    assert list(x.query(complete=True)) == [0, 3, 6, 9]
+    assert list(x.query(complete=False)) == [1, 2, 4, 5, 7, 8]
+    assert list(x.query(3, complete=True)) == [6, 9]
+
+
+def test_query_numberOfDiscs():
+    x = make_index()
+    assert list(x.query(numberOfDiscs=4)) == [1, 3, 5, 7, 9]
+    assert list(x.query(numberOfDiscs=4, complete=True)) == [3, 9]
+    assert list(x.query(numberOfDiscs=3, complete=False)) == [2, 4, 8]
+    assert list(x.query(numberOfDiscs=5)) == []
+
+
+def test_setComplete():
+    x = make_index()
+    x.setComplete(1, True)
+    x.setComplete(0, False)
+    x.setComplete(0, False)
+    assert list(x.query(complete=True)) == [1, 3, 6, 9]
+
+
+def test_remove():
+    x = make_index()
+    x.remove(3, 4)
+    x.remove(42, 4)
+    assert len(x) == 9
+    assert 3 not in list(x.query())
+    assert list(x.query(complete=True)) == [0, 6, 9]
+    assert list(x.query(numberOfDiscs=4)) == [1, 5, 7, 9]
+
+
+def test_add_out_of_order():
+    x = SessionIndex()
+    x.add(5, 4)
+    x.add(2, 4)
+    x.add(5, 4)
+    assert list(x.query()) == [2, 5]
+
+
+def test_query_chunks():
+    x = SessionIndex()
+    n = 3 * SessionIndex.CHUNK + 1
+    for id in range(n):
+        x.add(id, 4)
+    q = x.query()
+    assert next(q) == 0
+    # concurrent changes are seen by the next chunk
+    x.remove(SessionIndex.CHUNK + 1, 4)
+    x.add(n, 4)
+    ids = list(q)
+    assert len(ids) == n - 1
+    assert ids[-1] == n
+
+
+def test_SortedIds():
+    merge = SortedIds.MERGE
+    SortedIds.MERGE = 8
+    try:
+        rng = random.Random(1)
+        x = SortedIds()
+        model = set()
+        for i in range(5000):
+            id = rng.randrange(1000)
+            if rng.random() < 0.5:
+                x.add(id)
+                model.add(id)
+            else:
+                x.remove(id)
+                model.discard(id)
+            assert len(x) == len(model)
+            if i % 100 == 0:
+                after = rng.randrange(-1, 1000)
+                expected = sorted(id for id in model if id > after)
+                assert x.scan(after, 10) == expected[:10]
+                assert x.scan(after, 2000) == expected
+        assert all((id in x) == (id in model) for id in range(1000))
+    finally:
+        SortedIds.MERGE = merge
+
+
+def test_SortedIds_remove_oldest():
+    # e.g. the least-recently used sessions are evicted first
+    x = SortedIds()
+    n = 4 * SortedIds.MERGE
+    for id in range(n):
+        x.add(id)
+    for id in range(n - 10):
+        x.remove(id)
+    # tombstones were dropped along the way
+    assert len(x._ids) < n
+    assert len(x) == 10
+    assert x.scan(-1, 100) == list(range(n - 10, n))
+
+
+def test_query_incomplete_index():
+    x = make_index()
+    x.setComplete(1, True)
+    x.setComplete(3, False)
+    assert list(x.query(complete=False)) == [2, 3, 4, 5, 7, 8]
+    assert list(x.query(complete=False, numberOfDiscs=4)) == [3, 5, 7]
+    x.remove(3, 4)
+    assert list(x.query(complete=False)) == [2, 4, 5, 7, 8]
@@ -0,0 +1,552 @@
+# MIT License
+#
+# Copyright (c) 2020 Christopher Friedt
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import multiprocessing
+import os
+import pytest
+import time
+
+from hanoi import FileSessionStore
+from hanoi import Hanoi
+from hanoi import HanoiState
+from hanoi import SessionStore
+from hanoi import SharedSessionStore
+
+
+def test_SessionStore_happy_path():
+    store = SessionStore()
+    h = store.create(4, 0, 2)
+    id = h._state.id
+    assert id in store
+    assert store[id] is h
+    assert len(store) == 1
+    assert store.values() == [h]
+    store.close()
+
+
+def test_SessionStore_createMany():
+    store = SessionStore(maxSessions=3)
+    hs = store.createMany([(4, 0, 2, 3)] * 4 + [(3, 0, 3, 4)])
+    ids = [h._state.id for h in hs]
+    assert ids == list(range(ids[0], ids[0] + 5))
+    # evicted in bulk as well
+    assert len(store) == 3
+    assert store.evictions == 2
+    assert [h._state.id for h in store.query()] == ids[2:]
+    h = store[ids[4]]
+    h.move(0, 3)
+    assert [h._state.id for h in store.query(complete=False)] == ids[2:]
+    store.close()
+
+
+def test_SessionStore_missing():
+    store = SessionStore()
+    with pytest.raises(KeyError):
+        store[42]
+
+
+def test_FileSessionStore_createMany(tmp_path):
+    store = FileSessionStore(str(tmp_path))
+    hs = store.createMany([(4, 0, 2, 3), (3, 0, 3, 4)])
+    hs[1].move(0, 1)
+    ids = [h._state.id for h in hs]
+    store.close()
+    store = FileSessionStore(str(tmp_path))
+    assert store[ids[0]]._state.tower == [0b1111, 0, 0]
+    assert store[ids[1]]._state.tower == [0b110, 0b001, 0, 0]
+    store.close()
+
+
+def test_SharedSessionStore_createMany(tmp_path):
+    store = SharedSessionStore(str(tmp_path / 'shared'), 16)
+    hs = store.createMany([(4, 0, 2, 3)] * 3)
+    ids = [h._state.id for h in hs]
+    assert ids == [0, 1, 2]
+    hs[2].move(0, 1)
+    assert store[2].getState().tower == (0b1110, 0b0001, 0)
+    assert len(store) == 3
+    store.close()
+
+
+def test_FileSessionStore_snapshotInterval_zero(tmp_path):
+    with pytest.raises(ValueError, match=r'snapshotInterval 0 is invalid'):
+        FileSessionStore(str(tmp_path), 0)
+
+
+def test_FileSessionStore_recover_log(tmp_path):
+    store = FileSessionStore(str(tmp_path))
+    a = store.create(4, 0, 2)
+    b = store.create(3, 1, 0)
+    a.move(0, 1)
+    a.moves([(0, 2), (1, 2)])
+    b.move(1, 0)
+    store.close()
+    assert not os.path.exists(os.path.join(str(tmp_path), 'snapshot'))
+
+    store = FileSessionStore(str(tmp_path))
+    assert len(store) == 2
+    s = store[a._state.id]._state
+    assert s.numberOfDiscs == 4
+    assert s.numberOfMoves == 3
+    assert s.tower == a._state.tower
+    s = store[b._state.id]._state
+    assert (s.numberOfDiscs, s.source, s.target) == (3, 1, 0)
+    assert s.numberOfMoves == 1
+    assert s.tower == b._state.tower
+    # replaying the log writes a snapshot
+    assert os.path.exists(os.path.join(str(tmp_path), 'snapshot'))
+    # new ids do not collide with recovered ones
+    assert HanoiState.getCounter() > b._state.id
+    store.close()
+
+
+def test_FileSessionStore_recover_snapshot_and_tail(tmp_path):
+    store = FileSessionStore(str(tmp_path))
+    h = store.create(4, 0, 2)
+    h.move(0, 1)
+    store.compact()
+    h.move(0, 2)
+    # failed moves are not logged
+    with pytest.raises(ValueError):
+        h.moves([(1, 2), (0, 2)])
+    store.close()
+    with open(os.path.join(str(tmp_path), 'wal')) as f:
+        assert f.read() == 'm {} 1 0 2\n'.format(h._state.id)
+
+    store = FileSessionStore(str(tmp_path))
+    s = store[h._state.id]._state
+    assert s.numberOfMoves == 2
+    assert s.tower == [0b1100, 0b0001, 0b0010]
+    # recovered sessions are still logged
+    store[h._state.id].move(1, 2)
+    store.close()
+
+    store = FileSessionStore(str(tmp_path))
+    assert store[h._state.id]._state.tower == [0b1100, 0, 0b0011]
+    store.close()
+
+
+def test_FileSessionStore_undo(tmp_path):
+    # undoing a move is logged like any other move
+    store = FileSessionStore(str(tmp_path))
+    h = store.create(4, 0, 2)
+    h.moves([(0, 1), (0, 2)])
+    h.undo()
+    store.close()
+
+    store = FileSessionStore(str(tmp_path))
+    s = store[h._state.id]._state
+    assert s.numberOfMoves == 3
+    assert s.tower == [0b1110, 0b0001, 0]
+    store.close()
+
+
+def test_FileSessionStore_replay_idempotent(tmp_path):
+    store = FileSessionStore(str(tmp_path))
+    h = store.create(4, 0, 2)
+    h.move(0, 1)
+    store.close()
+    # simulate a crash after a snapshot was written but before the old
+    # log was removed
+    path = str(tmp_path)
+    with open(os.path.join(path, 'wal')) as f:
+        log = f.read()
+    store = FileSessionStore(path)
+    store.close()
+    with open(os.path.join(path, 'wal.1'), 'w') as f:
+        f.write(log)
+    # and a partially written event
+    with open(os.path.join(path, 'wal'), 'w') as f:
+        f.write('m {} 1 0'.format(h._state.id))
+
+    store = FileSessionStore(path)
+    s = store[h._state.id]._state
+    assert s.numberOfMoves == 1
+    assert s.tower == [0b1110, 0b0001, 0]
+    assert not os.path.exists(os.path.join(path, 'wal.1'))
+    store.close()
+
+
+def test_FileSessionStore_compact_interval(tmp_path):
+    store = FileSessionStore(str(tmp_path), 4)
+    h = store.create(4, 0, 2)
+    for s, t in [(0, 1), (0, 2), (1, 2), (0, 1), (2, 0)]:
+        h.move(s, t)
+    # compaction happens in the background
+    deadline = time.time() + 3
+    while not os.path.exists(os.path.join(str(tmp_path), 'snapshot')):
+        assert time.time() < deadline
+        time.sleep(0.01)
+    store.close()
+
+    store = FileSessionStore(str(tmp_path))
+    assert store[h._state.id]._state.numberOfMoves == 5
+    store.close()
+
+
+def test_SessionStore_invalid():
+    with pytest.raises(ValueError, match=r'ttl 0 is invalid'):
+        SessionStore(ttl=0)
+    with pytest.raises(ValueError, match=r'maxSessions 0 is invalid'):
+        SessionStore(maxSessions=0)
+
+
+def test_SessionStore_lru_drop():
+    store = SessionStore(maxSessions=2)
+    a = store.create()
+    b = store.create()
+    store[a._state.id]
+    c = store.create()
+    # b was least-recently used
+    assert b._state.id not in store
+    assert a._state.id in store
+    assert c._state.id in store
+    with pytest.raises(KeyError):
+        store[b._state.id]
+    assert store.metrics()['evictions'] == 1
+    assert store.metrics()['resident'] == 2
+
+
+def test_SessionStore_lru_busy():
+    store = SessionStore(maxSessions=1)
+    a = store.create()
+    a._lock.acquire()
+    store.create()
+    # a is busy, so it is not evicted
+    assert len(store) == 2
+    a._lock.release()
+    store.create()
+    assert len(store) == 1
+
+
+def test_SessionStore_lru_spill(tmp_path):
+    store = SessionStore(maxSessions=1, spill=str(tmp_path / 'spill'))
+    a = store.create(4, 0, 2)
+    a.move(0, 1)
+    b = store.create(5, 2, 1)
+    assert len(store) == 2
+    assert a._state.id in store
+    assert store.metrics() == {'resident': 1, 'spilled': 1,
+                               'expirations': 0, 'evictions': 1, 'reloads': 0}
+    ids = sorted(h._state.id for h in store.values())
+    assert ids == [a._state.id, b._state.id]
+
+    h = store[a._state.id]
+    assert h is not a
+    assert h._state.id == a._state.id
+    assert h._state.numberOfMoves == 1
+    assert h._state.tower == [0b1110, 0b0001, 0]
+    h.move(0, 2)
+    m = store.metrics()
+    assert (m['evictions'], m['reloads'], m['spilled']) == (2, 1, 1)
+
+    h = store[b._state.id]
+    assert (h._state.numberOfDiscs, h._state.source, h._state.target) == (5, 2, 1)
+    assert store[a._state.id]._state.tower == [0b1100, 0b0001, 0b0010]
+    store.close()
+
+
+def test_SessionStore_evicted_move(tmp_path):
+    store = SessionStore(maxSessions=1, spill=str(tmp_path / 'spill'))
+    a = store.create(4, 0, 2)
+    h = store[a._state.id]
+    store.create(4, 0, 2)
+    # the move would be lost, since a reload is a new object
+    with pytest.raises(Hanoi.Evicted):
+        h.move(0, 1)
+    with pytest.raises(Hanoi.Evicted):
+        h.moves([(0, 1), (0, 2)])
+    assert h._state.numberOfMoves == 0
+    assert h._state.tower == [0b1111, 0, 0]
+    h = store[a._state.id]
+    h.move(0, 1)
+    assert store[a._state.id]._state.numberOfMoves == 1
+    store.close()
+
+
+def test_SessionStore_evicted_release(tmp_path):
+    store = SessionStore(maxSessions=1, spill=str(tmp_path / 'spill'))
+    a = store.create(4, 0, 2)
+    a.move(0, 1)
+    n = len(HanoiState.table)
+    store.create(4, 0, 2)
+    # the record of a was released, but a still reads its last state
+    assert len(HanoiState.table) == n
+    assert a.getState().tower == (0b1110, 0b0001, 0)
+    # reading a spilled session does not take up a record
+    assert [h._state.id for h in store.query()][0] == a._state.id
+    assert len(HanoiState.table) == n
+    store.close()
+
+
+def test_SessionStore_ttl(tmp_path):
+    store = SessionStore(ttl=0.05, spill=str(tmp_path / 'spill'))
+    a = store.create()
+    b = store.create()
+    time.sleep(0.1)
+    store[b._state.id]
+    store.create()
+    assert store.metrics()['expirations'] == 1
+    assert store.metrics()['resident'] == 2
+    time.sleep(0.1)
+    store.expire()
+    assert store.metrics()['expirations'] == 3
+    assert store.metrics()['spilled'] == 3
+    assert store[a._state.id]._state.id == a._state.id
+    assert store.metrics()['reloads'] == 1
+    store.close()
+
+
+def test_FileSessionStore_spill(tmp_path):
+    path = str(tmp_path / 'store')
+    store = FileSessionStore(path, maxSessions=1, spill=str(tmp_path / 'spill'))
+    a = store.create(4, 0, 2)
+    b = store.create(4, 0, 2)
+    # a is reloaded and its moves are still logged
+    store[a._state.id].move(0, 1)
+    store[b._state.id].move(0, 2)
+    # spilled sessions are included in snapshots
+    store.compact()
+    store.close()
+
+    store = FileSessionStore(path)
+    assert store[a._state.id]._state.tower == [0b1110, 0b0001, 0]
+    assert store[b._state.id]._state.tower == [0b1110, 0, 0b0001]
+    store.close()
+
+
+def test_FileSessionStore_compact_unlocked(tmp_path):
+    path = str(tmp_path / 'store')
+    store = FileSessionStore(path, maxSessions=1, spill=str(tmp_path / 'spill'))
+    a = store.create(4, 0, 2)
+    b = store.create(4, 0, 2)
+    get = store._spill.get
+    locked = []
+
+    def spilled(id):
+        locked.append(store._logLock.locked())
+        # moves made during a compaction are in the new log
+        b.move(0, 1)
+        return get(id)
+
+    store._spill.get = spilled
+    store.compact()
+    assert locked == [False]
+    store.close()
+
+    store = FileSessionStore(path)
+    assert store[a._state.id]._state.numberOfMoves == 0
+    assert store[b._state.id]._state.tower == [0b1110, 0b0001, 0]
+    store.close()
+
+
+def test_FileSessionStore_evicted_move(tmp_path):
+    path = str(tmp_path / 'store')
+    store = FileSessionStore(path, maxSessions=1, spill=str(tmp_path / 'spill'))
+    a = store.create(4, 0, 2)
+    store.create(4, 0, 2)
+    with pytest.raises(Hanoi.Evicted):
+        a.move(0, 1)
+    store.close()
+
+    # the failed move was not logged
+    store = FileSessionStore(path)
+    assert store[a._state.id]._state.numberOfMoves == 0
+    store[a._state.id].move(0, 1)
+    store.close()
+
+
+def test_SessionStore_query():
+    store = SessionStore()
+    hs = [store.create(1 + i % 2, 0, 2) for i in range(6)]
+    ids = [h._state.id for h in hs]
+    hs[0].move(0, 2)
+    hs[2].move(0, 2)
+    hs[2].move(2, 1)
+    assert [h._state.id for h in store.query()] == ids
+    assert [h._state.id for h in store.query(ids[1], 2)] == ids[2:4]
+    assert [h._state.id for h in store.query(complete=True)] == [ids[0]]
+    assert [h._state.id for h in store.query(complete=False, numberOfDiscs=1)] == [
+        ids[2], ids[4]]
+    assert list(store.query(limit=0)) == []
+    with pytest.raises(ValueError, match=r'limit -1 is invalid'):
+        store.query(limit=-1)
+
+
+def test_SessionStore_query_spill(tmp_path):
+    store = SessionStore(maxSessions=1, spill=str(tmp_path / 'spill'))
+    a = store.create(1, 0, 2)
+    b = store.create(1, 0, 2)
+    store[a._state.id].move(0, 2)
+    assert [h._state.id for h in store.query(complete=True)] == [a._state.id]
+    assert [h._state.id for h in store.query(complete=False)] == [b._state.id]
+    store.close()
+    store = SessionStore(maxSessions=1)
+    a = store.create(1, 0, 2)
+    store.create(1, 0, 2)
+    # dropped sessions are removed from the index
+    assert a._state.id not in [h._state.id for h in store.query()]
+
+
+def test_SharedSessionStore_happy_path(tmp_path):
+    store = SharedSessionStore(str(tmp_path / 'shared'), 16)
+    a = store.create(4, 0, 2)
+    b = store.create(3, 1, 0)
+    assert (a._state.id, b._state.id) == (0, 1)
+    assert store[0] is a
+    assert 1 in store
+    assert 2 not in store
+    assert len(store) == 2
+    with pytest.raises(KeyError):
+        store[2]
+    a.moves([(0, 1), (0, 2), (1, 2)])
+    assert store.values() == [a, b]
+    assert list(store.query(after=0)) == [b]
+    assert list(store.query(numberOfDiscs=3)) == [b]
+    assert list(store.query(complete=False, limit=1)) == [a]
+    assert store.metrics()['resident'] == 2
+    store.close()
+
+
+def playShared(path, id, count):
+    store = SharedSessionStore(path)
+    h = store[id]
+    for _ in range(count):
+        h.moves([(0, 1), (1, 0)])
+    store.close()
+
+
+def test_SharedSessionStore_processes(tmp_path):
+    path = str(tmp_path / 'shared')
+    store = SharedSessionStore(path, 16)
+    h = store.create(4, 0, 2)
+    fork = multiprocessing.get_context('fork')
+    workers = [fork.Process(target=playShared, args=(path, h._state.id, 500))
+               for _ in range(4)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+        assert w.exitcode == 0
+    # no move was lost or torn
+    s = h.getState()
+    assert s.numberOfMoves == 4 * 2 * 500
+    assert s.tower == (0b1111, 0, 0)
+    # sessions created by other processes are visible
+    other = SharedSessionStore(path)
+    c = other.create(5, 0, 1)
+    assert store[c._state.id].getState().numberOfDiscs == 5
+    other.close()
+    store.close()
+
+
+def test_FileSessionStore_towers(tmp_path):
+    store = FileSessionStore(str(tmp_path))
+    a = store.create(3, 0, 3, 4)
+    b = store.create(3, 0, 2)
+    a.moves([(0, 1), (0, 2)])
+    store.close()
+    with open(os.path.join(str(tmp_path), 'wal')) as f:
+        assert f.readline() == 'c {} 3 0 3 4\n'.format(a._state.id)
+        assert f.readline() == 'c {} 3 0 2\n'.format(b._state.id)
+
+    # from the log, then from the snapshot
+    for _ in range(2):
+        store = FileSessionStore(str(tmp_path))
+        s = store[a._state.id]._state
+        assert s.numberOfTowers == 4
+        assert s.tower == [0b100, 0b001, 0b010, 0]
+        assert store[b._state.id]._state.numberOfTowers == 3
+        store.close()
+
+
+def test_SessionStore_spill_towers(tmp_path):
+    store = SessionStore(maxSessions=1, spill=str(tmp_path / 'spill'))
+    a = store.create(4, 0, 5, 6)
+    a.move(0, 4)
+    b = store.create(4, 0, 2)
+    c = store.create(4, 0, 3, 8)
+    h = store[a._state.id]
+    assert h._state.numberOfTowers == 6
+    assert h._state.tower == [0b1110, 0, 0, 0, 0b0001, 0]
+    assert store[b._state.id]._state.tower == [0b1111, 0, 0]
+    assert store[c._state.id]._state.numberOfTowers == 8
+    store.close()
+
+
+def test_FileSessionStore_discs(tmp_path):
+    store = FileSessionStore(str(tmp_path))
+    a = store.create(200, 0, 2)
+    a.moves([(0, 1), (0, 2)])
+    store.close()
+    # from the log, then from the snapshot
+    for _ in range(2):
+        store = FileSessionStore(str(tmp_path))
+        s = store[a._state.id]._state
+        assert s.numberOfDiscs == 200
+        assert s.tower == [(1 << 200) - 4, 1, 2]
+        store.close()
+
+
+def test_SessionStore_spill_discs(tmp_path):
+    store = SessionStore(maxSessions=1, spill=str(tmp_path / 'spill'))
+    a = store.create(130, 0, 2)
+    a.move(0, 1)
+    b = store.create(4, 0, 2)
+    c = store.create(4096, 0, 1)
+    h = store[a._state.id]
+    assert h._state.numberOfDiscs == 130
+    assert h._state.tower == [(1 << 130) - 2, 1, 0]
+    assert store[b._state.id]._state.tower == [0b1111, 0, 0]
+    assert store[c._state.id]._state.tower == [(1 << 4096) - 1, 0, 0]
+    assert store[a._state.id]._state.tower == [(1 << 130) - 2, 1, 0]
+    store.close()
+
+
+def test_generation(tmp_path):
+    # e.g. a restarted server
+    assert SessionStore().generation != SessionStore().generation
+    # workers sharing a table share its generation
+    path = str(tmp_path / 'shared')
+    a = SharedSessionStore(path, capacity=16)
+    b = SharedSessionStore(path)
+    assert a.generation == b.generation
+    a.close()
+    b.close()
+
+
+def test_SharedSessionStore_towers(tmp_path):
+    store = SharedSessionStore(str(tmp_path / 'shared'), 16, towers=4)
+    a = store.create(4, 0, 3, 4)
+    b = store.create(4, 0, 2)
+    a.moves([(0, 1), (0, 3)])
+    with pytest.raises(ValueError, match=r'numberOfTowers 5 is invalid'):
+        store.create(4, 0, 2, 5)
+    ids = [a._state.id, b._state.id]
+    store.close()
+    # the number of towers is kept in the file
+    store = SharedSessionStore(str(tmp_path / 'shared'))
+    assert store[ids[0]].getState().tower == (0b1100, 0b0001, 0, 0b0010)
+    assert store[ids[1]].getState().tower == (0b1111, 0, 0)
+    assert len(store) == 2
+    store.close()
@@ -0,0 +1,203 @@
+# MIT License
+#
+# Copyright (c) 2020 Christopher Friedt
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import pytest
+
+from hanoi import SessionTable
+
+
+def test_init_happy_path():
+    t = SessionTable(4)
+    assert t.capacity() == 4
+    assert len(t) == 0
+    assert t.words.itemsize == 8
+    assert len(t.words) == 4 * SessionTable.WIDTH
+
+
+def test_init_capacity_zero():
+    with pytest.raises(ValueError, match=r'capacity 0 is invalid'):
+        SessionTable(0)
+
+
+def test_pack_unpack():
+    meta = SessionTable.pack(64, 2, 1)
+    assert SessionTable.unpack(meta) == (64, 2, 1)
+
+
+def test_allocate_happy_path():
+    t = SessionTable(4)
+    slot = t.allocate(42, 4, 1, 2)
+    assert slot == 0
+    assert len(t) == 1
+    base = slot * SessionTable.WIDTH
+    assert t.words[base + SessionTable.ID] == 42
+    assert SessionTable.unpack(t.words[base + SessionTable.META]) == (4, 1, 2)
+    assert t.words[base + SessionTable.MOVES] == 0
+    assert list(t.words[base + SessionTable.TOWER:base + SessionTable.WIDTH]) == [0, 15, 0]
+
+
+def test_allocate_grow():
+    t = SessionTable(1)
+    assert t.allocate(0, 64, 0, 2) == 0
+    assert t.allocate(1, 64, 0, 2) == 1
+    assert t.allocate(2, 64, 0, 2) == 2
+    assert t.capacity() == 4
+    assert len(t) == 3
+    assert t.words[SessionTable.TOWER] == (1 << 64) - 1
+
+
+def test_release_reuse():
+    t = SessionTable(4)
+    for i in range(3):
+        t.allocate(i, 4, 0, 2)
+    assert t.release(1)
+    assert len(t) == 2
+    # a record is only released once
+    assert not t.release(1)
+    assert len(t) == 2
+    # released slots are reused and reinitialized
+    t.words[1 * SessionTable.WIDTH + SessionTable.MOVES] = 7
+    assert t.allocate(3, 4, 0, 2) == 1
+    assert t.words[1 * SessionTable.WIDTH + SessionTable.MOVES] == 0
+    assert t.capacity() == 4
+
+
+def test_read_happy_path():
+    t = SessionTable(4)
+    base = t.allocate(42, 4, 1, 2) * SessionTable.WIDTH
+    assert list(t.read(base)) == [42, SessionTable.pack(4, 1, 2), 0, 0, 15, 0]
+
+
+def test_read_while_writing():
+    t = SessionTable(4)
+    base = t.allocate(42, 4, 1, 2) * SessionTable.WIDTH
+    t.begin(base)
+    assert t.read(base) is None
+    t.words[base + SessionTable.MOVES] += 1
+    t.end(base)
+    record = t.read(base)
+    assert record[SessionTable.MOVES] == 1
+    assert SessionTable.unpack(record[SessionTable.META]) == (4, 1, 2)
+
+
+def test_sequence_wraps():
+    t = SessionTable(4)
+    base = t.allocate(42, 4, 1, 2) * SessionTable.WIDTH
+    # the largest even sequence number
+    t.words[base + SessionTable.META] |= SessionTable.WORD ^ (SessionTable.SEQUENCE - 1) ^ SessionTable.SEQUENCE
+    t.begin(base)
+    t.end(base)
+    assert t.read(base) is not None
+    assert SessionTable.unpack(t.words[base + SessionTable.META]) == (4, 1, 2)
+
+
+def test_node():
+    t = SessionTable(4, 3)
+    id = t.nextId()
+    assert id == 3 << SessionTable.NODE
+    assert SessionTable.node(id) == 3
+    assert t.nextId() == id + 1
+    t.setNode(3)
+    assert t.nextId() == id + 2
+    t.setNode(5)
+    assert t.nextId() == 5 << SessionTable.NODE
+
+
+def test_node_invalid():
+    with pytest.raises(ValueError, match=r'node 32768 is invalid'):
+        SessionTable(4, 1 << 15)
+    with pytest.raises(ValueError, match=r'node -1 is invalid'):
+        SessionTable(4).setNode(-1)
+
+
+def test_pack_towers():
+    meta = SessionTable.pack(64, 7, 6, 8)
+    assert SessionTable.unpack(meta) == (64, 7, 6)
+    assert SessionTable.numberOfTowers(meta) == 8
+    # 3 towers leave the meta word as it was
+    assert SessionTable.numberOfTowers(SessionTable.pack(4, 1, 2)) == 3
+    assert SessionTable.pack(4, 1, 2) == 4 | 1 << 8 | 2 << 16
+
+
+def test_allocate_towers():
+    t = SessionTable(2, towers=5)
+    assert t.width == SessionTable.TOWER + 5
+    assert len(t.words) == 2 * t.width
+    base = t.allocate(42, 4, 3, 0, 5) * t.width
+    assert SessionTable.numberOfTowers(t.words[base + SessionTable.META]) == 5
+    assert list(t.words[base + SessionTable.TOWER:base + t.width]) == [0, 0, 0, 15, 0]
+    # narrower games fit as well
+    base = t.allocate(43, 4, 1, 2) * t.width
+    assert list(t.read(base)) == [43, SessionTable.pack(4, 1, 2), 0, 0, 15, 0, 0, 0]
+    with pytest.raises(ValueError, match=r'numberOfTowers 6 is invalid'):
+        t.allocate(44, 4, 1, 2, 6)
+    with pytest.raises(ValueError, match=r'numberOfTowers 9 is invalid'):
+        SessionTable(towers=9)
+
+
+def test_pack_discs():
+    meta = SessionTable.pack(4096, 2, 1)
+    assert SessionTable.unpack(meta) == (4096, 2, 1)
+    meta = SessionTable.pack(4095, 6, 7, 8)
+    assert SessionTable.unpack(meta) == (4095, 6, 7)
+    assert SessionTable.numberOfTowers(meta) == 8
+
+
+def test_allocate_discs():
+    t = SessionTable(1, discs=SessionTable.MAX_DISCS)
+    assert isinstance(t.words, list)
+    base = t.allocate(42, 4096, 0, 2) * t.width
+    assert list(t.read(base)) == [42, SessionTable.pack(4096, 0, 2), 0, (1 << 4096) - 1, 0, 0]
+    # grows like an array
+    t.allocate(43, 4, 0, 2)
+    assert t.capacity() == 2
+    with pytest.raises(ValueError, match=r'numberOfDiscs 65 is invalid'):
+        SessionTable(4).allocate(44, 65, 0, 2)
+    with pytest.raises(ValueError, match=r'discs 4097 is invalid'):
+        SessionTable(4, discs=4097)
+
+
+def test_nextIds():
+    t = SessionTable(4)
+    assert t.nextIds(3) == 0
+    assert t.nextId() == 3
+    assert t.nextIds(1000) == 4
+    assert t.getCounter() == 1004
+    with pytest.raises(ValueError, match=r'count 0 is invalid'):
+        t.nextIds(0)
+
+
+def test_allocateMany():
+    t = SessionTable(2, towers=4)
+    t.release(t.allocate(1, 4, 0, 2))
+    games = [(4, 0, 2, 3)] * 4 + [(3, 1, 0, 4)]
+    slots = t.allocateMany(range(10, 15), games)
+    # the free record first, then new ones, as allocate() would
+    assert list(slots) == [0, 1, 2, 3, 4]
+    assert t.capacity() == 8
+    assert len(t) == 5
+    assert list(t.read(0)) == [10, SessionTable.pack(4, 0, 2), 0, 15, 0, 0, 0]
+    assert list(t.read(4 * t.width)) == [14, SessionTable.pack(3, 1, 0, 4), 0, 0, 7, 0, 0]
+    with pytest.raises(ValueError, match=r'numberOfTowers 5 is invalid'):
+        t.allocateMany([15], [(4, 0, 2, 5)])
+    assert len(t) == 5
@@ -0,0 +1,101 @@
+# MIT License
+#
+# Copyright (c) 2020 Christopher Friedt
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import multiprocessing
+
+import pytest
+
+from hanoi import IdempotencyCache
+from hanoi import SharedIdempotencyCache
+
+
+def test_begin_end(tmp_path):
+    c = SharedIdempotencyCache(str(tmp_path / 'keys'), 16)
+    assert c.begin((1, 'a'), 7) is None
+    assert c.begin((1, 'a'), 7) is IdempotencyCache.PENDING
+    assert c.begin((1, 'a'), 8) is IdempotencyCache.MISMATCH
+    c.end((1, 'a'), (200, None, {}))
+    # outcomes are read back from JSON
+    assert c.begin((1, 'a'), 7) == [200, None, {}]
+    assert c.begin((2, 'a'), 7) is None
+    assert len(c) == 2
+    c.abort((2, 'a'))
+    assert c.begin((2, 'a'), 7) is None
+    c.close()
+
+
+def test_full(tmp_path):
+    # a single bucket
+    c = SharedIdempotencyCache(str(tmp_path / 'keys'), 1)
+    assert c.capacity == SharedIdempotencyCache.WAYS
+    for i in range(c.capacity + 1):
+        assert c.begin(i) is None
+        c.end(i, i)
+    # the oldest outcome is dropped
+    assert len(c) == c.capacity
+    assert c.begin(c.capacity) == c.capacity
+    assert c.begin(0) is None
+    c.close()
+
+
+def test_too_large(tmp_path):
+    c = SharedIdempotencyCache(str(tmp_path / 'keys'), 8, size=64)
+    assert c.begin('a') is None
+    c.end('a', 'x' * 64)
+    # the request is executed again
+    assert c.begin('a') is None
+    c.close()
+
+
+def record(path, key):
+    c = SharedIdempotencyCache(path)
+    assert c.begin(key, 1) is None
+    c.end(key, [201, {'code': 201, 'message': 'in another process'}, {}])
+    c.close()
+
+
+def test_processes(tmp_path):
+    path = str(tmp_path / 'keys')
+    c = SharedIdempotencyCache(path, 64)
+    p = multiprocessing.get_context('fork').Process(target=record, args=(path, (1, 'a')))
+    p.start()
+    p.join()
+    assert p.exitcode == 0
+    # the retry reaches another process
+    assert c.begin((1, 'a'), 1) == [201, {'code': 201, 'message': 'in another process'}, {}]
+    # the existing file keeps its capacity
+    assert c.capacity == 64
+    c.close()
+
+
+def test_disabled(tmp_path):
+    c = SharedIdempotencyCache(str(tmp_path / 'keys'), 0)
+    assert c.begin('a') is None
+    c.end('a', 'a')
+    assert c.begin('a') is None
+    assert len(c) == 0
+    assert not (tmp_path / 'keys').exists()
+    with pytest.raises(ValueError, match=r'capacity -1 is invalid'):
+        SharedIdempotencyCache(str(tmp_path / 'keys'), -1)
+    with open(str(tmp_path / 'other'), 'wb') as f:
+        f.write(b'\1' * 64)
+    with pytest.raises(ValueError, match=r'is not an idempotency cache'):
+        SharedIdempotencyCache(str(tmp_path / 'other'))
@@ -0,0 +1,179 @@
+# MIT License
+#
+# Copyright (c) 2020 Christopher Friedt
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import multiprocessing
+import os
+
+import pytest
+
+from hanoi import HanoiState
+from hanoi import SessionTable
+from hanoi import SharedSessionTable
+
+fork = multiprocessing.get_context('fork')
+
+
+def test_init_happy_path(tmp_path):
+    path = str(tmp_path / 'table')
+    t = SharedSessionTable(path, 4)
+    assert t.capacity() == 4
+    assert len(t) == 0
+    assert os.path.getsize(path) == SharedSessionTable.HEADER + 4 * 8 * SessionTable.WIDTH
+    t.close()
+
+
+def test_init_capacity_zero(tmp_path):
+    with pytest.raises(ValueError, match=r'capacity 0 is invalid'):
+        SharedSessionTable(str(tmp_path / 'table'), 0)
+
+
+def test_init_not_a_table(tmp_path):
+    path = tmp_path / 'table'
+    path.write_bytes(b'x' * 1024)
+    with pytest.raises(ValueError, match=r'is not a session table'):
+        SharedSessionTable(str(path))
+
+
+def test_allocate_happy_path(tmp_path):
+    t = SharedSessionTable(str(tmp_path / 'table'), 4)
+    id = t.nextId()
+    assert id == 0
+    assert t.allocate(id, 4, 1, 2) == 0
+    base = id * SessionTable.WIDTH
+    assert list(t.read(base)) == [0, SessionTable.pack(4, 1, 2), 0, 0, 15, 0]
+    with pytest.raises(ValueError, match=r'id 1 has not been allocated'):
+        t.allocate(1, 4, 1, 2)
+    t.close()
+
+
+def test_full(tmp_path):
+    t = SharedSessionTable(str(tmp_path / 'table'), 2)
+    t.nextId()
+    t.nextId()
+    with pytest.raises(ValueError, match=r'session table is full'):
+        t.nextId()
+    t.close()
+
+
+def test_allocateMany(tmp_path):
+    t = SharedSessionTable(str(tmp_path / 'table'), 4)
+    t.nextId()
+    first = t.nextIds(2)
+    assert first == 1
+    assert list(t.allocateMany([1, 2], [(4, 1, 2, 3), (2, 0, 1, 3)])) == [1, 2]
+    assert list(t.read(2 * SessionTable.WIDTH)) == [2, SessionTable.pack(2, 0, 1), 0, 3, 0, 0]
+    with pytest.raises(ValueError, match=r'session table is full'):
+        t.nextIds(2)
+    assert t.nextIds(1) == 3
+    t.close()
+
+
+def test_reopen(tmp_path):
+    path = str(tmp_path / 'table')
+    t = SharedSessionTable(path, 4)
+    s = HanoiState(4, 0, 2, t)
+    s.tower = [0b1110, 0b0001, 0]
+    u = SharedSessionTable(path, 100)
+    # the existing capacity is kept
+    assert u.capacity() == 4
+    assert len(u) == 1
+    assert HanoiState.attach(u, s.id).tower == [0b1110, 0b0001, 0]
+    t.close()
+    u.close()
+
+
+def createSessions(path, count):
+    t = SharedSessionTable(path)
+    for _ in range(count):
+        HanoiState(4, 0, 2, t)
+    t.close()
+
+
+def test_nextId_processes(tmp_path):
+    path = str(tmp_path / 'table')
+    t = SharedSessionTable(path, 1000)
+    workers = [fork.Process(target=createSessions, args=(path, 100))
+               for _ in range(4)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    assert len(t) == 400
+    ids = [t.words[i * SessionTable.WIDTH + SessionTable.ID] for i in range(400)]
+    assert ids == list(range(400))
+    t.close()
+
+
+def tryLock(path, slot, result):
+    t = SharedSessionTable(path)
+    lock = t.lock(slot)
+    result.value = lock.acquire(timeout=0.01)
+    if result.value:
+        lock.release()
+    t.close()
+
+
+def test_lock_processes(tmp_path):
+    path = str(tmp_path / 'table')
+    t = SharedSessionTable(path, 4)
+    lock = t.lock(1)
+    assert lock.acquire(blocking=False)
+    assert lock.locked()
+    result = fork.Value('b', -1)
+    # another record is not locked
+    p = fork.Process(target=tryLock, args=(path, 0, result))
+    p.start()
+    p.join()
+    assert result.value == 1
+    p = fork.Process(target=tryLock, args=(path, 1, result))
+    p.start()
+    p.join()
+    assert result.value == 0
+    lock.release()
+    p = fork.Process(target=tryLock, args=(path, 1, result))
+    p.start()
+    p.join()
+    assert result.value == 1
+    t.close()
+
+
+def test_lock_threads(tmp_path):
+    t = SharedSessionTable(str(tmp_path / 'table'), 4)
+    lock = t.lock(0)
+    assert lock.acquire()
+    # fcntl() locks alone would not exclude another thread
+    assert not lock.acquire(timeout=0.01)
+    assert not lock.acquire(blocking=False)
+    lock.release()
+    assert not lock.locked()
+    t.close()
+
+
+def test_node(tmp_path):
+    t = SharedSessionTable(str(tmp_path / 'table'), 4, 7)
+    s = HanoiState(4, 0, 2, t)
+    assert s.id == 7 << SessionTable.NODE
+    assert t.slot(s.id) == 0
+    assert t.slot(s.id + 1) is None
+    assert t.slot(0) is None
+    assert t.getCounter() == s.id + 1
+    assert len(t) == 1
+    t.close()
@@ -0,0 +1,328 @@
+# MIT License
+#
+# Copyright (c) 2020 Christopher Friedt
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import asyncio
+import threading
+
+import pytest
+
+pytest.importorskip('aiohttp')
+
+from aiohttp import web  # noqa: E402
+from aiohttp.test_utils import TestClient, TestServer  # noqa: E402
+
+from hanoi import Hanoi  # noqa: E402
+from hanoi import FileSessionStore  # noqa: E402
+from hanoi import SessionStore  # noqa: E402
+import hanoi.aio as aio  # noqa: E402
+
+
+# an aiohttp application is bound to the first event loop it runs on
+loop = asyncio.new_event_loop()
+
+
+def setup_function(function):
+    aio.wsgi.sessions = SessionStore()
+
+
+def teardown_function(function):
+    # app_test forks its server from this process
+    aio.wsgi.sessions = SessionStore()
+
+
+def run(test):
+    async def main():
+        async with TestClient(TestServer(aio.application)) as client:
+            await test(client)
+    loop.run_until_complete(main())
+
+
+def test_session_happy_path():
+    async def test(client):
+        r = await client.post('/v1/sessions', params={'numberOfDiscs': 3})
+        assert r.status == 200
+        id = await r.json()
+        r = await client.put('/v1/sessions/{}/move'.format(id),
+                             params={'fromTower': 0, 'toTower': 2})
+        assert r.status == 200
+        r = await client.get('/v1/sessions/{}'.format(id))
+        assert r.status == 200
+        s = await r.json()
+        assert s['numberOfMoves'] == 1
+        assert s['towers'] == [6, 0, 1]
+        r = await client.post('/v1/sessions/{}/moves'.format(id), json=[[0, 1], [2, 1]])
+        assert r.status == 200
+        r = await client.get('/v1/sessions/{}/complete'.format(id))
+        assert await r.json() is False
+        r = await client.get('/v1/sessions/{}/hint'.format(id))
+        assert (await r.json())['numberOfMovesRemaining'] == 4
+        r = await client.get('/v1/sessions/{}/distance'.format(id), params={'count': 1})
+        assert await r.json() == {'sessionId': id, 'numberOfMoves': 3,
+                                  'moves': [{'fromTower': 1, 'toTower': 2}]}
+        r = await client.put('/v1/sessions/{}/undo'.format(id))
+        assert r.status == 200
+        r = await client.get('/v1/sessions/{}/history'.format(id))
+        assert await r.read() == b'\x02\x01'
+        assert r.headers['History-Start'] == '0'
+        r = await client.put('/v1/sessions/{}/redo'.format(id))
+        assert r.status == 200
+        r = await client.get('/v1/sessions')
+        assert [s['sessionId'] for s in await r.json()] == [id]
+    run(test)
+
+
+def test_move_exception():
+    async def test(client):
+        r = await client.post('/v1/sessions')
+        id = await r.json()
+        r = await client.put('/v1/sessions/{}/move'.format(id),
+                             params={'fromTower': 1, 'toTower': 2})
+        assert r.status == 201
+        assert (await r.json())['message'] == 'source 1 is empty'
+    run(test)
+
+
+def test_getSolution():
+    async def test(client):
+        r = await client.get('/v1/solutions/3')
+        assert r.status == 200
+        assert await r.json() == [[0, 2], [0, 1], [2, 1], [0, 2], [1, 0], [1, 2], [0, 2]]
+        r = await client.get('/v1/solutions/0')
+        assert r.status == 201
+    run(test)
+
+
+def test_getSessions_ndjson():
+    async def test(client):
+        for _ in range(3):
+            await client.post('/v1/sessions')
+        r = await client.get('/v1/sessions', headers={'Accept': 'application/x-ndjson'})
+        assert len((await r.text()).splitlines()) == 3
+    run(test)
+
+
+def test_getSession_etag():
+    async def test(client):
+        r = await client.post('/v1/sessions', params={'numberOfDiscs': 3})
+        id = await r.json()
+        url = '/v1/sessions/{}'.format(id)
+        r = await client.get(url, headers={'Accept': 'application/msgpack'})
+        assert r.status == 200
+        etag = r.headers['ETag']
+        assert etag == 'W/"{:08x}-{}-0.session.msgpack"'.format(
+            aio.wsgi.sessions.generation, id)
+        r = await client.get(url, headers={'If-None-Match': etag,
+                                           'Accept': 'application/msgpack'})
+        assert r.status == 304
+        # JSON has another ETag
+        r = await client.get(url, headers={'If-None-Match': etag})
+        assert r.status == 200
+        assert r.headers['ETag'] == etag.replace('.msgpack', '.json')
+        r = await client.get(url + '/complete', headers={'If-None-Match': etag})
+        assert r.status == 200
+        await client.put(url + '/move', params={'fromTower': 0, 'toTower': 2})
+        r = await client.get(url, headers={'If-None-Match': etag.replace('.msgpack', '.json')})
+        assert r.status == 200
+        assert r.headers['ETag'] == 'W/"{:08x}-{}-1.session.json"'.format(
+            aio.wsgi.sessions.generation, id)
+        assert (await r.json())['towers'] == [6, 0, 1]
+    run(test)
+
+
+def test_createSessions():
+    async def test(client):
+        r = await client.post('/v1/sessions:batch', params={'count': 3, 'numberOfDiscs': 2})
+        assert r.status == 200
+        d = await r.json()
+        assert d['numberOfSessions'] == 3
+        r = await client.get('/v1/sessions/{}'.format(d['firstSessionId'] + 2))
+        assert (await r.json())['towers'] == [3, 0, 0]
+        r = await client.post('/v1/sessions:batch', json=[{'numberOfDiscs': 3}])
+        assert await r.json() == {'firstSessionId': d['firstSessionId'] + 3,
+                                  'numberOfSessions': 1}
+    run(test)
+
+
+def test_engine_busy():
+    h = Hanoi(4, 0, 2)
+    h._lock.acquire()
+    # release the lock while the move waits in the executor
+    threading.Timer(0.05, h._lock.release).start()
+    loop.run_until_complete(aio.engine(h.move, 0, 1))
+    assert h.getState().numberOfMoves == 1
+
+
+def test_blocking_store(tmp_path):
+    threads = []
+
+    async def test(client):
+        append = aio.wsgi.sessions._append
+
+        def logged(line, events=1):
+            threads.append(threading.get_ident())
+            return append(line, events)
+
+        aio.wsgi.sessions._append = logged
+        r = await client.post('/v1/sessions', params={'numberOfDiscs': 3})
+        id = await r.json()
+        for operation in ('move', 'undo', 'redo'):
+            r = await client.put('/v1/sessions/{}/{}'.format(id, operation),
+                                 params={'fromTower': 0, 'toTower': 2})
+            assert r.status == 200
+        r = await client.get('/v1/sessions/{}'.format(id))
+        assert (await r.json())['numberOfMoves'] == 3
+
+    aio.wsgi.sessions = FileSessionStore(str(tmp_path), maxSessions=1,
+                                         spill=str(tmp_path / 'spill'))
+    try:
+        assert aio.wsgi.sessions.blocking
+        run(test)
+    finally:
+        aio.wsgi.sessions.close()
+    # the log is never written on the event loop
+    assert len(threads) == 4
+    assert threading.get_ident() not in threads
+
+
+def test_stream_executor():
+    threads = []
+
+    def chunks():
+        for _ in range(4):
+            threads.append(threading.get_ident())
+            yield b'x' * 10
+
+    async def handler(request):
+        return await aio.stream(request, chunks(), 'text/plain')
+
+    async def main():
+        app = web.Application()
+        app.router.add_get('/', handler)
+        async with TestClient(TestServer(app)) as client:
+            r = await client.get('/')
+            assert await r.read() == b'x' * 40
+
+    bufferSize = aio.bufferSize
+    aio.bufferSize = 20
+    try:
+        loop.run_until_complete(main())
+    finally:
+        aio.bufferSize = bufferSize
+    # the generator never runs on the event loop
+    assert len(threads) == 4
+    assert threading.get_ident() not in threads
+
+
+def test_move_expectedMoves_idempotent():
+    async def test(client):
+        r = await client.post('/v1/sessions', params={'numberOfDiscs': 3})
+        id = await r.json()
+        url = '/v1/sessions/{}'.format(id)
+        for _ in range(2):
+            r = await client.put(url + '/move', params={'fromTower': 0, 'toTower': 2},
+                                 headers={'Idempotency-Key': 'a'})
+            assert r.status == 200
+        assert r.headers['Idempotent-Replayed'] == 'true'
+        r = await client.put(url + '/move', params={'fromTower': 0, 'toTower': 1,
+                                                    'expectedMoves': 0})
+        assert r.status == 409
+        e = await r.json()
+        assert e['session']['numberOfMoves'] == 1
+        r = await client.post(url + '/moves', params={'expectedMoves': 1},
+                              json=[[0, 1], [2, 1]])
+        assert r.status == 200
+        r = await client.put(url + '/redo', params={'expectedMoves': 3},
+                             headers={'Idempotency-Key': 'b'})
+        assert (await r.json())['message'] == 'there is no move to redo'
+        r = await client.get(url)
+        assert (await r.json())['towers'] == [4, 3, 0]
+    run(test)
+
+
+def test_session_busy():
+    maxPending = Hanoi.maxPending
+    timeouts = aio.wsgi.timeouts
+
+    async def test(client):
+        r = await client.post('/v1/sessions', params={'numberOfDiscs': 3})
+        id = await r.json()
+        h = aio.wsgi.sessions[id]
+        with h.locked():
+            # the wait for the session times out
+            r = await client.put('/v1/sessions/{}/move'.format(id),
+                                 params={'fromTower': 0, 'toTower': 2})
+            assert r.status == 503
+            assert r.headers['Retry-After'] == '1'
+            assert (await r.json())['code'] == 503
+            # too many requests are waiting for the session already
+            Hanoi.setMaxPending(0)
+            r = await client.post('/v1/sessions/{}/moves'.format(id), json=[[0, 2]])
+            assert r.status == 429
+            assert r.headers['Retry-After'] == '1'
+            assert (await r.json())['message'] == 'session {} is busy'.format(id)
+        r = await client.put('/v1/sessions/{}/move'.format(id),
+                             params={'fromTower': 0, 'toTower': 2})
+        assert r.status == 200
+
+    aio.wsgi.timeouts = aio.wsgi.lockTimeouts('*=0.01')
+    try:
+        run(test)
+    finally:
+        aio.wsgi.timeouts = timeouts
+        Hanoi.setMaxPending(maxPending)
+
+
+def test_watch():
+    async def test(client):
+        r = await client.post('/v1/sessions', params={'numberOfDiscs': 1})
+        id = await r.json()
+        stream = await client.get('/v1/sessions/{}/events'.format(id))
+        assert stream.status == 200
+        assert stream.headers['Content-Type'] == 'text/event-stream'
+        first = await stream.content.readuntil(b'\n\n')
+        assert first.startswith(b'event: session\nid: 0\n')
+        h = aio.wsgi.sessions[id]
+        assert aio.wsgi.events.subscribers(id) == 1
+        # moves made by other threads are pushed as well
+        await loop.run_in_executor(None, h.move, 0, 2)
+        assert await stream.content.readuntil(b'\n\n') == \
+            b'event: move\nid: 1\ndata: {"numberOfMoves":1,"moves":[[0,2]]}\n\n'
+        assert await stream.content.readuntil(b'\n\n') == \
+            b'event: complete\nid: 1\ndata: {"numberOfMoves":1,"complete":true}\n\n'
+        stream.close()
+        r = await client.get('/v1/sessions/42/events')
+        assert r.status == 201
+    run(test)
+
+
+def test_towers():
+    async def test(client):
+        r = await client.post('/v1/sessions', params={'numberOfDiscs': 3, 'numberOfTowers': 4})
+        id = await r.json()
+        r = await client.get('/v1/sessions/{}'.format(id))
+        assert (await r.json())['towers'] == [7, 0, 0, 0]
+        r = await client.get('/v1/sessions/{}/hint'.format(id))
+        assert (await r.json())['numberOfMovesRemaining'] == 5
+        r = await client.get('/v1/solutions/3', params={'numberOfTowers': 4})
+        assert len(await r.json()) == 5
+        r = await client.post('/v1/sessions', params={'numberOfTowers': 9})
+        assert r.status == 400
+    run(test)
@@ -22,8 +22,17 @@
 
 import pytest
 import requests
+import importlib
 import json
 import logging as log
+import os
+import re
+import shutil
+import socket
+import struct
+import subprocess
+import sys
+import time
 from multiprocessing import Process
 from hanoi import app
 
@@ -41,6 +50,14 @@ def setup_function(function):
     log.debug('creating app server..')
     server = Process(target=app.run)
     server.start()
+    # wait for the server to accept connections before running the test
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection((host, port), timeout=timeout).close()
+            break
+        except OSError:
+            time.sleep(0.01)
     log.debug('started app server {}'.format(server))
 
 
@@ -78,7 +95,6 @@ def test_getSessions_one():
     d = r.json()
     assert len(d) == 1
     for e in d:
-        e = json.loads(e)
         assert e['sessionId'] == id
         assert e['numberOfDiscs'] == 4
         assert e['fromTower'] == 0
@@ -106,7 +122,7 @@ def test_getSessions_two():
     d = r.json()
     assert len(d) == 2
     for i in range(0, len(d)):
-        e = json.loads(d[i])
+        e = d[i]
         assert e['sessionId'] == id[i]
         assert e['numberOfDiscs'] == 4
         assert e['fromTower'] == 0
@@ -151,7 +167,6 @@ def test_createSession_8_2_0():
     d = r.json()
     assert len(d) == 1
     for e in d:
-        e = json.loads(e)
         assert e['sessionId'] == id
         assert e['numberOfDiscs'] == 8
         assert e['fromTower'] == 2
@@ -160,6 +175,69 @@ def test_createSession_8_2_0():
         assert e['towers'] == [0, 0, 255]
 
 
+def test_createSession_128_0_2():
+    global host
+    global port
+    global timeout
+    payload = {'numberOfDiscs': '128', 'fromTower': '0', 'toTower': '2'}
+    r = requests.post('http://{}:{}/v1/sessions'.format(host,
+                                                        port), params=payload, timeout=timeout)
+    assert r.status_code == 200
+    id = r.json()
+    r = requests.get(
+        'http://{}:{}/v1/sessions/{}'.format(host, port, id), timeout=timeout)
+    assert r.status_code == 200
+    d = r.json()
+    assert d['numberOfDiscs'] == 128
+    assert d['towers'] == ['f' * 32, '0', '0']
+    r = requests.get('http://{}:{}/v1/sessions/{}/hint'.format(host,
+                                                               port, id), timeout=timeout)
+    assert r.status_code == 200
+    assert r.json()['numberOfMovesRemaining'] == 'f' * 32
+    r = requests.get('http://{}:{}/v1/sessions/{}/hint'.format(host, port, id), timeout=timeout,
+                     headers={'Accept': 'application/msgpack'})
+    assert r.status_code == 200
+    assert r.content.endswith(b'\xd9\x20' + b'f' * 32 + b'\xa5moves\x91\x82\xa9fromTower\x00\xa7toTower\x01')
+
+
+def test_createSessions():
+    global host
+    global port
+    global timeout
+    r = requests.post('http://{}:{}/v1/sessions:batch'.format(host, port),
+                      params={'count': 1000, 'numberOfDiscs': 5}, timeout=timeout)
+    assert r.status_code == 200
+    d = r.json()
+    assert d['numberOfSessions'] == 1000
+    first = d['firstSessionId']
+    r = requests.get('http://{}:{}/v1/sessions'.format(host, port),
+                     params={'numberOfDiscs': 5}, timeout=timeout)
+    assert [s['sessionId'] for s in r.json()] == list(range(first, first + 1000))
+    # per game, with defaults from the query
+    r = requests.post('http://{}:{}/v1/sessions:batch'.format(host, port),
+                      params={'numberOfDiscs': 6}, timeout=timeout,
+                      json=[{}, {'toTower': 1}, {'numberOfDiscs': 3, 'numberOfTowers': 4}])
+    assert r.status_code == 200
+    assert r.json() == {'firstSessionId': first + 1000, 'numberOfSessions': 3}
+    r = requests.get('http://{}:{}/v1/sessions/{}'.format(host, port, first + 1001),
+                     timeout=timeout)
+    assert (r.json()['numberOfDiscs'], r.json()['toTower']) == (6, 1)
+    r = requests.get('http://{}:{}/v1/sessions/{}'.format(host, port, first + 1002),
+                     timeout=timeout)
+    assert r.json()['towers'] == [7, 0, 0, 0]
+    for params, body, message in [
+            ({}, None, 'count is required without a body'),
+            ({'count': 2}, [{}], 'count 2 does not match 1 games'),
+            ({}, [{}, {'fromTower': 2}], 'source may not equal target')]:
+        r = requests.post('http://{}:{}/v1/sessions:batch'.format(host, port),
+                          params=params, json=body, timeout=timeout)
+        assert r.status_code == 201
+        assert r.json()['message'] == message
+    r = requests.get('http://{}:{}/v1/sessions'.format(host, port),
+                     params={'limit': 2000}, timeout=timeout)
+    assert len(r.json()) == 1003
+
+
 def test_createSession_exception():
     global host
     global port
@@ -173,7 +251,7 @@ def test_createSession_exception():
     r = requests.post('http://{}:{}/v1/sessions'.format(host,
                                                         port), params=payload, timeout=timeout)
     assert r.status_code == 201
-    d = json.loads(r.json())
+    d = r.json()
     assert d['code'] == 201
     assert d['message'] != ''
 
@@ -189,7 +267,7 @@ def test_getSession_0():
     r = requests.get(
         'http://{}:{}/v1/sessions/{}'.format(host, port, id), timeout=timeout)
     assert r.status_code == 200
-    d = json.loads(r.json())
+    d = r.json()
     assert d['sessionId'] == id
     assert d['numberOfDiscs'] == 4
     assert d['fromTower'] == 0
@@ -198,6 +276,47 @@ def test_getSession_0():
     assert d['towers'] == [15, 0, 0]
 
 
+def test_getSession_etag():
+    global host
+    global port
+    global timeout
+    r = requests.post(
+        'http://{}:{}/v1/sessions'.format(host, port), timeout=timeout)
+    id = r.json()
+    url = 'http://{}:{}/v1/sessions/{}'.format(host, port, id)
+    r = requests.get(url, timeout=timeout)
+    assert r.status_code == 200
+    etag = r.headers['ETag']
+    assert re.match(r'^W/"[0-9a-f]{{8}}-{}-0\.session\.json"$'.format(id), etag)
+    # cached
+    r = requests.get(url, timeout=timeout)
+    assert r.headers['ETag'] == etag
+    assert r.json()['numberOfMoves'] == 0
+    r = requests.get(url, headers={'If-None-Match': etag}, timeout=timeout)
+    assert r.status_code == 304
+    assert r.content == b''
+    # other representations have other ETags
+    r = requests.get(url, headers={'If-None-Match': etag, 'Accept': 'application/msgpack'},
+                     timeout=timeout)
+    assert r.status_code == 200
+    assert r.headers['ETag'] == etag.replace('.json', '.msgpack')
+    r = requests.get(url + '/complete', headers={'If-None-Match': etag}, timeout=timeout)
+    assert r.status_code == 200
+    complete = r.headers['ETag']
+    assert complete == etag.replace('.session', '.complete')
+    r = requests.get(url + '/complete', headers={'If-None-Match': complete}, timeout=timeout)
+    assert r.status_code == 304
+    r = requests.put(url + '/move', params={'fromTower': 0, 'toTower': 1}, timeout=timeout)
+    assert r.status_code == 200
+    r = requests.get(url, headers={'If-None-Match': etag}, timeout=timeout)
+    assert r.status_code == 200
+    assert r.headers['ETag'] == etag.replace('-0.', '-1.')
+    assert r.json()['towers'] == [14, 1, 0]
+    r = requests.get(url + '/complete', headers={'If-None-Match': complete}, timeout=timeout)
+    assert r.status_code == 200
+    assert r.json() is False
+
+
 def test_getSession_exception():
     global host
     global port
@@ -205,7 +324,7 @@ def test_getSession_exception():
     r = requests.get(
         'http://{}:{}/v1/sessions/42'.format(host, port), timeout=timeout)
     assert r.status_code == 201
-    d = json.loads(r.json())
+    d = r.json()
     assert d['code'] == 201
     assert d['message'] != ''
 
@@ -236,7 +355,7 @@ def test_getSession_move_exception():
     r = requests.put('http://{}:{}/v1/sessions/{}/move'.format(host,
                                                                port, id), params=payload, timeout=timeout)
     assert r.status_code == 201
-    d = json.loads(r.json())
+    d = r.json()
     assert d['code'] == 201
     assert d['message'] != ''
 
@@ -263,3 +382,452 @@ def test_getSession_isComplete_exception():
         'http://{}:{}/v1/sessions/42/complete'.format(host, port), timeout=timeout)
     # doesn't even get to my handler
     assert r.status_code == 405
+
+
+def test_hint_initial():
+    global host
+    global port
+    global timeout
+    r = requests.post(
+        'http://{}:{}/v1/sessions'.format(host, port), timeout=timeout)
+    assert r.status_code == 200
+    id = r.json()
+    payload = {'count': '3'}
+    r = requests.get('http://{}:{}/v1/sessions/{}/hint'.format(host,
+                                                               port, id), params=payload, timeout=timeout)
+    assert r.status_code == 200
+    d = r.json()
+    assert d['sessionId'] == id
+    assert d['numberOfMovesRemaining'] == 15
+    assert d['moves'] == [{'fromTower': 0, 'toTower': 1}, {
+        'fromTower': 0, 'toTower': 2}, {'fromTower': 1, 'toTower': 2}]
+
+
+def test_hint_exception():
+    global host
+    global port
+    global timeout
+    r = requests.get(
+        'http://{}:{}/v1/sessions/42/hint'.format(host, port), timeout=timeout)
+    assert r.status_code == 201
+    d = r.json()
+    assert d['code'] == 201
+    assert d['message'] != ''
+
+
+def test_undo_redo_history():
+    global host
+    global port
+    global timeout
+    r = requests.post('http://{}:{}/v1/sessions'.format(host, port),
+                      params={'numberOfDiscs': 3}, timeout=timeout)
+    assert r.status_code == 200
+    id = r.json()
+    r = requests.post('http://{}:{}/v1/sessions/{}/moves'.format(host, port, id),
+                      json=[[0, 2], [0, 1], [2, 1]], timeout=timeout)
+    assert r.status_code == 200
+    r = requests.put('http://{}:{}/v1/sessions/{}/undo'.format(host, port, id), timeout=timeout)
+    assert r.status_code == 200
+    r = requests.get('http://{}:{}/v1/sessions/{}/history'.format(host, port, id), timeout=timeout)
+    assert r.status_code == 200
+    assert r.headers['Content-Type'] == 'application/octet-stream'
+    assert r.headers['History-Start'] == '0'
+    assert r.content == b'\x02\x01'
+    r = requests.put('http://{}:{}/v1/sessions/{}/redo'.format(host, port, id), timeout=timeout)
+    assert r.status_code == 200
+    r = requests.put('http://{}:{}/v1/sessions/{}/redo'.format(host, port, id), timeout=timeout)
+    assert r.status_code == 201
+    assert r.json()['message'] == 'there is no move to redo'
+    r = requests.get('http://{}:{}/v1/sessions/{}'.format(host, port, id), timeout=timeout)
+    assert r.json()['numberOfMoves'] == 5
+    assert r.json()['towers'] == [4, 3, 0]
+
+
+def test_history_exception():
+    global host
+    global port
+    global timeout
+    r = requests.get('http://{}:{}/v1/sessions/42/history'.format(host, port), timeout=timeout)
+    assert r.status_code == 201
+
+
+def test_distance():
+    global host
+    global port
+    global timeout
+    r = requests.post('http://{}:{}/v1/sessions'.format(host, port),
+                      params={'numberOfDiscs': 3}, timeout=timeout)
+    assert r.status_code == 200
+    id = r.json()
+    for s, t in [(0, 2), (2, 1)]:
+        r = requests.put('http://{}:{}/v1/sessions/{}/move'.format(host, port, id),
+                         params={'fromTower': s, 'toTower': t}, timeout=timeout)
+        assert r.status_code == 200
+    r = requests.get('http://{}:{}/v1/sessions/{}'.format(host, port, id), timeout=timeout)
+    assert r.json()['efficiency'] == 0.5
+    # back to the initial configuration by default
+    r = requests.get('http://{}:{}/v1/sessions/{}/distance'.format(host, port, id),
+                     params={'count': 2}, timeout=timeout)
+    assert r.status_code == 200
+    assert r.json() == {'sessionId': id, 'numberOfMoves': 1,
+                        'moves': [{'fromTower': 1, 'toTower': 0}]}
+    r = requests.get('http://{}:{}/v1/sessions/{}/distance'.format(host, port, id),
+                     params={'towers': [1, 0, 6]}, timeout=timeout)
+    assert r.status_code == 200
+    assert r.json()['numberOfMoves'] == 6
+    assert r.json()['moves'] == []
+
+
+def test_distance_64():
+    global host
+    global port
+    global timeout
+    r = requests.post('http://{}:{}/v1/sessions'.format(host, port),
+                      params={'numberOfDiscs': 64}, timeout=timeout)
+    id = r.json()
+    # a tower of 64 discs does not fit in an int64
+    r = requests.get('http://{}:{}/v1/sessions/{}/distance'.format(host, port, id),
+                     params={'towers': [0, 0, (1 << 64) - 1]}, timeout=timeout)
+    assert r.status_code == 200
+    assert r.json()['numberOfMoves'] == (1 << 64) - 1
+
+
+def test_distance_exception():
+    global host
+    global port
+    global timeout
+    r = requests.post('http://{}:{}/v1/sessions'.format(host, port),
+                      params={'numberOfDiscs': 3}, timeout=timeout)
+    id = r.json()
+    r = requests.get('http://{}:{}/v1/sessions/{}/distance'.format(host, port, id),
+                     params={'towers': [1, 1, 6]}, timeout=timeout)
+    assert r.status_code == 201
+    assert 'not a legal configuration' in r.json()['message']
+
+
+def test_getSolution_4():
+    global host
+    global port
+    global timeout
+    r = requests.get(
+        'http://{}:{}/v1/solutions/4'.format(host, port), timeout=timeout)
+    assert r.status_code == 200
+    d = r.json()
+    assert len(d) == 15
+    assert d[:3] == [[0, 1], [0, 2], [1, 2]]
+
+
+def test_getSolution_offset_limit():
+    global host
+    global port
+    global timeout
+    payload = {'fromTower': '2', 'toTower': '0',
+               'offset': str((1 << 40) - 3), 'limit': '10'}
+    r = requests.get('http://{}:{}/v1/solutions/40'.format(host,
+                                                           port), params=payload, timeout=timeout)
+    assert r.status_code == 200
+    assert r.json() == [[2, 0], [1, 0]]
+
+
+def test_getSolution_exception():
+    global host
+    global port
+    global timeout
+    payload = {'offset': '16'}
+    r = requests.get('http://{}:{}/v1/solutions/4'.format(host,
+                                                          port), params=payload, timeout=timeout)
+    assert r.status_code == 201
+    d = r.json()
+    assert d['code'] == 201
+    assert d['message'] != ''
+
+
+def test_moves_complete():
+    global host
+    global port
+    global timeout
+    r = requests.post(
+        'http://{}:{}/v1/sessions'.format(host, port), timeout=timeout)
+    assert r.status_code == 200
+    id = r.json()
+    r = requests.get(
+        'http://{}:{}/v1/solutions/4'.format(host, port), timeout=timeout)
+    assert r.status_code == 200
+    r = requests.post('http://{}:{}/v1/sessions/{}/moves'.format(host,
+                                                                 port, id), json=r.json(), timeout=timeout)
+    assert r.status_code == 200
+    r = requests.get(
+        'http://{}:{}/v1/sessions/{}/complete'.format(host, port, id), timeout=timeout)
+    assert r.status_code == 200
+    assert '{}'.format(r.json()) == 'True'
+
+
+def test_moves_exception():
+    global host
+    global port
+    global timeout
+    r = requests.post(
+        'http://{}:{}/v1/sessions'.format(host, port), timeout=timeout)
+    assert r.status_code == 200
+    id = r.json()
+    r = requests.post('http://{}:{}/v1/sessions/{}/moves'.format(host,
+                                                                 port, id), json=[[0, 1], [0, 1]], timeout=timeout)
+    assert r.status_code == 201
+    d = r.json()
+    assert d['code'] == 201
+    assert d['message'].startswith('move 1:')
+    r = requests.get(
+        'http://{}:{}/v1/sessions/{}'.format(host, port, id), timeout=timeout)
+    assert r.status_code == 200
+    d = r.json()
+    assert d['numberOfMoves'] == 0
+
+
+def test_metrics():
+    global host
+    global port
+    global timeout
+    r = requests.post(
+        'http://{}:{}/v1/sessions'.format(host, port), timeout=timeout)
+    assert r.status_code == 200
+    id = r.json()
+    r = requests.get(
+        'http://{}:{}/v1/metrics'.format(host, port), timeout=timeout)
+    assert r.status_code == 200
+    assert r.headers['Content-Type'].startswith('text/plain')
+    assert 'hanoi_sessions_resident 1\n' in r.text
+    assert 'hanoi_session_evictions_total 0\n' in r.text
+    assert 'hanoi_sessions_watched 0\n' in r.text
+    # the server may have inherited counts of other tests
+    assert 'hanoi_request_seconds_count{operation="createSession"} ' in r.text
+    r = requests.put('http://{}:{}/v1/sessions/{}/move'.format(host, port, id),
+                     params={'fromTower': 1, 'toTower': 2}, timeout=timeout)
+    assert r.status_code == 201
+    r = requests.get(
+        'http://{}:{}/v1/metrics'.format(host, port), timeout=timeout)
+    assert 'hanoi_errors_total{error="ValueError: source N is empty"} ' in r.text
+    assert 'hanoi_request_seconds_count{operation="move"} ' in r.text
+
+
+def test_getSessions_paginated():
+    global host
+    global port
+    global timeout
+    id = []
+    for n in [1, 2, 1, 2]:
+        r = requests.post('http://{}:{}/v1/sessions'.format(host, port),
+                          params={'numberOfDiscs': n}, timeout=timeout)
+        assert r.status_code == 200
+        id.append(r.json())
+    r = requests.put('http://{}:{}/v1/sessions/{}/move'.format(host, port, id[2]),
+                     params={'fromTower': 0, 'toTower': 2}, timeout=timeout)
+    assert r.status_code == 200
+    payload = {'limit': 2, 'after': id[0]}
+    r = requests.get('http://{}:{}/v1/sessions'.format(host,
+                                                       port), params=payload, timeout=timeout)
+    assert r.status_code == 200
+    assert [e['sessionId'] for e in r.json()] == id[1:3]
+    payload = {'complete': 'true'}
+    r = requests.get('http://{}:{}/v1/sessions'.format(host,
+                                                       port), params=payload, timeout=timeout)
+    assert [e['sessionId'] for e in r.json()] == [id[2]]
+    payload = {'complete': 'false', 'numberOfDiscs': 1}
+    r = requests.get('http://{}:{}/v1/sessions'.format(host,
+                                                       port), params=payload, timeout=timeout)
+    assert [e['sessionId'] for e in r.json()] == [id[0]]
+
+
+def test_getSessions_ndjson():
+    global host
+    global port
+    global timeout
+    id = []
+    for i in range(3):
+        r = requests.post(
+            'http://{}:{}/v1/sessions'.format(host, port), timeout=timeout)
+        assert r.status_code == 200
+        id.append(r.json())
+    r = requests.get('http://{}:{}/v1/sessions'.format(host, port),
+                     headers={'Accept': 'application/x-ndjson'}, timeout=timeout)
+    assert r.status_code == 200
+    assert r.headers['Content-Type'].startswith('application/x-ndjson')
+    lines = r.text.splitlines()
+    assert [json.loads(e)['sessionId'] for e in lines] == id
+
+
+def test_getSession_msgpack():
+    global host
+    global port
+    global timeout
+    r = requests.post('http://{}:{}/v1/sessions'.format(host, port),
+                      params={'numberOfDiscs': 1}, timeout=timeout)
+    assert r.status_code == 200
+    id = r.json()
+    r = requests.get('http://{}:{}/v1/sessions/{}'.format(host, port, id),
+                     headers={'Accept': 'application/msgpack'}, timeout=timeout)
+    assert r.status_code == 200
+    assert r.headers['Content-Type'] == 'application/msgpack'
+    # a map of 7 entries, starting with the sessionId
+    assert r.content[:11] == b'\x87\xa9sessionId'
+    assert r.content.endswith(b'\xa6towers\x93\x01\x00\x00\xaaefficiency\xcb' + struct.pack('>d', 1.0))
+
+
+def test_watch():
+    global host
+    global port
+    global timeout
+    r = requests.post('http://{}:{}/v1/sessions'.format(host, port),
+                      params={'numberOfDiscs': 1}, timeout=timeout)
+    id = r.json()
+    stream = requests.get('http://{}:{}/v1/sessions/{}/events'.format(host, port, id),
+                          stream=True, timeout=timeout)
+    assert stream.status_code == 200
+    assert stream.headers['Content-Type'].startswith('text/event-stream')
+    lines = stream.iter_lines()
+    assert next(lines) == b'event: session'
+    assert next(lines) == b'id: 0'
+    assert json.loads(next(lines)[len('data: '):])['sessionId'] == id
+    assert next(lines) == b''
+    r = requests.put('http://{}:{}/v1/sessions/{}/move'.format(host, port, id),
+                     params={'fromTower': 0, 'toTower': 2}, timeout=timeout)
+    assert r.status_code == 200
+    assert [next(lines) for _ in range(8)] == [
+        b'event: move', b'id: 1', b'data: {"numberOfMoves":1,"moves":[[0,2]]}', b'',
+        b'event: complete', b'id: 1', b'data: {"numberOfMoves":1,"complete":true}', b'',
+    ]
+    stream.close()
+
+
+def test_watch_exception():
+    global host
+    global port
+    global timeout
+    r = requests.get('http://{}:{}/v1/sessions/42/events'.format(host, port),
+                     timeout=timeout)
+    assert r.status_code == 201
+
+
+def test_createSession_towers():
+    global host
+    global port
+    global timeout
+    r = requests.post('http://{}:{}/v1/sessions'.format(host, port),
+                      params={'numberOfDiscs': 3, 'toTower': 3, 'numberOfTowers': 4},
+                      timeout=timeout)
+    assert r.status_code == 200
+    id = r.json()
+    r = requests.put('http://{}:{}/v1/sessions/{}/move'.format(host, port, id),
+                     params={'fromTower': 0, 'toTower': 3}, timeout=timeout)
+    assert r.status_code == 200
+    r = requests.get('http://{}:{}/v1/sessions/{}'.format(host, port, id), timeout=timeout)
+    assert r.json()['towers'] == [6, 0, 0, 1]
+    r = requests.get('http://{}:{}/v1/solutions/3'.format(host, port),
+                     params={'toTower': 3, 'numberOfTowers': 4}, timeout=timeout)
+    assert r.json() == [[0, 1], [0, 2], [0, 3], [2, 3], [1, 3]]
+
+
+def test_lazy_import():
+    # the engine can be used without loading connexion, Flask or hanoi.yaml
+    r = subprocess.run(
+        [sys.executable, '-c',
+         'import sys, hanoi; hanoi.Hanoi(3, 0, 2);'
+         'print([m for m in ("connexion", "flask", "hanoi.app") if m in sys.modules])'],
+        capture_output=True, text=True, check=True)
+    assert r.stdout == '[]\n'
+    import hanoi
+    assert hanoi.app is app
+
+
+def test_lockTimeouts():
+    # hanoi.app is also the name of the WSGI app object in the hanoi package
+    module = importlib.import_module('hanoi.app')
+    assert module.lockTimeouts('') == {'*': 1.0}
+    assert module.lockTimeouts('*=2,moves=5, history=0.5') == {
+        '*': 2.0, 'moves': 5.0, 'history': 0.5}
+    assert module.lockTimeout('move') == module.timeouts['*']
+    assert module.errorResponse(201, ValueError('source 1 is empty')) == (
+        201, {'code': 201, 'message': 'source 1 is empty'}, {})
+    assert module.errorResponse(201, TimeoutError())[::2] == (503, {'Retry-After': '1'})
+    import hanoi
+    assert module.errorResponse(201, hanoi.Hanoi.Busy())[::2] == (429, {'Retry-After': '1'})
+
+
+def test_specification(tmp_path):
+    # hanoi.app is also the name of the WSGI app object in the hanoi package
+    module = importlib.import_module('hanoi.app')
+    path = str(tmp_path / 'hanoi.yaml')
+    shutil.copy(os.path.join(os.path.dirname(module.__file__), 'hanoi.yaml'), path)
+    spec = module.specification(path)
+    assert spec['paths']['/sessions']['post']['operationId'] == 'hanoi.app.createSession'
+    cache = tmp_path / '__pycache__' / 'hanoi.yaml.json'
+    assert json.loads(cache.read_text())['specification'] == spec
+    assert module.specification(path) == spec
+
+    # a changed specification is parsed again
+    with open(path, 'a') as f:
+        f.write('x-changed: true\n')
+    assert module.specification(path)['x-changed'] is True
+    assert json.loads(cache.read_text())['specification']['x-changed'] is True
+
+
+def test_move_expectedMoves():
+    global host
+    global port
+    global timeout
+    r = requests.post('http://{}:{}/v1/sessions'.format(host, port),
+                      params={'numberOfDiscs': 3}, timeout=timeout)
+    id = r.json()
+    url = 'http://{}:{}/v1/sessions/{}'.format(host, port, id)
+    r = requests.put(url + '/move', params={'fromTower': 0, 'toTower': 2, 'expectedMoves': 0},
+                     timeout=timeout)
+    assert r.status_code == 200
+    r = requests.put(url + '/move', params={'fromTower': 0, 'toTower': 1, 'expectedMoves': 0},
+                     timeout=timeout)
+    assert r.status_code == 409
+    e = r.json()
+    assert e['code'] == 409
+    assert e['message'] == 'expected 0 moves but session {} has made 1'.format(id)
+    assert e['session']['numberOfMoves'] == 1
+    assert e['session']['towers'] == [6, 0, 1]
+    r = requests.post(url + '/moves', params={'expectedMoves': 1}, json=[[0, 1], [2, 1]],
+                      timeout=timeout)
+    assert r.status_code == 200
+    r = requests.put(url + '/undo', params={'expectedMoves': 2}, timeout=timeout)
+    assert r.status_code == 409
+    r = requests.put(url + '/undo', params={'expectedMoves': 3}, timeout=timeout)
+    assert r.status_code == 200
+    assert requests.get(url, timeout=timeout).json()['towers'] == [4, 2, 1]
+
+
+def test_move_idempotent():
+    global host
+    global port
+    global timeout
+    r = requests.post('http://{}:{}/v1/sessions'.format(host, port),
+                      params={'numberOfDiscs': 3}, timeout=timeout)
+    id = r.json()
+    url = 'http://{}:{}/v1/sessions/{}'.format(host, port, id)
+    for _ in range(2):
+        r = requests.put(url + '/move', params={'fromTower': 0, 'toTower': 2},
+                         headers={'Idempotency-Key': 'a'}, timeout=timeout)
+        assert r.status_code == 200
+    # the retry was not executed again
+    assert r.headers['Idempotent-Replayed'] == 'true'
+    assert requests.get(url, timeout=timeout).json()['numberOfMoves'] == 1
+    # neither are retries of illegal moves
+    for _ in range(2):
+        r = requests.put(url + '/move', params={'fromTower': 0, 'toTower': 2},
+                         headers={'Idempotency-Key': 'b'}, timeout=timeout)
+        assert r.json() == {'code': 201, 'message': 'cannot put disc 2 on top of disc 1'}
+    assert r.headers['Idempotent-Replayed'] == 'true'
+    r = requests.post(url + '/moves', json=[[0, 1], [2, 1]],
+                      headers={'Idempotency-Key': 'c'}, timeout=timeout)
+    assert r.status_code == 200
+    assert 'Idempotent-Replayed' not in r.headers
+    assert requests.get(url, timeout=timeout).json()['towers'] == [4, 3, 0]
+    # a key may not be reused for different moves
+    r = requests.post(url + '/moves', json=[[0, 2]],
+                      headers={'Idempotency-Key': 'c'}, timeout=timeout)
+    assert r.status_code == 422
+    assert r.json()['message'] == 'Idempotency-Key c was used for a different request'
+    assert requests.get(url, timeout=timeout).json()['towers'] == [4, 3, 0]